@@ -0,0 +1,159 @@
+# batched_env.py
+from copy import deepcopy
+
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from car import RAY_OFFSETS
+from car_batch import CarBatch, CAR_RADIUS
+from game_map import DEFAULT_MAP
+from variables import *
+from utility.cast_rays import cast_rays
+
+DENSE_RAY_MAX_WALLS = 128     # above this, rays walk the WallGrid instead of meeting every wall
+
+
+class BatchedCarEnv(CarBatch, VecEnv):
+    """
+    Simulates `num_envs` cars in struct-of-arrays form behind the
+    stable-baselines3 VecEnv interface.
+
+    Dynamics, rewards and observations follow CarEnv.step, but every
+    quantity is a NumPy array over all cars, so one step costs a handful of
+    array operations instead of num_envs Python-level env steps.
+    Finished cars are reset in place, like DummyVecEnv. The cars and their
+    physics are a CarBatch.
+    """
+
+    def __init__(self, num_envs, map=DEFAULT_MAP, max_steps=1000, seed=None,
+                 use_distance_field=True, random_start=False, min_target_distance=0.0):
+        action_space = gym.spaces.Box(
+            low=np.array([-1.0, -1.0], dtype=np.float32),
+            high=np.array([1.0, 1.0], dtype=np.float32),
+            dtype=np.float32
+        )
+        num_rays = len(RAY_OFFSETS)
+        observation_space = gym.spaces.Box(
+            low=0.0, high=1.0, shape=(num_rays + 2,), dtype=np.float32
+        )
+        self.render_mode = None
+        VecEnv.__init__(self, num_envs, observation_space, action_space)
+        CarBatch.__init__(self, num_envs, map=map, max_steps=max_steps,
+                          use_distance_field=use_distance_field)
+        self.random_start = random_start
+        self.min_target_distance = min_target_distance
+        self.rng = np.random.default_rng(seed)
+        self.actions = np.zeros((num_envs, 2), dtype=np.float32)
+
+        self.target_spawns = self.map.target_spawns
+        self.car_spawns = self.map.car_spawns
+
+    # ------------------ state ------------------
+    def _spawn_targets(self, idx):
+        self.target[idx] = self.target_spawns.sample_away_from(
+            self.rng, self.pos[idx], self.min_target_distance
+        )
+
+    def _reset_cars(self, idx):
+        if self.random_start:
+            self.pos[idx] = self.car_spawns.sample(self.rng, len(idx))
+            self.angle[idx] = self.rng.uniform(0, 360, len(idx))
+        else:
+            self.pos[idx] = self.map.car_start
+            self.angle[idx] = 0.0
+        self.speed[idx] = 0.0
+        self.steps[idx] = 0
+        self._spawn_targets(idx)
+
+    def _restart(self, idx):
+        self._reset_cars(idx)
+        self.wall_distance[idx] = self.wall_grid.min_distances(self.pos[idx], CAR_RADIUS)
+
+    def _ray_distances(self):
+        angles = self.angle[:, None] + RAY_OFFSETS
+        if len(self.wall_array) <= DENSE_RAY_MAX_WALLS:
+            distances, _ = cast_rays(self.pos, angles, self.wall_array, RAY_LENGTH)
+        else:
+            # Each ray only meets the walls of the grid cells it crosses
+            distances, _ = self.wall_grid.march_rays(self.pos, angles, RAY_LENGTH)
+        return distances
+
+    def _get_obs(self):
+        ray_distances = self._ray_distances()
+        to_target = self.target - self.pos
+        dist_to_target = np.hypot(to_target[:, 0], to_target[:, 1])
+
+        angle_to_target = np.arctan2(to_target[:, 1], to_target[:, 0]) - np.radians(self.angle)
+        angle_to_target = (angle_to_target + np.pi) % (2 * np.pi) - np.pi
+
+        obs = np.empty((self.num_envs, self.observation_space.shape[0]), dtype=np.float32)
+        obs[:, :-2] = ray_distances / RAY_LENGTH
+        obs[:, -2] = dist_to_target / self.map.diagonal
+        obs[:, -1] = angle_to_target / np.pi
+        return obs
+
+    # ------------------ VecEnv API ------------------
+    def reset(self):
+        if any(seed is not None for seed in self._seeds):
+            self.rng = np.random.default_rng([s for s in self._seeds if s is not None])
+        self._reset_seeds()
+        self._reset_options()
+
+        self._restart(np.arange(self.num_envs))
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        return self._get_obs()
+
+    def step_async(self, actions):
+        self.actions = np.asarray(actions, dtype=np.float32).reshape(self.num_envs, 2)
+
+    def step_wait(self):
+        rewards, terminated, target_dist = self._advance(
+            self.actions[:, 0].astype(np.float64), self.actions[:, 1].astype(np.float64)
+        )
+        rewards = rewards.astype(np.float32)
+        truncated = self.steps >= self.max_steps
+        dones = terminated | truncated
+
+        obs = self._get_obs()
+        infos = [
+            {
+                "distance_to_target": target_dist[i],
+                "speed": self.speed[i],
+                "TimeLimit.truncated": bool(truncated[i] and not terminated[i]),
+            }
+            for i in range(self.num_envs)
+        ]
+
+        done_idx = np.flatnonzero(dones)
+        if len(done_idx):
+            for i in done_idx:
+                infos[i]["terminal_observation"] = obs[i].copy()
+            self._restart(done_idx)
+            obs = self._get_obs()
+
+        return obs, rewards, dones, infos
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name, indices=None):
+        value = getattr(self, attr_name)
+        if isinstance(value, np.ndarray) and value.shape[:1] == (self.num_envs,):
+            return [value[i] for i in self._get_indices(indices)]
+        return [value for _ in self._get_indices(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        current = getattr(self, attr_name)
+        if isinstance(current, np.ndarray) and current.shape[:1] == (self.num_envs,):
+            for i in self._get_indices(indices):
+                current[i] = value
+        else:
+            setattr(self, attr_name, deepcopy(value))
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        method = getattr(self, method_name)
+        return [method(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        return [False for _ in self._get_indices(indices)]
@@ -0,0 +1,523 @@
+# benchmark.py
+"""
+Simulator benchmark suite.
+
+    python benchmark.py run --out benchmarks/current.json
+    python benchmark.py compare benchmarks/baseline.json benchmarks/current.json
+
+`run` times module import and policy loading cost in a fresh interpreter,
+policy inference latency, geometry primitives, ray casting, spawning,
+reset and step throughput (single and vectorized envs, on maps with
+different wall counts) and writes seconds-per-operation with environment metadata as JSON.
+`compare` flags every benchmark that got slower than the threshold and
+exits non-zero if any did.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from functools import partial
+
+import numpy as np
+
+from variables import *
+
+BENCHMARKS = {}
+WALL_COUNTS = (14, 200, 2000)
+RAY_COUNTS = (6, 18, 72, 288)
+
+
+def benchmark(name, unit="call"):
+    """
+    Registers a setup function under `name`. The setup function returns
+    (fn, ops) where one call of fn performs `ops` operations of `unit`, or
+    (fn, ops, close) when it holds resources that close() releases.
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, unit)
+        return setup
+    return register
+
+
+def clutter_walls(count, seed=0):
+    """The training map plus random short segments, `count` walls in total."""
+    from game_map import load_map
+
+    rng = np.random.default_rng(seed)
+    walls = load_map().walls.tolist()
+    while len(walls) < count:
+        x, y = rng.uniform(20, GAME_WIDTH - 20), rng.uniform(20, GAME_HEIGHT - 20)
+        # Keep the default start position drivable
+        if np.hypot(x - CAR_START[0], y - CAR_START[1]) < 80:
+            continue
+        angle = rng.uniform(0, np.pi)
+        length = rng.uniform(4, 16)
+        walls.append((x, y, x + np.cos(angle) * length, y + np.sin(angle) * length))
+    return walls
+
+
+def clutter_map(count, seed=0):
+    """clutter_walls as an in-memory GameMap for the envs."""
+    from game_map import build_map, spec_from_walls
+    return build_map(spec_from_walls(clutter_walls(count, seed), name=f"clutter{count}"))
+
+
+# ------------------ startup ------------------
+def bench_subprocess(code):
+    """Runs `code` in a fresh interpreter from the repo root."""
+    command = [sys.executable, "-c", code]
+    here = os.path.dirname(os.path.abspath(__file__))
+    return partial(subprocess.run, command, cwd=here, check=True, capture_output=True), 1
+
+
+def bench_import(module, forbid=None):
+    """
+    Imports `module` in a fresh interpreter, as a new rollout worker does.
+    Fails if that pulls in `forbid`, e.g. pygame for the headless env.
+    """
+    check = f"assert {forbid!r} not in sys.modules, '{module} imported {forbid}'" if forbid else ""
+    return bench_subprocess(f"import sys, {module}\n{check}")
+
+
+benchmark("import.python")(partial(bench_import, "sys"))
+benchmark("import.car_env")(partial(bench_import, "car_env", forbid="pygame"))
+benchmark("import.pygame")(partial(bench_import, "pygame"))
+
+
+# ------------------ geometry ------------------
+@benchmark("geometry.line_intersection")
+def bench_line_intersection():
+    from utility.line_intersection import line_intersection
+    args = ((100, 300), (100, -100), (0, 50), (700, 50))
+    return lambda: line_intersection(*args), 1
+
+
+@benchmark("geometry.distance_point_to_wall")
+def bench_distance_point_to_wall():
+    from utility.distance_point_to_wall import distance_point_to_wall
+    args = ((100, 300), (150, 100), (350, 100))
+    return lambda: distance_point_to_wall(*args), 1
+
+
+def bench_ray_data(num_rays, num_walls, kind="grid"):
+    from car import Car
+    from utility.cast_rays import walls_to_array
+    from utility.wall_grid import WallGrid
+    from utility.visibility import VisibilitySensor
+
+    grid = WallGrid(walls_to_array(clutter_walls(num_walls)))
+    sensor = VisibilitySensor(grid) if kind == "visibility" else grid
+    car = Car(*CAR_START, ray_offsets=np.linspace(-180, 180, num_rays, endpoint=False))
+    return partial(car.get_ray_data, sensor), 1
+
+
+for _rays in RAY_COUNTS:
+    benchmark(f"sensing.get_ray_data[rays={_rays}]")(partial(bench_ray_data, _rays, 14))
+    benchmark(f"sensing.visibility[rays={_rays}]")(partial(bench_ray_data, _rays, 14, "visibility"))
+for _walls in WALL_COUNTS[1:]:
+    for _rays in (18, 288):
+        benchmark(f"sensing.get_ray_data[rays={_rays},walls={_walls}]")(partial(bench_ray_data, _rays, _walls))
+        benchmark(f"sensing.visibility[rays={_rays},walls={_walls}]")(
+            partial(bench_ray_data, _rays, _walls, "visibility"))
+
+
+def bench_moving_rays(kind, num_walls):
+    from car import RAY_OFFSETS
+    from utility.coherent_rays import CoherentRayCaster
+
+    grid = clutter_map(num_walls).wall_grid
+    caster = CoherentRayCaster(grid) if kind == "coherent" else grid
+    # A car circling at full speed: 5 px and 3 degrees per step
+    heading = np.arange(0, 360, 3.0)
+    xs = 350 + 95.5 * np.cos(np.radians(heading))
+    ys = 450 + 95.5 * np.sin(np.radians(heading))
+    poses = list(zip(xs.tolist(), ys.tolist(), heading.tolist()))
+    state = {"i": 0}
+
+    def cast():
+        state["i"] = (state["i"] + 1) % len(poses)
+        x, y, angle = poses[state["i"]]
+        caster.cast_rays((x, y), RAY_OFFSETS + angle, RAY_LENGTH)
+    return cast, 1
+
+
+for _walls in WALL_COUNTS:
+    for _kind in ("grid", "coherent"):
+        benchmark(f"sensing.moving_rays[{_kind},walls={_walls}]")(partial(bench_moving_rays, _kind, _walls))
+
+
+# ------------------ maps ------------------
+@benchmark("map.load")
+def bench_map_load():
+    from game_map import compile_map, read_cache
+    path = compile_map("default")
+    return partial(read_cache, path), 1
+
+
+@benchmark("map.build")
+def bench_map_build():
+    from game_map import build_map, map_path
+    with open(map_path("default")) as f:
+        spec = json.load(f)
+    return partial(build_map, spec), 1
+
+
+# ------------------ spawning and reset ------------------
+@benchmark("spawn.spawn_target")
+def bench_spawn_target():
+    from car_env import CarEnv
+    from main import spawn_target
+    env = CarEnv()
+    return lambda: spawn_target(env.wall_grid, env.map.size), 1
+
+
+@benchmark("spawn.spawn_table")
+def bench_spawn_table():
+    from car_env import CarEnv
+    env = CarEnv()
+    rng = np.random.default_rng(0)
+    return lambda: env.target_spawns.sample_away_from(rng, CAR_START, 0.0), 1
+
+
+def bench_reset(num_walls):
+    from car_env import CarEnv
+    env = CarEnv(map=clutter_map(num_walls))
+    env.reset(seed=0)
+    return env.reset, 1
+
+
+for _walls in WALL_COUNTS:
+    benchmark(f"env.reset[walls={_walls}]")(partial(bench_reset, _walls))
+
+
+def bench_state(kind):
+    from car_env import CarEnv
+    env = CarEnv(random_start=True)
+    env.reset(seed=0)
+    state = env.get_state()
+    if kind == "get":
+        return partial(env.get_state, state), 1
+    if kind == "set":
+        return partial(env.set_state, state, observe=False), 1
+    # Branches of 8 steps from one root
+    actions = _random_actions(64, 8).transpose(1, 0, 2)
+    return partial(env.run_branches, state, actions), len(actions)
+
+
+benchmark("env.get_state")(partial(bench_state, "get"))
+benchmark("env.set_state")(partial(bench_state, "set"))
+benchmark("env.run_branches[steps=8]", unit="branch")(partial(bench_state, "branches"))
+
+
+def bench_flow_field(num_walls):
+    from utility.flow_field import FlowFields
+    game_map = clutter_map(num_walls)
+    # capacity=0 keeps nothing cached, so every field() call computes its field
+    fields = FlowFields(game_map.wall_grid, game_map.size, CAR_SIZE[1] / 2, capacity=0)
+    cells = np.flatnonzero(fields.padded_free)
+    state = {"i": 0}
+
+    def field():
+        state["i"] = (state["i"] + 997) % len(cells)
+        fields.field(int(cells[state["i"]]))
+    return field, 1
+
+
+for _walls in WALL_COUNTS:
+    benchmark(f"nav.flow_field[walls={_walls}]", unit="field")(partial(bench_flow_field, _walls))
+
+
+# ------------------ step throughput ------------------
+def _random_actions(num_envs, count=256):
+    rng = np.random.default_rng(0)
+    return rng.uniform(-1, 1, (count, num_envs, 2)).astype(np.float32)
+
+
+def bench_step(num_walls, action_repeat=1, **options):
+    from car_env import CarEnv
+    env = CarEnv(map=clutter_map(num_walls), action_repeat=action_repeat, **options)
+    env.reset(seed=0)
+    actions = _random_actions(1)[:, 0]
+    state = {"i": 0}
+
+    def step():
+        state["i"] = (state["i"] + 1) % len(actions)
+        _, _, terminated, truncated, _ = env.step(actions[state["i"]])
+        if terminated or truncated:
+            env.reset()
+    return step, 1
+
+
+def bench_vec_step(kind, num_envs, num_walls):
+    game_map = clutter_map(num_walls)
+    if kind == "batched":
+        from batched_env import BatchedCarEnv
+        env = BatchedCarEnv(num_envs, map=game_map, seed=0)
+    else:
+        from stable_baselines3.common.vec_env import DummyVecEnv
+        from car_env import CarEnv
+        env = DummyVecEnv([partial(CarEnv, map=game_map) for _ in range(num_envs)])
+    env.reset()
+    actions = _random_actions(num_envs)
+    state = {"i": 0}
+
+    def step():
+        state["i"] = (state["i"] + 1) % len(actions)
+        env.step(actions[state["i"]])
+    return step, num_envs, env.close
+
+
+for _walls in WALL_COUNTS:
+    benchmark(f"env.step[walls={_walls}]", unit="env-step")(partial(bench_step, _walls))
+    benchmark(f"env.step[walls={_walls},action_repeat=4]", unit="env-step")(partial(bench_step, _walls, 4))
+    benchmark(f"env.step[walls={_walls},progress]", unit="env-step")(
+        partial(bench_step, _walls, progress_reward=0.1))
+    for _sensor in (False, True):
+        benchmark(f"env.step[walls={_walls},rays=288{',visibility' if _sensor else ''}]", unit="env-step")(
+            partial(bench_step, _walls, ray_counts=(192, 96), visibility_sensor=_sensor))
+    benchmark(f"vec.dummy_step[envs=8,walls={_walls}]", unit="env-step")(
+        partial(bench_vec_step, "dummy", 8, _walls))
+    benchmark(f"vec.batched_step[envs=64,walls={_walls}]", unit="env-step")(
+        partial(bench_vec_step, "batched", 64, _walls))
+
+
+def open_map(side):
+    """A walled, empty side x side map as an in-memory GameMap."""
+    from game_map import build_map, spec_from_walls
+    spec = spec_from_walls([(0, 0, side, 0), (side, 0, side, side), (side, side, 0, side), (0, side, 0, 0)],
+                           name=f"open{side}")
+    spec["size"] = [side, side]
+    regions = [[SPAWN_MARGIN, SPAWN_MARGIN, side - SPAWN_MARGIN, side - SPAWN_MARGIN]]
+    for rule in spec["spawn"].values():
+        rule["regions"] = regions
+    return build_map(spec)
+
+
+def bench_traffic_step(num_cars):
+    from traffic_env import TrafficEnv
+    # Same density at every car count: one car per 200 x 200 px
+    env = TrafficEnv(num_cars, map=open_map(int(200 * np.sqrt(num_cars))), seed=0)
+    env.reset()
+    actions = _random_actions(num_cars)
+    state = {"i": 0}
+
+    def step():
+        state["i"] = (state["i"] + 1) % len(actions)
+        env.step(actions[state["i"]])
+    return step, num_cars, env.close
+
+
+for _cars in (16, 64, 256):
+    benchmark(f"traffic.step[cars={_cars}]", unit="env-step")(partial(bench_traffic_step, _cars))
+
+
+def bench_remote_step(num_servers, envs_per_server, chunks):
+    from env_server import RemoteVecEnv, start_local_servers
+    addresses, processes = start_local_servers(num_servers)
+
+    def close():
+        try:
+            if env is not None:
+                env.close()
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+
+    env = None
+    try:
+        env = RemoteVecEnv(addresses, envs_per_server, chunks=chunks)
+        env.reset()
+    except BaseException:
+        close()
+        raise
+    actions = _random_actions(env.num_envs)
+    state = {"i": 0}
+
+    def step():
+        state["i"] = (state["i"] + 1) % len(actions)
+        env.step(actions[state["i"]])
+    return step, env.num_envs, close
+
+
+for _chunks in (1, 4):
+    benchmark(f"vec.remote_step[servers=2,envs=16,chunks={_chunks}]", unit="env-step")(
+        partial(bench_remote_step, 2, 8, _chunks))
+
+
+# ------------------ policy inference ------------------
+POLICY_CHECKPOINT = "models/final_car_model.zip"
+
+
+def exported_policy():
+    """Exports POLICY_CHECKPOINT once per run into a temporary directory."""
+    if not hasattr(exported_policy, "path"):
+        import tempfile
+        from export_policy import export
+        exported_policy.path = os.path.join(tempfile.mkdtemp(), "policy.npz")
+        export(POLICY_CHECKPOINT, exported_policy.path)
+    return exported_policy.path
+
+
+@benchmark("startup.numpy_policy")
+def bench_numpy_policy_startup():
+    return bench_subprocess(
+        "import numpy as np\n"
+        "from numpy_policy import NumpyPolicy\n"
+        f"NumpyPolicy.load({exported_policy()!r}).predict(np.zeros(20, dtype=np.float32))"
+    )
+
+
+@benchmark("startup.ppo_load")
+def bench_ppo_startup():
+    return bench_subprocess(
+        "import numpy as np\n"
+        "from stable_baselines3 import PPO\n"
+        f"PPO.load({POLICY_CHECKPOINT!r}, device='cpu').predict(np.zeros(20, dtype=np.float32), deterministic=True)"
+    )
+
+
+def bench_predict(kind, batch):
+    obs = np.random.default_rng(0).random((batch, 20), dtype=np.float32)
+    if batch == 1:
+        obs = obs[0]
+    if kind == "numpy":
+        from numpy_policy import NumpyPolicy
+        policy = NumpyPolicy.load(exported_policy())
+    else:
+        from stable_baselines3 import PPO
+        policy = PPO.load(POLICY_CHECKPOINT, device="cpu")
+    return partial(policy.predict, obs, deterministic=True), batch
+
+
+for _batch in (1, 32):
+    benchmark(f"policy.numpy_predict[batch={_batch}]", unit="action")(partial(bench_predict, "numpy", _batch))
+    benchmark(f"policy.ppo_predict[batch={_batch}]", unit="action")(partial(bench_predict, "ppo", _batch))
+
+
+# ------------------ runner ------------------
+def measure(fn, ops, min_time, repeats):
+    """Best-of-`repeats` seconds per operation, each repeat lasting >= min_time."""
+    # Untimed first call: lazy imports, caches and allocations are not what is measured
+    fn()
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    best = elapsed
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / (loops * ops)
+
+
+def environment_metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run(args):
+    results = {}
+    for name, (setup, unit) in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        fn, ops, *close = setup()
+        try:
+            seconds = measure(fn, ops, args.min_time, args.repeats)
+        finally:
+            for release in close:
+                release()
+        results[name] = {"seconds_per_op": seconds, "ops_per_sec": 1.0 / seconds, "unit": unit}
+        print(f"{name:<45} {seconds * 1e6:>12.2f} us/{unit:<9} {1.0 / seconds:>12.0f} /s")
+
+    report = {"metadata": environment_metadata(), "results": results}
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    for key in ("processor", "cpu_count", "python", "numpy"):
+        if baseline["metadata"].get(key) != current["metadata"].get(key):
+            print(f"warning: {key} differs ({baseline['metadata'].get(key)} vs {current['metadata'].get(key)})")
+
+    regressions = []
+    print(f"{'benchmark':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, base in baseline["results"].items():
+        if name not in current["results"]:
+            print(f"{name:<45} {'missing from current run':>34}")
+            continue
+        before = base["seconds_per_op"]
+        after = current["results"][name]["seconds_per_op"]
+        change = after / before - 1
+        flag = ""
+        if change > args.threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif change < -args.threshold:
+            flag = "  faster"
+        print(f"{name:<45} {before * 1e6:>10.2f}us {after * 1e6:>10.2f}us {change:>+8.1%}{flag}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+    print("no regressions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulator benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="run benchmarks and write JSON results")
+    run_parser.add_argument("--out", help="JSON file to write, e.g. benchmarks/baseline.json")
+    run_parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    run_parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    run_parser.add_argument("--repeats", type=int, default=3)
+
+    compare_parser = sub.add_parser("compare", help="flag regressions against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="relative slowdown that counts as a regression")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == "__main__":
+    main()
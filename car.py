@@ -0,0 +1,160 @@
+# car.py
+"""
+Car dynamics and sensing, shared by the manual game and the RL envs.
+
+Nothing here imports pygame at module level; only draw_car and the
+keyboard controls in move load it, so headless envs and training workers
+never start SDL.
+"""
+import math
+
+import numpy as np
+
+from variables import *
+
+
+def ray_offsets(front, back):
+    """Ray heading offsets in degrees: `front` rays over a 120° fan in front, `back` over a 200° fan behind."""
+    return np.concatenate([
+        -60 + np.arange(front) * (120 / max(1, front - 1)),
+        80 + np.arange(back) * (200 / max(1, back - 1)),
+    ])
+
+
+RAY_OFFSETS = ray_offsets(RAY_COUNT_FRONT, RAY_COUNT_BACK)
+
+
+class Car:
+    """
+    Car state as plain floats, so stepping it allocates no vectors.
+    `angle` is in degrees, 0 facing up (-y), increasing clockwise.
+    """
+
+    __slots__ = ("x", "y", "angle", "speed", "radius", "ray_offsets", "ray_angles")
+
+    def __init__(self, x, y, ray_offsets=RAY_OFFSETS):
+        self.x = float(x)
+        self.y = float(y)
+        self.angle = 0.0
+        self.speed = 0.0
+        self.radius = CAR_SIZE[1]/2
+        self.ray_offsets = ray_offsets
+        # Reused buffer for the absolute ray headings
+        self.ray_angles = np.empty_like(ray_offsets)
+
+    @property
+    def pos(self):
+        return (self.x, self.y)
+
+    @pos.setter
+    def pos(self, value):
+        self.x, self.y = float(value[0]), float(value[1])
+
+
+    def draw_car(self, screen):
+        import pygame
+
+        rect = pygame.Surface(CAR_SIZE, pygame.SRCALPHA)
+        rect.fill(RED)
+        rotated_car = pygame.transform.rotate(rect, -self.angle)
+        screen.blit(rotated_car, rotated_car.get_rect(center=self.pos))
+
+
+    def move(self, walls):
+        """Keyboard driving (WASD) for the manual game in main.py."""
+        import pygame
+
+        keys = pygame.key.get_pressed()
+
+        # Rotation
+        if keys[pygame.K_a]:
+            if self.speed > 0:
+                self.angle -= ROTATION_SPEED_CAR
+            if self.speed < 0:
+                self.angle += ROTATION_SPEED_CAR
+        if keys[pygame.K_d]:
+            if self.speed > 0:
+                self.angle += ROTATION_SPEED_CAR
+            if self.speed < 0:
+                self.angle -= ROTATION_SPEED_CAR
+
+
+        if keys[pygame.K_w]:
+            self.speed += ACCELERATION
+            if self.speed >= MAX_DRIVE_SPEED:
+                self.speed = MAX_DRIVE_SPEED
+
+        if keys[pygame.K_s]:
+            self.speed -= ACCELERATION
+            if self.speed <= MAX_REVERSE_SPEED:
+                self.speed = MAX_REVERSE_SPEED
+
+
+        self.update_physics()
+
+
+    def update_physics(self):
+        if self.speed > 0:
+            self.speed = max(0, self.speed - FRICTION)
+        elif self.speed < 0:
+            self.speed = min(0, self.speed + FRICTION)
+        if abs(self.speed) < FRICTION:
+            self.speed = 0
+
+
+    def apply_control(self, throttle, steer):
+        """One tick of the RL controls, both in [-1, 1], followed by friction."""
+        self.speed += throttle * 0.5  # scale as needed
+        self.speed = min(max(self.speed, -3.0), 5.0)  # adjust based on your constants
+
+        if abs(self.speed) > 0.1:
+            turn_factor = 1 if self.speed >= 0 else -1
+            self.angle += steer * 3.0 * turn_factor  # ROTATION_SPEED equivalent
+
+        self.update_physics()
+
+
+    def advance(self):
+        """Moves one tick along the heading, ignoring walls."""
+        rad = math.radians(self.angle)
+        self.x += math.sin(rad) * self.speed
+        self.y -= math.cos(rad) * self.speed
+
+
+    def update_position(self, walls):
+        """
+        Moves the car unless that would put it within its radius of a wall.
+        Returns the wall clearance (capped at the radius) of the new
+        position, or None when blocked and the car did not move.
+        """
+        # Heading (0, -1) rotated by angle, scaled by speed
+        rad = math.radians(self.angle)
+        next_x = self.x + math.sin(rad) * self.speed
+        next_y = self.y - math.cos(rad) * self.speed
+
+        # Check collision with nearby walls
+        clearance = walls.clearance_at(next_x, next_y, self.radius)
+        collision = clearance < self.radius
+
+        # Only move if no collision
+        if not collision:
+            self.x = next_x
+            self.y = next_y
+            return clearance
+        else:
+            # Optional: reduce speed on collision (optional realism)
+            self.speed = 0
+            return None
+
+
+    def get_ray_data(self, walls):
+        """
+        Casts all front and back rays against the walls in a WallGrid.
+        Returns (distances, hit_points) arrays of shape (R,) and (R, 2).
+        """
+        np.add(self.ray_offsets, self.angle, out=self.ray_angles)
+        return walls.cast_rays(self.pos, self.ray_angles, RAY_LENGTH)
+
+
+    def check_target_reached(self, target):
+        return target.is_reached(self.pos)
@@ -0,0 +1,132 @@
+# car_batch.py
+import numpy as np
+
+from game_map import load_map, DEFAULT_MAP
+from variables import *
+from utility.cast_rays import ray_directions
+
+CAR_RADIUS = CAR_SIZE[1] / 2
+
+
+class CarBatch:
+    """
+    `num_cars` cars on one map in struct-of-arrays form, stepped together
+    with the physics and rewards of CarEnv.step at one tick per action.
+
+    set_states/get_states move cars to and from CarEnv.get_state records,
+    and rollout() plays action sequences from them without resets, which
+    is how CarEnv.run_branches steps a batch of branches at once. This
+    module only needs NumPy and the map; BatchedCarEnv adds the
+    stable-baselines3 VecEnv interface on top.
+    """
+
+    def __init__(self, num_cars, map=DEFAULT_MAP, max_steps=1000, use_distance_field=True):
+        self.num_cars = num_cars
+        self.map = load_map(map)
+        self.wall_array = self.map.walls
+        if use_distance_field:
+            self.wall_grid = self.map.wall_grid
+        else:
+            self.wall_grid = self.map.grid_without_field()
+        self.max_steps = max_steps
+
+        # Car and target state, one row per car
+        self.pos = np.zeros((num_cars, 2))
+        self.angle = np.zeros(num_cars)
+        self.speed = np.zeros(num_cars)
+        self.target = np.zeros((num_cars, 2))
+        self.steps = np.zeros(num_cars, dtype=np.int64)
+        # Wall clearance of each car, capped at its radius, as CarEnv's frame keeps it
+        self.wall_distance = np.zeros(num_cars)
+
+    # ------------------ state ------------------
+    def set_states(self, states):
+        """Puts every car into its CarEnv.get_state record of `states` (num_cars,)."""
+        car = states["car"]
+        self.pos = car[:, :2].copy()
+        self.angle = car[:, 2].copy()
+        self.speed = car[:, 3].copy()
+        self.target = states["target"].copy()
+        self.steps = states["steps"].copy()
+        self.wall_distance = states["wall_distance"].copy()
+
+    def get_states(self, out, idx=slice(None)):
+        """
+        Writes the state of the cars `idx` into their records of `out`, a
+        (num_cars,) STATE_DTYPE array. Their map_index and rng fields, which
+        cars do not have, are left as they are.
+        """
+        out["car"][idx] = np.column_stack([self.pos, self.angle, self.speed])[idx]
+        out["target"][idx] = self.target[idx]
+        out["steps"][idx] = self.steps[idx]
+        out["wall_distance"][idx] = self.wall_distance[idx]
+
+    # ------------------ physics ------------------
+    def _apply_friction(self):
+        # Vectorized Car.update_physics
+        speed = self.speed
+        speed = np.where(speed > 0, np.maximum(0, speed - FRICTION), speed)
+        speed = np.where(speed < 0, np.minimum(0, speed + FRICTION), speed)
+        speed[np.abs(speed) < FRICTION] = 0
+        self.speed = speed
+
+    def _update_positions(self):
+        # Vectorized Car.update_position: blocked cars stay put and stop
+        direction = ray_directions(self.angle)
+        next_pos = self.pos + direction * self.speed[:, None]
+        clearance = self.wall_grid.min_distances(next_pos, CAR_RADIUS)
+        blocked = clearance < CAR_RADIUS
+
+        self.pos = np.where(blocked[:, None], self.pos, next_pos)
+        self.wall_distance = np.where(blocked, self.wall_distance, clearance)
+        self.speed[blocked] = 0
+
+    def _advance(self, throttle, steer):
+        """
+        One tick of every car under float64 `throttle` and `steer`. Returns
+        the float64 rewards, terminated flags and target distances.
+        """
+        # Apply continuous control
+        self.speed = np.clip(self.speed + throttle * 0.5, -3.0, 5.0)
+        turn_factor = np.where(self.speed >= 0, 1.0, -1.0)
+        self.angle += np.where(np.abs(self.speed) > 0.1, steer * 3.0 * turn_factor, 0.0)
+
+        self._apply_friction()
+        self._update_positions()
+
+        # Check collisions and targets
+        collided = self.wall_distance < CAR_RADIUS
+        to_target = self.target - self.pos
+        target_dist = np.hypot(to_target[:, 0], to_target[:, 1])
+        reached = target_dist <= TARGET_REACH_DISTANCE
+
+        rewards = np.where(collided, -10.0, np.where(reached, 50.0, 0.1))
+        self.steps += 1
+        return rewards, collided | reached, target_dist
+
+    def rollout(self, actions, states):
+        """
+        Plays `actions` (num_cars, T, 2) from `states`, car i taking
+        actions[i] until its episode ends; no car is reset. Returns the
+        float64 returns and the steps taken, and writes the state each car
+        ended in back into `states`.
+        """
+        self.set_states(states)
+        returns = np.zeros(self.num_cars)
+        lengths = np.zeros(self.num_cars, dtype=np.int64)
+        running = np.ones(self.num_cars, dtype=bool)
+        for t in range(actions.shape[1]):
+            rewards, terminated, _ = self._advance(
+                actions[:, t, 0].astype(np.float64), actions[:, t, 1].astype(np.float64)
+            )
+            # Finished cars keep moving with the rest; their results are dropped
+            returns[running] += rewards[running]
+            lengths[running] += 1
+            ended = running & (terminated | (self.steps >= self.max_steps))
+            if ended.any():
+                self.get_states(states, ended)
+                running &= ~ended
+                if not running.any():
+                    break
+        self.get_states(states, running)
+        return returns, lengths
@@ -1,21 +1,63 @@
 # car_env.py
+import math
+import os
+
 import gymnasium as gym
-import pygame
 import numpy as np
 from typing import Tuple, Dict, Any
 
-from main import Car, spawn_target
+from car import Car, ray_offsets
+from car_batch import CarBatch
 from sprites import *
 from variables import *
-from utility.distance_point_to_wall import distance_point_to_wall
-from utility.line_intersection import line_intersection
+from game_map import load_map, map_path, DEFAULT_MAP
+from map_pool import MapPool, POOL_SUFFIX
+from utility.coherent_rays import CoherentRayCaster
+from utility.visibility import VisibilitySensor
+from utility.flow_field import FlowFields
+from sensor_frame import SensorFrame
+from phase_timer import PhaseTimer, NULL_TIMER
+from rasterizer import FrameRasterizer
+
+# Everything an episode depends on besides the map geometry, for
+# CarEnv.get_state/set_state: 112 bytes including the PCG64 state of np_random
+STATE_DTYPE = np.dtype([
+    ("car", np.float64, 4),         # x, y, angle, speed
+    ("target", np.float64, 2),
+    ("wall_distance", np.float64),
+    ("steps", np.int64),
+    ("map_index", np.int64),
+    ("rng", np.uint64, 4),          # PCG64 state and increment, low word first
+    ("rng_buffer", np.uint32, 2),   # has_uint32, uinteger
+])
+_WORD = (1 << 64) - 1
+
 
 class CarEnv(gym.Env):
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 60}
 
-    def __init__(self, render_mode=None):
+    def __init__(self, render_mode=None, use_distance_field=True,
+                 random_start=False, min_target_distance=0.0,
+                 render_scale=1.0, render_rays=True, map=DEFAULT_MAP,
+                 profile=False, coherent_rays=True, action_repeat=1,
+                 ray_counts=(RAY_COUNT_FRONT, RAY_COUNT_BACK), visibility_sensor=False,
+                 progress_reward=0.0):
         super().__init__()
         self.render_mode = render_mode
+        # Physics ticks per agent step; the observation is built once, after the last
+        self.action_repeat = int(action_repeat)
+        if self.action_repeat < 1:
+            raise ValueError(f"action_repeat must be at least 1, got {action_repeat}")
+        if self.action_repeat > 1:
+            # Shown and recorded in real time
+            self.metadata = {**self.metadata, "render_fps": self.metadata["render_fps"] / self.action_repeat}
+        self.render_scale = render_scale
+        self.render_rays = render_rays
+        self.rasterizer = None
+        self.random_start = random_start
+        self.min_target_distance = min_target_distance
+        # Reward per px of shortest driveable path to the target covered in a step
+        self.progress_reward = progress_reward
 
         # Action space: [throttle, steering] ∈ [-1, 1]
         self.action_space = gym.spaces.Box(
@@ -25,125 +67,312 @@ class CarEnv(gym.Env):
         )
 
         # Observation space: normalized ray distances + distance to target + angle to target (optional)
-        num_rays = RAY_COUNT_FRONT + RAY_COUNT_BACK
+        # ray_counts = (front, back) rays, spread over the fans of car.ray_offsets
+        self.ray_counts = tuple(int(n) for n in ray_counts)
+        self.ray_offsets = ray_offsets(*self.ray_counts)
+        num_rays = len(self.ray_offsets)
+        self.num_rays = num_rays
         self.observation_space = gym.spaces.Box(
             low=0.0, high=1.0, shape=(num_rays + 2,), dtype=np.float32  # +2 for target info
         )
 
-        # Initialize PyGame only if rendering
+        # Map geometry is compiled once and memory-mapped; all envs share it read-only.
+        # A map pool (a MapPool or a .pool path) switches to a random map on every reset.
+        self.use_distance_field = use_distance_field
+        self.coherent_rays = coherent_rays
+        # Samples rays from a visibility polygon; cheaper than casting them at high ray counts
+        self.visibility_sensor = visibility_sensor
+        if isinstance(map, str) and map.endswith(POOL_SUFFIX):
+            map = MapPool(map)
+        self.map_pool = map if isinstance(map, MapPool) else None
+        # The map or pool file, for recordings to reopen; None for a GameMap built in memory
+        if self.map_pool is not None:
+            self.map_source = os.path.abspath(self.map_pool.path)
+        elif isinstance(map, str):
+            self.map_source = os.path.abspath(map_path(map))
+        else:
+            self.map_source = None
+        self.map_index = 0
+        self.walls = None
+        self._set_map(self.map_pool[0] if self.map_pool is not None else load_map(map))
+
+        # Initialize PyGame only if rendering to a window; rgb_array is pure NumPy
         if self.render_mode == "human":
+            import pygame
             pygame.init()
-            self.screen = pygame.display.set_mode((GAME_WIDTH, GAME_HEIGHT))
+            self.screen = pygame.display.set_mode((int(self.map.size[0]), int(self.map.size[1])))
+            self.walls = [Wall(*w) for w in self.wall_array.tolist()]
             pygame.display.set_caption("Car RL Env")
         else:
             self.screen = None
 
         self.clock = None
         self.car = None
-        self.walls = None
         self.target = None
-        self.steps = 0
+        self.steps = 0  # physics ticks, so episodes last as long with any action_repeat
         self.max_steps = 1000  # prevent infinite episodes
-
-        # Define walls (same as in your main)
-        self.wall_defs = [
-          (0, 0, GAME_WIDTH, 0),
-          (GAME_WIDTH, 0, GAME_WIDTH, GAME_HEIGHT),
-          (GAME_WIDTH, GAME_HEIGHT, 0, GAME_HEIGHT),
-          (0, GAME_HEIGHT, 0, 0),
-
-          # Top section
-          (150, 100, 350, 100),      # top-left horizontal
-          (450, 100, 650, 100),      # top-right horizontal
-
-          # Upper verticals
-          (200, 150, 200, 250),      # left upper vertical
-          (600, 150, 600, 250),      # right upper vertical
-
-          # Center bar
-          (300, 280, 500, 280),      # center horizontal bar
-
-          # Lower verticals
-          (200, 350, 200, 450),      # left lower vertical
-          (600, 350, 600, 450),      # right lower vertical
-
-          # Bottom section
-          (150, 500, 350, 500),      # bottom-left horizontal
-          (450, 500, 650, 500),      # bottom-right horizontal
-
-          # Small mid-bottom block
-          (380, 420, 420, 420),      # short horizontal segment
-      ]
+        # Geodesic distance field toward the target and the car's distance along it
+        self.route_field = None
+        self.route_distance = math.inf
+
+        # Per-step sensor results, shared by obs, info, reward and rendering
+        self.frame = SensorFrame()
+        # Observation is assembled here; step/reset return a copy
+        self.obs_buffer = np.zeros(self.observation_space.shape, dtype=np.float32)
+
+        # Per-phase timings, collected with pop_phase_timings(); no-ops unless profiling
+        self.timer = PhaseTimer() if profile else NULL_TIMER
+
+    def _set_map(self, game_map):
+        self.map = game_map
+        self.wall_array = game_map.walls
+        if self.use_distance_field:
+            self.wall_grid = game_map.wall_grid
+        else:
+            self.wall_grid = game_map.grid_without_field()
+        # Rays are cast through this; the coherent caster reuses the last step's wall set
+        if self.visibility_sensor:
+            self.ray_caster = VisibilitySensor(self.wall_grid)
+        elif self.coherent_rays:
+            self.ray_caster = CoherentRayCaster(self.wall_grid)
+        else:
+            self.ray_caster = self.wall_grid
+        # Free-space tables for spawning, sampled through self.np_random
+        self.target_spawns = game_map.target_spawns
+        self.car_spawns = game_map.car_spawns
+        # Drawn from the new walls on next use
+        self.rasterizer = None
+        self._flow_fields = None
+        self._branches = None
+        if self.walls is not None:
+            self.walls = [Wall(*w) for w in self.wall_array.tolist()]
+
+    def select_map(self, index):
+        """Switches to map `index` of the pool; a no-op if it is already loaded."""
+        if self.map_pool is None:
+            if index != 0:
+                raise ValueError("This env has a single map; only map index 0 exists")
+            return
+        index = int(index) % len(self.map_pool)
+        if index != self.map_index:
+            self._set_map(self.map_pool[index])
+            self.map_index = index
+
+    @property
+    def flow_fields(self):
+        """FlowFields of the current map, built on first use."""
+        if self._flow_fields is None:
+            self._flow_fields = FlowFields(self.wall_grid, self.map.size, CAR_SIZE[1] / 2)
+        return self._flow_fields
+
+    def precompute_flow_fields(self):
+        """Computes the route fields toward every target spawn cell up front."""
+        spawns = self.target_spawns
+        self.flow_fields.precompute(spawns.cells + spawns.cell_size / 2)
+
+    def _start_route(self):
+        fields = self.flow_fields
+        self.route_field = fields.field(fields.target_cell(self.target.x, self.target.y))
+        self.route_distance = fields.distance(self.route_field, self.car.x, self.car.y)
 
     def _get_obs(self):
-        # Get ray data
-        ray_data = self.car.get_ray_data(self.walls)
-        ray_distances = np.array([d / RAY_LENGTH for d, _ in ray_data], dtype=np.float32)
+        frame = self.frame
+        obs = self.obs_buffer
+        np.divide(frame.ray_distances, RAY_LENGTH, out=obs[:self.num_rays])
 
         # Add target info: normalized distance and angle
-        to_target = self.target.pos - self.car.pos
-        dist_to_target = np.linalg.norm(to_target) / np.sqrt(GAME_WIDTH**2 + GAME_HEIGHT**2)
-        angle_to_target = np.arctan2(to_target.y, to_target.x) - np.radians(self.car.angle)
-        angle_to_target = (angle_to_target + np.pi) % (2 * np.pi) - np.pi  # normalize to [-π, π]
-        angle_to_target /= np.pi  # normalize to [-1, 1]
+        dist_to_target = frame.target_distance / self.map.diagonal
+        angle_to_target = math.atan2(frame.target_dy, frame.target_dx) - math.radians(self.car.angle)
+        angle_to_target = (angle_to_target + math.pi) % (2 * math.pi) - math.pi  # normalize to [-π, π]
+        obs[self.num_rays] = dist_to_target
+        obs[self.num_rays + 1] = angle_to_target / math.pi  # normalize to [-1, 1]
 
-        return np.concatenate([ray_distances, [dist_to_target, angle_to_target]], dtype=np.float32)
+        return obs.copy()
 
     def _get_info(self):
         return {
-            "distance_to_target": np.linalg.norm(self.target.pos - self.car.pos),
+            "distance_to_target": self.frame.target_distance,
             "speed": self.car.speed,
         }
 
     def reset(self, seed=None, options=None) -> Tuple[np.ndarray, Dict[str, Any]]:
+        timer = self.timer
+        t = timer.start()
         super().reset(seed=seed)
-        if seed is not None:
-            np.random.seed(seed)
-
-        # Create walls
-        self.walls = [Wall(*w) for w in self.wall_defs]
 
-        # Spawn car (fixed or random)
-        self.car = Car(100, 300)
+        # Pick the episode's map; options={"map_index": i} chooses one
+        if self.map_pool is not None:
+            if options and "map_index" in options:
+                self.select_map(options["map_index"])
+            else:
+                self.select_map(self.np_random.integers(len(self.map_pool)))
+
+        # Spawn car (fixed or random); the car and target objects are reused
+        if self.random_start:
+            x, y = self.car_spawns.sample(self.np_random)
+            self._place_car(x, y, float(self.np_random.uniform(0, 360)), 0.0)
+        else:
+            self._place_car(*self.map.car_start, 0.0, 0.0)
 
         # Spawn target
-        self.target = spawn_target(self.walls)
+        x, y = self.target_spawns.sample_away_from(self.np_random, self.car.pos, self.min_target_distance)
+        self._place_target(x, y)
 
         self.steps = 0
+        if self.progress_reward:
+            self._start_route()
+        t = timer.lap("reset.spawn", t)
+
+        clearance = self.wall_grid.clearance_at(self.car.x, self.car.y, self.car.radius)
+        self.frame.update(self.car, self.target, self.ray_caster, clearance)
+        t = timer.lap("reset.sensing", t)
 
         observation = self._get_obs()
         info = self._get_info()
+        t = timer.lap("reset.observation", t)
 
         if self.render_mode == "human":
             self._render_frame()
+            timer.lap("reset.render", t)
 
         return observation, info
 
 
-    def step(self, action: np.ndarray):
-        throttle, steer = action
-
-        # Apply continuous control
-        self.car.speed += throttle * 0.5  # scale as needed
-        self.car.speed = np.clip(self.car.speed, -3.0, 5.0)  # adjust based on your constants
-
-        if abs(self.car.speed) > 0.1:
-            turn_factor = 1 if self.car.speed >= 0 else -1
-            self.car.angle += steer * 3.0 * turn_factor  # ROTATION_SPEED equivalent
-
-        self.car.update_physics()
-        self.car.update_position(self.walls)
-
-        # Check collisions
-        collided = False
-        for wall in self.walls:
-            dist, _ = distance_point_to_wall(self.car.pos, wall.start, wall.end)
-            if dist < self.car.radius:
-                collided = True
-                break
+    def _place_car(self, x, y, angle, speed):
+        if self.car is None:
+            self.car = Car(x, y, self.ray_offsets)
+        car = self.car
+        car.x, car.y, car.angle, car.speed = float(x), float(y), float(angle), float(speed)
+
+    def _place_target(self, x, y):
+        if self.target is None:
+            self.target = Target(x, y)
+        target = self.target
+        target.x, target.y = float(x), float(y)
+        target.pos = (target.x, target.y)
+
+    # ------------------ state snapshots ------------------
+    def get_state(self, out=None):
+        """
+        The env state as a STATE_DTYPE record, written into `out` (a
+        0-d or one-element STATE_DTYPE array) if given. Only valid after reset.
+        """
+        if out is None:
+            out = np.zeros((), dtype=STATE_DTYPE)
+        car, target = self.car, self.target
+        rng = self.np_random.bit_generator.state
+        if rng["bit_generator"] != "PCG64":
+            raise TypeError(f"get_state supports PCG64 generators, not {rng['bit_generator']}")
+        state, inc = rng["state"]["state"], rng["state"]["inc"]
+        out["car"] = (car.x, car.y, car.angle, car.speed)
+        out["target"] = (target.x, target.y)
+        out["wall_distance"] = self.frame.wall_distance
+        out["steps"] = self.steps
+        out["map_index"] = self.map_index
+        out["rng"] = (state & _WORD, state >> 64, inc & _WORD, inc >> 64)
+        out["rng_buffer"] = (rng["has_uint32"], rng["uinteger"])
+        return out
+
+    def set_state(self, state, observe=True):
+        """
+        Puts the env back into a get_state record. Returns the observation,
+        or None with observe=False, which skips sensing: step() senses
+        anyway, so branches that only step from the state need not.
+        """
+        state = state.reshape(())
+        self.select_map(int(state["map_index"]))
+        self._place_car(*state["car"].tolist())
+        self._place_target(*state["target"].tolist())
+        self.steps = int(state["steps"])
+        words = state["rng"].tolist()
+        has_uint32, uinteger = state["rng_buffer"].tolist()
+        self.np_random.bit_generator.state = {
+            "bit_generator": "PCG64",
+            "state": {"state": words[0] | words[1] << 64, "inc": words[2] | words[3] << 64},
+            "has_uint32": has_uint32,
+            "uinteger": uinteger,
+        }
+        if self.progress_reward:
+            self._start_route()
+
+        wall_distance = float(state["wall_distance"])
+        if not observe:
+            # All step() reads from the previous frame
+            self.frame.wall_distance = wall_distance
+            self.frame.collided = wall_distance < self.car.radius
+            return None
+        self.frame.update(self.car, self.target, self.ray_caster, wall_distance)
+        return self._get_obs()
+
+    def run_branches(self, state, actions):
+        """
+        Plays `actions` (B, T, 2) from `state` once per branch b, stopping a
+        branch when its episode ends. Returns (returns, steps taken, final
+        states) with shapes (B,), (B,), (B,) and leaves the env in `state`.
+        Wrappers around the env do not see these steps.
+
+        With one tick per action and no progress reward, all branches are
+        stepped at once as the cars of a CarBatch; otherwise one by one.
+        """
+        actions = np.asarray(actions)
+        self.select_map(int(state.reshape(())["map_index"]))
+        if self.action_repeat == 1 and not self.progress_reward:
+            finals = np.repeat(state.reshape(1), len(actions))
+            returns, lengths = self._branch_batch(len(actions)).rollout(actions, finals)
+            self.set_state(state)
+            return returns, lengths, finals
+
+        returns = np.zeros(len(actions))
+        lengths = np.zeros(len(actions), dtype=np.int64)
+        finals = np.zeros(len(actions), dtype=STATE_DTYPE)
+        for b, branch in enumerate(actions):
+            self.set_state(state, observe=False)
+            total, taken = 0.0, 0
+            for action in branch:
+                _, reward, terminated, truncated, _ = self.step(action)
+                total += reward
+                taken += 1
+                if terminated or truncated:
+                    break
+            returns[b] = total
+            lengths[b] = taken
+            self.get_state(finals[b:b + 1])
+        self.set_state(state)
+        return returns, lengths, finals
+
+    def _branch_batch(self, num_branches):
+        """A CarBatch of `num_branches` cars on the current map, kept between calls."""
+        if self._branches is None or self._branches.num_cars != num_branches:
+            self._branches = CarBatch(num_branches, map=self.map, use_distance_field=self.use_distance_field)
+        self._branches.max_steps = self.max_steps
+        return self._branches
 
-        # Check target
-        reached = self.car.check_target_reached(self.target)
+    def step(self, action: np.ndarray):
+        timer = self.timer
+        t = timer.start()
+        throttle, steer = float(action[0]), float(action[1])
+        car = self.car
+
+        if self.action_repeat == 1:
+            # Apply continuous control
+            car.apply_control(throttle, steer)
+            t = timer.lap("physics", t)
+
+            clearance = car.update_position(self.wall_grid)
+            ticks = 1
+        else:
+            ticks, clearance = self._repeat_control(throttle, steer)
+            t = timer.lap("physics", t)
+        if clearance is None:
+            # Blocked: the car is still where the last frame measured it
+            clearance = self.frame.wall_distance
+        t = timer.lap("collision", t)
+
+        # Sense once; collision, target, obs, info and rendering read the frame
+        self.frame.update(self.car, self.target, self.ray_caster, clearance)
+        collided = self.frame.collided
+        reached = self.frame.target_distance <= TARGET_REACH_DISTANCE
+        t = timer.lap("sensing", t)
 
         # Reward design
         reward = 0.0
@@ -159,25 +388,106 @@ class CarEnv(gym.Env):
         else:
             # Small survival bonus + progress toward target
             reward = 0.1
-            # Optional: reward for reducing distance to target
-            # prev_dist = ... (store in state if needed)
-
-        self.steps += 1
+        # Survival bonus of the ticks before the last one
+        reward += 0.1 * (ticks - 1)
+        if self.progress_reward:
+            # Along the shortest driveable path, so walls between car and target do not mislead
+            distance = self.flow_fields.distance(self.route_field, self.car.x, self.car.y)
+            if distance < math.inf and self.route_distance < math.inf:
+                reward += self.progress_reward * (self.route_distance - distance)
+            self.route_distance = distance
+
+        self.steps += ticks
         if self.steps >= self.max_steps:
             truncated = True
+        t = timer.lap("reward", t)
 
         observation = self._get_obs()
         info = self._get_info()
+        info["ticks"] = ticks
+        t = timer.lap("observation", t)
 
         if self.render_mode == "human":
             self._render_frame()
+            timer.lap("render", t)
 
         return observation, reward, terminated, truncated, info
 
+    def _repeat_control(self, throttle, steer):
+        """
+        Runs up to action_repeat physics ticks of one action, stopping early
+        at the target, a collision or max_steps. Walls are checked with one
+        swept-circle test over the whole path instead of once per tick, so
+        the car cannot slip past a wall corner between ticks. A tick whose
+        move is blocked leaves the car in place with zero speed, like
+        update_position. Returns (ticks run, clearance of the final
+        position, or None if the car ended up not moving).
+        """
+        car, target = self.car, self.target
+        ticks = min(self.action_repeat, max(1, self.max_steps - self.steps))
+        if self.frame.collided:
+            # Only possible at spawn; the step ends after its first tick
+            ticks = 1
+
+        run, moved = 0, False
+        while run < ticks:
+            # Drive the remaining ticks ignoring walls, stopping at the target
+            poses = [(car.x, car.y, car.angle, car.speed)]
+            for _ in range(ticks - run):
+                car.apply_control(throttle, steer)
+                car.advance()
+                poses.append((car.x, car.y, car.angle, car.speed))
+                if math.hypot(target.x - car.x, target.y - car.y) <= TARGET_REACH_DISTANCE:
+                    break
+            path = [pose[:2] for pose in poses]
+            blocked = self.wall_grid.first_contact(path, car.radius)
+            if blocked < 0:
+                run += len(poses) - 1
+                moved = True
+                break
+            # Rewind to the blocked tick, which only steers and stops the car
+            car.x, car.y, car.angle, car.speed = poses[blocked]
+            car.apply_control(throttle, steer)
+            car.speed = 0
+            run += blocked + 1
+            moved = moved or blocked > 0
+
+        if not moved:
+            return run, None
+        return run, self.wall_grid.clearance_at(car.x, car.y, car.radius)
+
+    def pop_phase_timings(self):
+        """
+        {phase: (seconds, calls)} accumulated since the last call, empty
+        unless the env was created with profile=True.
+        """
+        return self.timer.pop()
+
+
+    def render(self):
+        if self.render_mode == "rgb_array":
+            return self._render_rgb_array()
+        if self.render_mode == "human":
+            self._render_frame()
+
+    def _render_rgb_array(self):
+        # Static wall layer is rasterized once, on first use
+        if self.rasterizer is None:
+            self.rasterizer = FrameRasterizer(
+                self.wall_array, *self.map.size, scale=self.render_scale, draw_rays=self.render_rays
+            )
+        frame = self.frame
+        image = self.rasterizer.render(
+            self.car.pos, self.car.angle, self.target.pos, self.target.size,
+            frame.hit_points, frame.ray_distances,
+        )
+        # The rasterizer reuses its buffer, but callers such as RecordVideo keep frames
+        return image.copy()
 
     def _render_frame(self):
         if self.screen is None:
             return
+        import pygame
 
         if self.clock is None:
             self.clock = pygame.time.Clock()
@@ -190,8 +500,8 @@ class CarEnv(gym.Env):
         self.car.draw_car(self.screen)
 
         # Optional: draw rays (slows rendering)
-        ray_data = self.car.get_ray_data(self.walls)
-        for dist, end_pos in ray_data:
+        frame = self.frame
+        for dist, end_pos in zip(frame.ray_distances, frame.hit_points):
             d = min(dist, RAY_LENGTH)
             t = d / RAY_LENGTH
             r = int(235 * (1 - t))
@@ -203,4 +513,5 @@ class CarEnv(gym.Env):
 
     def close(self):
         if self.screen is not None:
+            import pygame
             pygame.quit()
@@ -0,0 +1,540 @@
+# env_server.py
+"""
+CarEnv batches served over TCP, so simulators can run on other hosts.
+
+    python env_server.py --host 0.0.0.0 --allow-remote  # on every simulator host
+    env = RemoteVecEnv(["sim1:5555", "sim2:5555"], envs_per_server=16,
+                       env_kwargs={"map": "default", "action_repeat": 2})
+    python train.py --servers sim1:5555 sim2:5555 --envs-per-server 16
+
+An EnvServer hosts the CarEnvs of one client at a time. The client says
+how many envs it wants and with which CarEnv arguments when it connects,
+so servers need no configuration. RemoteVecEnv is a stable-baselines3
+VecEnv over several servers, with each server's envs in one contiguous
+block, like SharedMemoryVecEnv's workers.
+
+Every message is a header (command, payload length) and a payload.
+Steps carry raw float32 batches: actions to the server; observations,
+rewards, done flags, info values and terminal observations back. Each
+server's envs are stepped in `chunks` requests that are all sent before
+any reply is read. One chunk's reply then travels while the next chunk
+simulates, and all servers simulate at once. Resets and attribute calls
+are JSON.
+
+A server that drops (crash, restart, network failure) is reconnected
+with backoff for up to `reconnect_timeout` seconds. Its envs start new
+episodes, and the interrupted ones are reported done and truncated,
+with info["reconnected"] = True.
+
+The protocol has no authentication: whoever reaches the port can create
+and drive envs. Servers therefore listen on 127.0.0.1 unless started
+with --allow-remote, which should only be used on a trusted network.
+Clients may only pass the CarEnv arguments in ENV_KWARGS, read the
+attributes in GETTABLE_ATTRS, set those in SETTABLE_ATTRS and call the
+methods in CALLABLE_METHODS.
+
+start_local_servers(n) starts n servers on localhost, e.g. for tests.
+"""
+import argparse
+import atexit
+import ipaddress
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+import traceback
+
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from car_env import CarEnv
+from shm_vec_env import INFO_KEYS
+
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("<BI")       # command, payload length
+CHUNK = struct.Struct("<II")        # first env and env count of a step request
+HELLO, RESET, STEP, CALL, CLOSE, ERROR = range(1, 7)
+DONE, TRUNCATED = 1, 2              # step flag bits
+
+# What clients may ask of a server's envs
+ENV_KWARGS = frozenset({
+    "map", "random_start", "min_target_distance", "use_distance_field", "coherent_rays",
+    "action_repeat", "ray_counts", "visibility_sensor", "progress_reward", "profile",
+})
+GETTABLE_ATTRS = frozenset({
+    "render_mode", "max_steps", "action_repeat", "ray_counts", "random_start",
+    "min_target_distance", "progress_reward", "visibility_sensor", "map_index", "steps",
+})
+SETTABLE_ATTRS = frozenset({"max_steps", "random_start", "min_target_distance"})
+CALLABLE_METHODS = frozenset({"pop_phase_timings"})
+
+
+# ------------------ messages ------------------
+def _send(sock, command, payload=b""):
+    sock.sendall(HEADER.pack(command, len(payload)) + payload)
+
+
+def _recv_exact(sock, size):
+    data = bytearray(size)
+    view = memoryview(data)
+    while view:
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("connection closed")
+        view = view[received:]
+    return data
+
+
+def _recv(sock):
+    command, size = HEADER.unpack(_recv_exact(sock, HEADER.size))
+    return command, _recv_exact(sock, size)
+
+
+def _plain(value):
+    """JSON fallback for NumPy scalars and arrays."""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} cannot be sent to or from an env server")
+
+
+def _json(value):
+    return json.dumps(value, default=_plain).encode()
+
+
+def _box(space):
+    return {"low": space.low, "high": space.high, "shape": space.shape}
+
+
+def _unbox(spec):
+    return gym.spaces.Box(
+        low=np.array(spec["low"], dtype=np.float32).reshape(spec["shape"]),
+        high=np.array(spec["high"], dtype=np.float32).reshape(spec["shape"]),
+        dtype=np.float32,
+    )
+
+
+# ------------------ server ------------------
+class EnvServer:
+    """
+    Hosts CarEnvs for one RemoteVecEnv connection at a time; the envs are
+    kept across connections asking for the same ones.
+    """
+
+    def __init__(self, host="127.0.0.1", port=5555):
+        self.listener = socket.create_server((host, port))
+        self.address = self.listener.getsockname()[:2]
+        self.envs = []
+        self.config = None
+        self.info_keys = INFO_KEYS
+
+    def serve_forever(self):
+        # The one line on stdout, read by start_local_servers
+        print(f"env server listening on {self.address[0]}:{self.address[1]}", flush=True)
+        while True:
+            conn, peer = self.listener.accept()
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            try:
+                self._serve(conn)
+            except OSError as e:
+                print(f"client {peer[0]}:{peer[1]} dropped: {e}", file=sys.stderr, flush=True)
+            finally:
+                conn.close()
+
+    def _serve(self, conn):
+        while True:
+            command, payload = _recv(conn)
+            if command == CLOSE:
+                return
+            try:
+                reply = self._handle(command, payload)
+            except Exception:
+                _send(conn, ERROR, traceback.format_exc().encode())
+            else:
+                _send(conn, command, reply)
+
+    def _handle(self, command, payload):
+        if command == HELLO:
+            return self._hello(json.loads(payload))
+        if command == RESET:
+            return self._reset(json.loads(payload))
+        if command == STEP:
+            return self._step(payload)
+        if command == CALL:
+            return _json(self._call(json.loads(payload)))
+        raise ValueError(f"Unknown command {command}")
+
+    def _hello(self, request):
+        if request["version"] != PROTOCOL_VERSION:
+            raise ValueError(f"Client speaks protocol {request['version']}, server {PROTOCOL_VERSION}")
+        refused = set(request["env_kwargs"]) - ENV_KWARGS
+        if refused:
+            raise PermissionError(f"CarEnv arguments not allowed over the network: {sorted(refused)}")
+        config = (request["num_envs"], request["env_kwargs"])
+        if config != self.config:
+            for env in self.envs:
+                env.close()
+            self.envs, self.config = [], None
+            self.envs = [CarEnv(**request["env_kwargs"]) for _ in range(request["num_envs"])]
+            self.config = config
+        self.info_keys = tuple(request["info_keys"])
+        env = self.envs[0]
+        self.obs_dim = env.observation_space.shape[0]
+        self.act_dim = env.action_space.shape[0]
+        return _json({"observation_space": _box(env.observation_space), "action_space": _box(env.action_space)})
+
+    def _reset(self, request):
+        obs = np.empty((len(self.envs), self.obs_dim), dtype=np.float32)
+        for i, env in enumerate(self.envs):
+            options = request["options"][i]
+            maybe_options = {"options": options} if options else {}
+            obs[i], _ = env.reset(seed=request["seeds"][i], **maybe_options)
+        return obs.tobytes()
+
+    def _step(self, payload):
+        start, count = CHUNK.unpack_from(payload)
+        actions = np.frombuffer(payload, dtype=np.float32, offset=CHUNK.size).reshape(count, self.act_dim)
+        obs = np.empty((count, self.obs_dim), dtype=np.float32)
+        rewards = np.empty(count, dtype=np.float32)
+        flags = np.zeros(count, dtype=np.uint8)
+        info = np.empty((count, len(self.info_keys)), dtype=np.float32)
+        terminal = []
+        for k in range(count):
+            env = self.envs[start + k]
+            observation, reward, terminated, truncated, step_info = env.step(actions[k])
+            rewards[k] = reward
+            flags[k] = DONE * (terminated or truncated) | TRUNCATED * (truncated and not terminated)
+            for col, key in enumerate(self.info_keys):
+                info[k, col] = step_info.get(key, np.nan)
+            if terminated or truncated:
+                terminal.append(observation)
+                observation, _ = env.reset()
+            obs[k] = observation
+        terminal = np.array(terminal, dtype=np.float32).reshape(-1, self.obs_dim)
+        return b"".join((obs.tobytes(), rewards.tobytes(), flags.tobytes(), info.tobytes(), terminal.tobytes()))
+
+    def _call(self, request):
+        kind, name = request["kind"], request["name"]
+        allowed = {"get_attr": GETTABLE_ATTRS, "set_attr": SETTABLE_ATTRS, "env_method": CALLABLE_METHODS}
+        if name not in allowed.get(kind, ()):
+            raise PermissionError(f"{kind} {name!r} is not allowed over the network")
+        envs = [self.envs[i].unwrapped for i in request["indices"]]
+        if kind == "get_attr":
+            return [getattr(env, name) for env in envs]
+        if kind == "set_attr":
+            for env in envs:
+                setattr(env, name, request["value"])
+            return None
+        return [getattr(env, name)(*request["args"], **request["kwargs"]) for env in envs]
+
+
+# ------------------ client ------------------
+class _Server:
+    """Client side of one server: its socket and the block of envs it hosts."""
+
+    def __init__(self, address, start, count, chunks):
+        host, port = address.rsplit(":", 1)
+        self.address = (host, int(port))
+        self.start = start
+        self.count = count
+        # Step requests as (first env, env count), local to this server
+        bounds = np.linspace(0, count, min(chunks, count) + 1).astype(int).tolist()
+        self.chunks = [(a, b - a) for a, b in zip(bounds[:-1], bounds[1:])]
+        self.sock = None
+        self.error = None           # why the last connection was dropped
+        self.restart_obs = None     # first observations after a reconnect, not yet reported
+
+    @property
+    def name(self):
+        return f"{self.address[0]}:{self.address[1]}"
+
+    def connect(self, timeout):
+        self.error = None
+        self.sock = socket.create_connection(self.address, timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _check(self):
+        if self.sock is None:
+            raise ConnectionError(self.error or "not connected")
+
+    def send(self, command, payload=b""):
+        self._check()
+        _send(self.sock, command, payload)
+
+    def expect(self, command):
+        """The payload of the next reply, which must answer `command`."""
+        self._check()
+        reply, payload = _recv(self.sock)
+        if reply == ERROR:
+            # The connection stays usable; step_wait drops it if replies are still in flight
+            raise RuntimeError(f"env server {self.name} failed:\n{payload.decode()}")
+        if reply != command:
+            raise ConnectionError(f"expected reply {command}, got {reply}")
+        return payload
+
+    def request(self, command, payload=b""):
+        self.send(command, payload)
+        return self.expect(command)
+
+    def close(self, error=None):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            self.error = error
+
+
+class RemoteVecEnv(VecEnv):
+    """
+    `envs_per_server` CarEnvs on each EnvServer in `addresses` ("host:port"),
+    created with `env_kwargs` (JSON-serializable CarEnv arguments).
+
+    Steps pipeline `chunks` requests per server; `timeout` bounds every
+    socket operation, and a server that fails is reconnected for up to
+    `reconnect_timeout` seconds before the error is raised.
+    """
+
+    def __init__(self, addresses, envs_per_server=1, env_kwargs=None, chunks=2,
+                 timeout=60.0, reconnect_timeout=30.0, info_keys=INFO_KEYS):
+        self.info_keys = tuple(info_keys)
+        self.timeout = timeout
+        self.reconnect_timeout = reconnect_timeout
+        self.hello = {
+            "version": PROTOCOL_VERSION,
+            "num_envs": envs_per_server,
+            "env_kwargs": env_kwargs or {},
+            "info_keys": self.info_keys,
+        }
+        self.servers = [
+            _Server(address, s * envs_per_server, envs_per_server, chunks)
+            for s, address in enumerate(addresses)
+        ]
+        spaces = None
+        for server in self.servers:
+            spaces = self._connect(server)
+        observation_space = _unbox(spaces["observation_space"])
+        action_space = _unbox(spaces["action_space"])
+
+        num_envs = len(self.servers) * envs_per_server
+        self.obs_dim = observation_space.shape[0]
+        self.act_dim = action_space.shape[0]
+        self.obs = np.zeros((num_envs, self.obs_dim), dtype=np.float32)
+        self.previous_obs = self.obs.copy()
+        self.rewards = np.zeros(num_envs, dtype=np.float32)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        # Servers must be connected first: VecEnv.__init__ queries their render_mode
+        super().__init__(num_envs, observation_space, action_space)
+        self.waiting = False
+        self.closed = False
+
+    # ------------------ connections ------------------
+    def _connect(self, server):
+        """Connects `server` and sends HELLO, retrying with backoff; returns the reply."""
+        deadline = time.monotonic() + self.reconnect_timeout
+        delay = 0.05
+        while True:
+            try:
+                server.connect(self.timeout)
+                return json.loads(server.request(HELLO, _json(self.hello)))
+            except OSError as e:
+                server.close()
+                if time.monotonic() + delay > deadline:
+                    raise ConnectionError(f"env server {server.name} unreachable: {e}") from e
+                time.sleep(delay)
+                delay = min(2 * delay, 2.0)
+
+    def _restart(self, server, error):
+        """Reconnects a failed server and starts new episodes on all its envs."""
+        print(f"env server {server.name} failed ({error}); reconnecting", file=sys.stderr, flush=True)
+        server.close()
+        self._connect(server)
+        server.restart_obs = self._reset_server(server, [None] * server.count, [{}] * server.count)
+
+    def _reset_server(self, server, seeds, options):
+        payload = server.request(RESET, _json({"seeds": seeds, "options": options}))
+        return np.frombuffer(payload, dtype=np.float32).reshape(server.count, self.obs_dim)
+
+    def _read_step(self, server, first, count, infos):
+        payload = server.expect(STEP)
+        rows = slice(first, first + count)
+        offset = 0
+
+        def take(dtype, shape):
+            nonlocal offset
+            array = np.frombuffer(payload, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+            offset += array.nbytes
+            return array
+
+        self.obs[rows] = take(np.float32, (count, self.obs_dim))
+        self.rewards[rows] = take(np.float32, count)
+        flags = take(np.uint8, count)
+        info = take(np.float32, (count, len(self.info_keys)))
+        terminal = take(np.float32, (int(np.count_nonzero(flags & DONE)), self.obs_dim))
+        self.dones[rows] = flags & DONE
+
+        done = 0
+        for k, (values, flag) in enumerate(zip(info.tolist(), flags.tolist())):
+            step_info = dict(zip(self.info_keys, values))
+            step_info["TimeLimit.truncated"] = bool(flag & TRUNCATED)
+            if flag & DONE:
+                step_info["terminal_observation"] = terminal[done].copy()
+                done += 1
+            infos[first + k] = step_info
+
+    def _report_restart(self, server, infos):
+        """Ends the interrupted episodes of a reconnected server, truncated."""
+        rows = slice(server.start, server.start + server.count)
+        self.obs[rows] = server.restart_obs
+        self.rewards[rows] = 0.0
+        self.dones[rows] = True
+        for i in range(server.start, server.start + server.count):
+            infos[i] = {
+                **dict.fromkeys(self.info_keys, np.nan),
+                "TimeLimit.truncated": True,
+                "terminal_observation": self.previous_obs[i].copy(),
+                "reconnected": True,
+            }
+        server.restart_obs = None
+
+    # ------------------ VecEnv API ------------------
+    def reset(self):
+        for server in self.servers:
+            rows = slice(server.start, server.start + server.count)
+            seeds, options = self._seeds[rows], self._options[rows]
+            try:
+                self.obs[rows] = self._reset_server(server, seeds, options)
+            except OSError as e:
+                self._restart(server, e)
+                self.obs[rows] = self._reset_server(server, seeds, options)
+            server.restart_obs = None
+        self.reset_infos = [{} for _ in range(self.num_envs)]
+        self._reset_seeds()
+        self._reset_options()
+        return self.obs.copy()
+
+    def step_async(self, actions):
+        actions = np.asarray(actions, dtype=np.float32).reshape(self.num_envs, self.act_dim)
+        self.previous_obs[:] = self.obs
+        for server in self.servers:
+            if server.restart_obs is not None:
+                continue
+            try:
+                for first, count in server.chunks:
+                    rows = actions[server.start + first:server.start + first + count]
+                    server.send(STEP, CHUNK.pack(first, count) + rows.tobytes())
+            except OSError as e:
+                # Reconnected in step_wait, which reports the failure
+                server.close(e)
+        self.waiting = True
+
+    def step_wait(self):
+        infos = [None] * self.num_envs
+        try:
+            for server in self.servers:
+                if server.restart_obs is None:
+                    try:
+                        for first, count in server.chunks:
+                            self._read_step(server, server.start + first, count, infos)
+                    except OSError as e:
+                        self._restart(server, e)
+                if server.restart_obs is not None:
+                    self._report_restart(server, infos)
+        except RuntimeError:
+            # Replies still in flight would be read as answers to later requests
+            for server in self.servers:
+                server.close()
+            raise
+        finally:
+            self.waiting = False
+        return self.obs.copy(), self.rewards.copy(), self.dones.copy(), infos
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self.step_wait()
+        for server in self.servers:
+            try:
+                server.send(CLOSE)
+            except OSError:
+                pass
+            server.close()
+        self.closed = True
+
+    def _call(self, indices, **request):
+        """Sends a CALL to every server hosting one of `indices`; concatenated replies."""
+        groups = {}
+        for i in self._get_indices(indices):
+            for server in self.servers:
+                if server.start <= i < server.start + server.count:
+                    groups.setdefault(server, []).append(i - server.start)
+        results = []
+        for server, local in groups.items():
+            payload = _json({**request, "indices": local})
+            try:
+                reply = server.request(CALL, payload)
+            except OSError as e:
+                self._restart(server, e)
+                reply = server.request(CALL, payload)
+            results.extend(json.loads(reply) or [])
+        return results
+
+    def get_attr(self, attr_name, indices=None):
+        return self._call(indices, kind="get_attr", name=attr_name)
+
+    def set_attr(self, attr_name, value, indices=None):
+        self._call(indices, kind="set_attr", name=attr_name, value=value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return self._call(indices, kind="env_method", name=method_name,
+                          args=method_args, kwargs=method_kwargs)
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        # Servers build bare CarEnvs
+        return [False for _ in self._get_indices(indices)]
+
+
+# ------------------ local servers ------------------
+def start_local_servers(count, host="127.0.0.1"):
+    """
+    Starts `count` EnvServer processes on free ports of `host` and returns
+    their "host:port" addresses and the processes, which are terminated
+    at exit.
+    """
+    addresses, processes = [], []
+    for _ in range(count):
+        process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--host", host, "--port", "0"],
+            stdout=subprocess.PIPE, text=True,
+        )
+        atexit.register(process.terminate)
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"env server exited with code {process.wait()}")
+        addresses.append(line.split()[-1])
+        processes.append(process)
+    return addresses, processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve CarEnvs to RemoteVecEnv clients over TCP")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=5555, help="port to listen on (0 = any free port)")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="allow a --host other than loopback; the protocol has no authentication, "
+                             "so only do this on a trusted network")
+    args = parser.parse_args()
+    if not args.allow_remote and not ipaddress.ip_address(socket.gethostbyname(args.host)).is_loopback:
+        parser.error(f"--host {args.host} is reachable from other hosts; add --allow-remote to serve on it")
+
+    try:
+        EnvServer(args.host, args.port).serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
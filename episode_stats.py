@@ -0,0 +1,321 @@
+# episode_stats.py
+"""
+Per-episode statistics, written in the background to columnar .npy files.
+
+    sink = StatsSink.shared("logs/stats")
+    env = EpisodeStatsRecorder(CarEnv(profile=True), sink)
+    ...
+    stats = read_stats("logs/stats")         # {column: array}
+    python episode_stats.py logs/stats       # summary table
+
+EpisodeStatsRecorder adds one row per finished episode to a StatsSink:
+reward, length, ticks, success, collision, time_to_target (simulated
+seconds, NaN unless the target was reached), wall_time, end_time, map_index
+and, for envs created with profile=True, seconds spent in every CarEnv
+phase as phase.<name>.
+
+The sink only appends rows to an in-memory list. A background thread swaps
+that list out every `flush_rows` rows or `flush_seconds` seconds and
+appends the rows to one .npy file per column, so stepping never waits for
+the disk. Each process writes its own sink directory under the root
+(sink_<pid>); a column file's header is rewritten after every append,
+so the files are valid .npy at all times and a crash loses at most the
+rows not yet flushed.
+"""
+import argparse
+import atexit
+import glob
+import os
+import struct
+import threading
+import time
+
+import gymnasium as gym
+import numpy as np
+
+# Columns with a fixed type; anything else (phase timings) is float32
+COLUMNS = {
+    "reward": np.float64,
+    "length": np.int32,
+    "ticks": np.int32,
+    "success": np.bool_,
+    "collision": np.bool_,
+    "time_to_target": np.float32,
+    "wall_time": np.float32,
+    "end_time": np.float64,
+    "map_index": np.int32,
+}
+HEADER_SIZE = 128       # fixed, so the header can be rewritten in place as rows are added
+
+
+# ------------------ column files ------------------
+def _npy_header(dtype, rows):
+    header = repr({
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": (rows,),
+    })
+    header = header.ljust(HEADER_SIZE - 10 - 1) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+def _missing(dtype, rows):
+    """Filler for rows that have no value in a column: NaN, or zero for ints and bools."""
+    if np.issubdtype(dtype, np.floating):
+        return np.full(rows, np.nan, dtype=dtype)
+    return np.zeros(rows, dtype=dtype)
+
+
+class _ColumnFile:
+    """One .npy file that grows by appending rows and rewriting its header."""
+
+    def __init__(self, path, dtype, rows_before):
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.file = open(path, "w+b")
+        self.file.write(_npy_header(self.dtype, 0))
+        if rows_before:
+            # Column first seen after earlier rows were written
+            self.append(_missing(self.dtype, rows_before))
+
+    def append(self, values):
+        self.file.seek(0, os.SEEK_END)
+        self.file.write(np.ascontiguousarray(values, dtype=self.dtype).tobytes())
+        self.file.flush()
+        self.rows += len(values)
+        # Header last: a crash in between leaves the old, shorter, valid array
+        self.file.seek(0)
+        self.file.write(_npy_header(self.dtype, self.rows))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# ------------------ sink ------------------
+class StatsSink:
+    """
+    Collects episode rows (dicts of scalars) and writes them to `directory`
+    from a background thread. add() never touches the disk.
+    """
+
+    _shared = {}
+
+    def __init__(self, directory, flush_rows=256, flush_seconds=10.0):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.pending = []
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.closed = False
+        self.users = 0
+        # Opened by the writer thread on the first flush, so idle sinks leave no files
+        self.columns = {}
+        self.rows = 0
+        self.thread = threading.Thread(target=self._run, name="stats-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def shared(cls, root, **kwargs):
+        """
+        The sink of this process under `root` (root/sink_<pid>), created on
+        first use, so every env in a worker feeds one writer thread.
+        """
+        key = (root, os.getpid())
+        sink = cls._shared.get(key)
+        if sink is None or sink.closed:
+            sink = cls._shared[key] = cls(os.path.join(root, f"sink_{os.getpid()}"), **kwargs)
+        return sink
+
+    def add(self, row):
+        with self.lock:
+            self.pending.append(row)
+            full = len(self.pending) >= self.flush_rows
+        if full:
+            self.wake.set()
+
+    def _run(self):
+        while True:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            with self.lock:
+                rows, self.pending = self.pending, []
+                closing = self.closed
+            if rows:
+                self._write(rows)
+            if closing:
+                for column in self.columns.values():
+                    column.close()
+                return
+
+    def _write(self, rows):
+        names = {name for row in rows for name in row}
+        if not self.columns:
+            os.makedirs(self.directory, exist_ok=True)
+        for name in sorted(names - self.columns.keys()):
+            path = os.path.join(self.directory, f"{name}.npy")
+            self.columns[name] = _ColumnFile(path, COLUMNS.get(name, np.float32), self.rows)
+        for name, column in self.columns.items():
+            if name in names:
+                values = np.array([row.get(name, np.nan) for row in rows], dtype=np.float64)
+                if not np.issubdtype(column.dtype, np.floating):
+                    values = np.nan_to_num(values)
+            else:
+                values = _missing(column.dtype, len(rows))
+            column.append(values)
+        self.rows += len(rows)
+
+    def flush(self):
+        """Asks the writer thread to write what is pending now; does not wait."""
+        self.wake.set()
+
+    def acquire(self):
+        self.users += 1
+        return self
+
+    def release(self):
+        """Drops one user; the last one closes the sink."""
+        self.users -= 1
+        if self.users <= 0:
+            self.close()
+
+    def close(self):
+        """Writes everything pending and stops the writer thread."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.wake.set()
+        self.thread.join()
+
+
+# ------------------ env wrapper ------------------
+class EpisodeStatsRecorder(gym.Wrapper):
+    """Adds a row to `sink` for every episode of the wrapped CarEnv."""
+
+    def __init__(self, env, sink):
+        super().__init__(env)
+        self.sink = sink.acquire()
+        # Physics ticks per simulated second, before any action_repeat
+        self.tick_rate = type(env.unwrapped).metadata["render_fps"]
+        self.in_episode = False
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self.reward = 0.0
+        self.length = 0
+        self.ticks = 0
+        self.started = time.perf_counter()
+        self.phases_at_start = self.env.unwrapped.timer.totals()
+        self.in_episode = True
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.reward += reward
+        self.length += 1
+        self.ticks += info.get("ticks", 1)
+        if self.in_episode and (terminated or truncated):
+            self._add_row(terminated)
+        return obs, reward, terminated, truncated, info
+
+    def _add_row(self, terminated):
+        base = self.env.unwrapped
+        collision = terminated and base.frame.collided
+        success = terminated and not collision
+        row = {
+            "reward": self.reward,
+            "length": self.length,
+            "ticks": self.ticks,
+            "success": success,
+            "collision": collision,
+            "time_to_target": self.ticks / self.tick_rate if success else np.nan,
+            "wall_time": time.perf_counter() - self.started,
+            "end_time": time.time(),
+            "map_index": base.map_index,
+        }
+        phases = base.timer.totals()
+        for name, seconds in phases.items():
+            if not name.startswith("reset."):
+                row[f"phase.{name}"] = seconds - self.phases_at_start.get(name, 0.0)
+        self.sink.add(row)
+        self.in_episode = False
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.release()
+            self.sink = None
+        super().close()
+
+
+# ------------------ reader ------------------
+def _load_sink(directory):
+    arrays = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.npy"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        # Plain ndarray views of the mappings, as in game_map.read_cache
+        array = np.load(path, mmap_mode="r")
+        arrays[name] = array.view(np.ndarray) if isinstance(array, np.memmap) else array
+    if arrays:
+        # A writer killed between two column appends leaves some columns longer
+        rows = min(len(a) for a in arrays.values())
+        arrays = {name: a[:rows] for name, a in arrays.items()}
+    return arrays
+
+
+def read_stats(path):
+    """
+    {column: array} of a stats root or of one sink directory. A single
+    sink is memory-mapped without copying; several sinks (one per worker
+    process) are concatenated, which copies.
+    """
+    if glob.glob(os.path.join(path, "*.npy")):
+        return _load_sink(path)
+    sinks = [_load_sink(d) for d in sorted(glob.glob(os.path.join(path, "sink_*")))]
+    sinks = [s for s in sinks if s]
+    if len(sinks) == 1:
+        return sinks[0]
+    names = sorted({name for s in sinks for name in s})
+    stats = {}
+    for name in names:
+        dtype = COLUMNS.get(name, np.float32)
+        stats[name] = np.concatenate([
+            s[name] if name in s else _missing(np.dtype(dtype), len(next(iter(s.values()))))
+            for s in sinks
+        ]) if sinks else np.zeros(0, dtype=dtype)
+    return stats
+
+
+def summarize(stats):
+    """Headline numbers of a read_stats result, as a dict."""
+    episodes = len(stats["reward"]) if "reward" in stats else 0
+    if not episodes:
+        return {"episodes": 0}
+    summary = {
+        "episodes": episodes,
+        "mean_reward": float(stats["reward"].mean()),
+        "mean_length": float(stats["length"].mean()),
+        "success": float(stats["success"].mean()),
+        "collision": float(stats["collision"].mean()),
+        "time_to_target": float(np.nanmean(stats["time_to_target"])) if stats["success"].any() else float("nan"),
+    }
+    ticks = stats["ticks"].sum()
+    for name in sorted(stats):
+        if name.startswith("phase."):
+            summary[f"{name}_us"] = 1e6 * float(np.nansum(stats[name])) / max(int(ticks), 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize episode statistics written by StatsSink")
+    parser.add_argument("path", help="stats root (e.g. logs/stats) or one sink_<pid> directory")
+    args = parser.parse_args()
+
+    for key, value in summarize(read_stats(args.path)).items():
+        print(f"{key:>24}  {value:.4g}" if isinstance(value, float) else f"{key:>24}  {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# evaluate.py
+"""
+Headless evaluation of trained checkpoints.
+
+    python evaluate.py                              # every checkpoint in models/
+    python evaluate.py models/final_car_model.zip --episodes 200 --out eval.csv
+
+Each checkpoint runs the same seeded episodes (seed, seed + 1, ...) on a
+batch of CarEnvs stepped in lockstep, so one model.predict call serves the
+whole batch per step. Checkpoints are spread over a process pool, and the
+results table lists success rate, mean reward, episode length and
+collision rate per checkpoint.
+"""
+import argparse
+import csv
+import glob
+import multiprocessing as mp
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utility.physical_cores import physical_cores
+
+COLUMNS = ("model", "episodes", "success", "collision", "timeout", "mean_reward", "std_reward", "mean_length")
+
+
+def checkpoint_order(path):
+    """Sorts car_model_<n>_steps by n, with anything else (final_car_model) last."""
+    match = re.search(r"_(\d+)_steps", os.path.basename(path))
+    return (0, int(match.group(1))) if match else (1, os.path.basename(path))
+
+
+def run_episodes(model, num_episodes, num_envs, seed, map_name, action_repeat=1, ray_counts=None):
+    """
+    Plays episodes seed .. seed + num_episodes - 1 with the deterministic
+    policy. Returns per-episode arrays (reward, length, outcome) where
+    outcome is 1 = target reached, -1 = collision, 0 = timeout.
+    """
+    from car_env import CarEnv
+
+    options = {"ray_counts": ray_counts} if ray_counts else {}
+    envs = [CarEnv(map=map_name, action_repeat=action_repeat, **options) for _ in range(min(num_envs, num_episodes))]
+    obs = np.zeros((len(envs),) + envs[0].observation_space.shape, dtype=np.float32)
+    episode = np.full(len(envs), -1)     # episode index each env is playing, -1 = idle
+    rewards = np.zeros(num_episodes)
+    lengths = np.zeros(num_episodes, dtype=np.int64)
+    outcomes = np.zeros(num_episodes, dtype=np.int64)
+
+    next_episode = 0
+    for i, env in enumerate(envs):
+        obs[i], _ = env.reset(seed=seed + next_episode)
+        episode[i] = next_episode
+        next_episode += 1
+
+    while (episode >= 0).any():
+        active = np.flatnonzero(episode >= 0)
+        actions, _ = model.predict(obs[active], deterministic=True)
+        for i, action in zip(active, actions):
+            env, ep = envs[i], episode[i]
+            obs[i], reward, terminated, truncated, _ = env.step(action)
+            rewards[ep] += reward
+            lengths[ep] += 1
+            if not (terminated or truncated):
+                continue
+            if terminated:
+                outcomes[ep] = -1 if env.frame.collided else 1
+            if next_episode < num_episodes:
+                obs[i], _ = env.reset(seed=seed + next_episode)
+                episode[i] = next_episode
+                next_episode += 1
+            else:
+                episode[i] = -1
+
+    for env in envs:
+        env.close()
+    return rewards, lengths, outcomes
+
+
+def evaluate_checkpoint(path, num_episodes, num_envs, seed, map_name, action_repeat=1, ray_counts=None):
+    """Loads one checkpoint on the CPU and summarizes its episodes as a table row."""
+    import torch
+    from stable_baselines3 import PPO
+
+    # Pool workers run side by side; keep each to one thread
+    torch.set_num_threads(1)
+    model = PPO.load(path, device="cpu")
+    rewards, lengths, outcomes = run_episodes(
+        model, num_episodes, num_envs, seed, map_name, action_repeat, ray_counts)
+    return {
+        "model": os.path.splitext(os.path.basename(path))[0],
+        "episodes": num_episodes,
+        "success": float(np.mean(outcomes == 1)),
+        "collision": float(np.mean(outcomes == -1)),
+        "timeout": float(np.mean(outcomes == 0)),
+        "mean_reward": float(rewards.mean()),
+        "std_reward": float(rewards.std()),
+        "mean_length": float(lengths.mean()),
+    }
+
+
+def print_table(rows):
+    print(f"{'model':<26} {'episodes':>8} {'success':>8} {'collision':>9} {'timeout':>8} "
+          f"{'reward':>16} {'length':>8}")
+    for row in rows:
+        reward = f"{row['mean_reward']:.1f} ± {row['std_reward']:.1f}"
+        print(f"{row['model']:<26} {row['episodes']:>8} {row['success']:>8.1%} {row['collision']:>9.1%} "
+              f"{row['timeout']:>8.1%} {reward:>16} {row['mean_length']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate checkpoints headless")
+    parser.add_argument("models", nargs="*", help="checkpoint files (default: models/*.zip)")
+    parser.add_argument("--episodes", type=int, default=100, help="seeded episodes per checkpoint")
+    parser.add_argument("--envs", type=int, default=32, help="envs stepped together per checkpoint")
+    parser.add_argument("--workers", type=int, default=physical_cores(), help="checkpoints evaluated in parallel")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first episode")
+    parser.add_argument("--map", default="default", help="map name, map file or .pool file from map_pool.py")
+    parser.add_argument("--action-repeat", type=int, default=1, help="physics ticks per action, as in training")
+    parser.add_argument("--rays", type=int, nargs=2, metavar=("FRONT", "BACK"),
+                        help="front and back ray counts, as in training (default: variables.py)")
+    parser.add_argument("--out", help="also write the table as CSV")
+    args = parser.parse_args()
+
+    paths = sorted(args.models or glob.glob("models/*.zip"), key=checkpoint_order)
+    if not paths:
+        parser.error("no checkpoints found")
+
+    start = time.perf_counter()
+    jobs = [(path, args.episodes, args.envs, args.seed, args.map, args.action_repeat, args.rays)
+            for path in paths]
+    workers = max(1, min(args.workers, len(paths)))
+    if workers == 1:
+        rows = [evaluate_checkpoint(*job) for job in jobs]
+    else:
+        ctx = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+        with ProcessPoolExecutor(workers, mp_context=ctx) as pool:
+            rows = list(pool.map(evaluate_checkpoint, *zip(*jobs)))
+
+    print_table(rows)
+    print(f"{len(paths)} checkpoints x {args.episodes} episodes in {time.perf_counter() - start:.1f}s")
+
+    if args.out:
+        with open(args.out, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
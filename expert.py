@@ -0,0 +1,127 @@
+# expert.py
+"""
+Scripted driver that follows CarEnv's geodesic flow fields to the target.
+
+    python expert.py --episodes 100                        # success rate
+    python expert.py --episodes 1000 --record demos/       # demonstrations
+    python expert.py --map cache/pools/train.pool --random-start
+
+ExpertDriver steers toward the farthest of the next few cells on the
+shortest driveable path to the target that it can reach in a straight
+line (or at the target once it is close), and picks a speed it can turn
+at. Recordings are written with record_obs=True
+so they hold the observations next to the expert's actions, ready for
+behaviour cloning, and replay like any other recording.
+"""
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+
+from car_env import CarEnv
+from game_map import DEFAULT_MAP
+from recording import EpisodeRecorder
+
+FRICTION_PER_TICK = 0.2     # speed lost per tick, see Car.update_physics
+THROTTLE_GAIN = 0.5         # speed gained per tick at full throttle, see Car.apply_control
+
+
+class ExpertDriver:
+    """
+    act(env) returns the [throttle, steer] action for the env's current
+    state. Stateless, so one driver serves any number of envs.
+    """
+
+    def __init__(self, lookahead=4, cruise_speed=5.0, turn_speed=1.5):
+        self.lookahead = lookahead
+        self.cruise_speed = cruise_speed
+        self.turn_speed = turn_speed
+
+    def act(self, env):
+        env = env.unwrapped
+        car, target = env.car, env.target
+        fields = env.flow_fields
+        # Cached per target, and shared with the progress reward
+        field = fields.field(fields.target_cell(target.x, target.y))
+
+        if math.hypot(target.x - car.x, target.y - car.y) < 2 * fields.cell_size:
+            goal = (target.x, target.y)
+        else:
+            route = fields.route(field, car.x, car.y, self.lookahead)
+            if not route:
+                return np.zeros(2, dtype=np.float32)
+            # The farthest route cell the car can drive to in a straight line
+            goal = route[0]
+            for point in reversed(route[1:]):
+                if env.wall_grid.first_contact([(car.x, car.y), point], car.radius) < 0:
+                    goal = point
+                    break
+
+        # Heading in the car's convention: degrees, 0 facing -y, clockwise
+        heading = math.degrees(math.atan2(goal[0] - car.x, -(goal[1] - car.y)))
+        error = (heading - car.angle + 180) % 360 - 180
+        # Steering turns 3 degrees per tick at full lock
+        steer = max(-1.0, min(1.0, error / 3.0))
+
+        if car.speed == 0 and env.steps:
+            # Stopped by a wall last tick: back off, turning toward the goal,
+            # if it is ahead (a wall behind stops reversing the same way)
+            rad = math.radians(car.angle)
+            ahead = (car.x + math.sin(rad) * THROTTLE_GAIN, car.y - math.cos(rad) * THROTTLE_GAIN)
+            if env.wall_grid.first_contact([(car.x, car.y), ahead], car.radius) >= 0:
+                return np.array([-1.0, -steer], dtype=np.float32)
+
+        # Slow down for sharp turns; below 0.1 px/tick the car cannot turn
+        speed = self.cruise_speed if abs(error) < 30 else self.turn_speed
+        throttle = (speed - car.speed + FRICTION_PER_TICK) / THROTTLE_GAIN
+        throttle = max(-1.0, min(1.0, throttle))
+        return np.array([throttle, steer], dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive CarEnv with the flow-field expert")
+    parser.add_argument("--episodes", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first episode")
+    parser.add_argument("--map", default=DEFAULT_MAP, help="map name, map file or .pool file")
+    parser.add_argument("--random-start", action="store_true")
+    parser.add_argument("--min-target-distance", type=float, default=0.0)
+    parser.add_argument("--action-repeat", type=int, default=1)
+    parser.add_argument("--precompute", action="store_true",
+                        help="compute the fields toward every target spawn cell before driving")
+    parser.add_argument("--record", metavar="DIR", help="record the episodes to DIR/expert.rec")
+    args = parser.parse_args()
+
+    env = CarEnv(map=args.map, random_start=args.random_start,
+                 min_target_distance=args.min_target_distance, action_repeat=args.action_repeat)
+    if args.precompute:
+        start = time.perf_counter()
+        env.precompute_flow_fields()
+        print(f"precomputed {len(env.flow_fields.pinned)} fields in {time.perf_counter() - start:.1f}s")
+    if args.record:
+        env = EpisodeRecorder(env, os.path.join(args.record, "expert.rec"), record_obs=True)
+    driver = ExpertDriver()
+
+    outcomes, lengths, rewards = [], [], []
+    steps, start = 0, time.perf_counter()
+    for episode in range(args.episodes):
+        env.reset(seed=args.seed + episode)
+        total, terminated, truncated = 0.0, False, False
+        while not (terminated or truncated):
+            _, reward, terminated, truncated, _ = env.step(driver.act(env))
+            total += reward
+            steps += 1
+        outcomes.append(terminated and not env.unwrapped.frame.collided)
+        lengths.append(env.unwrapped.steps)
+        rewards.append(total)
+    elapsed = time.perf_counter() - start
+    env.close()
+
+    print(f"{args.episodes} episodes: {np.mean(outcomes):.1%} reached the target, "
+          f"mean length {np.mean(lengths):.0f} ticks, mean reward {np.mean(rewards):.1f}, "
+          f"{steps / elapsed:.0f} steps/s")
+
+
+if __name__ == "__main__":
+    main()
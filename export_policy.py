@@ -0,0 +1,94 @@
+# export_policy.py
+"""
+Exports the actor of a trained PPO MlpPolicy to a NumPy .npz file for
+numpy_policy.NumpyPolicy.
+
+    python export_policy.py models/final_car_model.zip
+    python export_policy.py models/*.zip --check 1000
+
+Writes models/<name>.npz next to each checkpoint unless --out-dir is
+given. --check compares NumpyPolicy against model.predict on random
+observations and fails if any action differs by more than --tolerance.
+"""
+import argparse
+import os
+
+import numpy as np
+import torch
+from stable_baselines3 import PPO
+from stable_baselines3.common.torch_layers import FlattenExtractor
+
+from numpy_policy import ACTIVATIONS, NumpyPolicy
+
+
+def actor_layers(policy):
+    """(weights, biases, activation name) of the policy MLP plus the action head."""
+    if not isinstance(policy.pi_features_extractor, FlattenExtractor):
+        raise ValueError(f"Only flat observations can be exported, not {type(policy.pi_features_extractor).__name__}")
+    if policy.squash_output:
+        raise ValueError("Squashed (tanh) action outputs are not supported")
+
+    weights, biases, activations = [], [], set()
+    for module in policy.mlp_extractor.policy_net:
+        if isinstance(module, torch.nn.Linear):
+            weights.append(module.weight.detach().cpu().numpy().T)
+            biases.append(module.bias.detach().cpu().numpy())
+        else:
+            activations.add(type(module).__name__)
+    activation = activations.pop() if activations else "Identity"
+    if activations or activation not in ACTIVATIONS:
+        raise ValueError(f"Unsupported activation(s) in the policy net: {sorted(activations | {activation})}")
+
+    weights.append(policy.action_net.weight.detach().cpu().numpy().T)
+    biases.append(policy.action_net.bias.detach().cpu().numpy())
+    return weights, biases, activation
+
+
+def export(model_path, out_path):
+    model = PPO.load(model_path, device="cpu")
+    weights, biases, activation = actor_layers(model.policy)
+    arrays = {f"w{i}": w.astype(np.float32) for i, w in enumerate(weights)}
+    arrays.update({f"b{i}": b.astype(np.float32) for i, b in enumerate(biases)})
+    np.savez(
+        out_path, num_layers=len(weights), activation=activation,
+        low=model.action_space.low, high=model.action_space.high, **arrays,
+    )
+    return model
+
+
+def check(model, out_path, samples, tolerance, seed=0):
+    """Largest absolute action difference between the export and model.predict."""
+    policy = NumpyPolicy.load(out_path)
+    space = model.observation_space
+    obs = np.random.default_rng(seed).uniform(space.low, space.high, (samples,) + space.shape).astype(np.float32)
+    expected, _ = model.predict(obs, deterministic=True)
+    actual, _ = policy.predict(obs)
+    error = float(np.abs(expected - actual).max())
+    if error > tolerance:
+        raise SystemExit(f"{out_path}: max action error {error:.2e} exceeds {tolerance:.0e}")
+    return error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export PPO actors to NumPy")
+    parser.add_argument("models", nargs="+", help="checkpoint zips, e.g. models/final_car_model.zip")
+    parser.add_argument("--out-dir", help="directory for the .npz files (default: next to each checkpoint)")
+    parser.add_argument("--check", type=int, default=0, metavar="N",
+                        help="verify against model.predict on N random observations")
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    args = parser.parse_args()
+
+    for model_path in args.models:
+        name = os.path.splitext(os.path.basename(model_path))[0]
+        out_dir = args.out_dir or os.path.dirname(model_path)
+        os.makedirs(out_dir or ".", exist_ok=True)
+        out_path = os.path.join(out_dir, f"{name}.npz")
+        model = export(model_path, out_path)
+        line = f"{model_path} -> {out_path} ({os.path.getsize(out_path) / 1024:.0f} KiB)"
+        if args.check:
+            line += f", max action error {check(model, out_path, args.check, args.tolerance):.1e}"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
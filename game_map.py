@@ -0,0 +1,301 @@
+# game_map.py
+"""
+Map files and their compiled geometry cache.
+
+A map is a JSON file in maps/ (see maps/default.json):
+
+    {
+      "name": "default",
+      "size": [width, height],
+      "car_start": [x, y],
+      "spawn": {
+        "car":    {"clearance": 25, "regions": [[min_x, min_y, max_x, max_y], ...]},
+        "target": {"clearance": 20, "regions": [...]}
+      },
+      "walls": [[x1, y1, x2, y2], ...]
+    }
+
+compile_map() builds everything the simulator derives from the walls -- the
+wall array, the WallGrid index, the DistanceField and both spawn tables --
+and writes it to one binary file in the cache directory (CACHE_DIR, the
+cache/ folder next to this module, unless another is passed):
+
+    8 bytes   magic
+    8 bytes   header length (little-endian uint64)
+    header    JSON: map metadata, index parameters and an array table
+    arrays    raw little-endian arrays, each starting on a 64-byte boundary
+
+load_map() memory-maps that file read-only, so every worker using a map
+shares one copy of its geometry through the page cache. The cache is
+keyed by a hash of the map file and recompiled when the map changes.
+
+    python game_map.py maps/default.json
+"""
+import argparse
+import copy
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+from variables import *
+from utility.cast_rays import walls_to_array
+from utility.wall_grid import WallGrid
+from utility.distance_field import DistanceField
+from utility.spawn_table import SpawnTable
+
+MAPS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "maps")
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+DEFAULT_MAP = "default"
+
+MAGIC = b"CARMAP01"
+ALIGN = 64
+GRID_CELL_SIZE = 50.0
+FIELD_RESOLUTION = 5.0
+FIELD_MAX_DISTANCE = 128.0
+SPAWN_CELL_SIZE = 10.0
+
+
+class GameMap:
+    """
+    One map ready for simulation: metadata, the (N, 4) wall array, the
+    WallGrid (with its DistanceField attached) and the car and target
+    SpawnTables. Treat it as read-only; envs share it.
+    """
+
+    def __init__(self, name, size, car_start, walls, wall_grid, car_spawns, target_spawns):
+        self.name = name
+        self.size = (float(size[0]), float(size[1]))
+        self.car_start = (float(car_start[0]), float(car_start[1]))
+        self.walls = walls
+        self.wall_grid = wall_grid
+        self.car_spawns = car_spawns
+        self.target_spawns = target_spawns
+        self.diagonal = float(np.hypot(*self.size))
+
+    def grid_without_field(self):
+        """A WallGrid sharing this map's arrays but answering from exact geometry only."""
+        grid = copy.copy(self.wall_grid)
+        grid.distance_field = None
+        return grid
+
+
+# ------------------ map files ------------------
+def map_path(source):
+    """Resolves a map name such as "default" or a path to its JSON file."""
+    if os.path.exists(source):
+        return source
+    path = os.path.join(MAPS_DIR, f"{source}.json")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No map file {source!r} (looked in {MAPS_DIR})")
+    return path
+
+
+def spec_from_walls(walls, name="custom"):
+    """A map spec for a bare wall list, with the default size, start and spawn rules."""
+    bounds = [SPAWN_MARGIN, SPAWN_MARGIN, GAME_WIDTH - SPAWN_MARGIN, GAME_HEIGHT - SPAWN_MARGIN]
+    return {
+        "name": name,
+        "size": [GAME_WIDTH, GAME_HEIGHT],
+        "car_start": list(CAR_START),
+        "spawn": {
+            "car": {"clearance": CAR_SPAWN_CLEARANCE, "regions": [bounds]},
+            "target": {"clearance": TARGET_CLEARANCE, "regions": [bounds]},
+        },
+        "walls": walls_to_array(walls).tolist(),
+    }
+
+
+def build_map(spec):
+    """Builds a GameMap in memory from a map spec (a parsed map file)."""
+    walls = walls_to_array(spec["walls"])
+    if not len(walls):
+        raise ValueError(f"Map {spec.get('name')!r} has no walls")
+
+    grid = WallGrid(walls, GRID_CELL_SIZE)
+    grid.distance_field = DistanceField.build(walls, FIELD_RESOLUTION, FIELD_MAX_DISTANCE)
+
+    spawns = {}
+    for kind in ("car", "target"):
+        rule = spec["spawn"][kind]
+        tables = [
+            SpawnTable.build(grid, rule["clearance"], region, SPAWN_CELL_SIZE)
+            for region in rule["regions"]
+        ]
+        if len(tables) == 1:
+            spawns[kind] = tables[0]
+        else:
+            # Overlapping regions must not weight their shared cells twice
+            cells = np.unique(np.concatenate([t.cells for t in tables]), axis=0)
+            spawns[kind] = SpawnTable(cells, SPAWN_CELL_SIZE)
+
+    return GameMap(
+        spec["name"], spec["size"], spec["car_start"], walls, grid,
+        spawns["car"], spawns["target"],
+    )
+
+
+# ------------------ compiled cache ------------------
+def _cache_path(path, cache_dir):
+    with open(path, "rb") as f:
+        source = f.read()
+    key = hashlib.sha1(source)
+    key.update(MAGIC)
+    key.update(np.array(
+        [GRID_CELL_SIZE, FIELD_RESOLUTION, FIELD_MAX_DISTANCE, SPAWN_CELL_SIZE]
+    ).tobytes())
+    name = os.path.splitext(os.path.basename(path))[0]
+    return json.loads(source), os.path.join(cache_dir, f"map_{name}_{key.hexdigest()[:16]}.bin")
+
+
+def _aligned(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def write_arrays(out_path, magic, header, arrays):
+    """
+    Writes `header` (a JSON dict) and named arrays in the cache layout,
+    atomically. A value may also be a list of arrays, written back to
+    back as their concatenation along the first axis without building it
+    in memory.
+    """
+    table, offset = {}, 0
+    for key, value in arrays.items():
+        chunks = [np.ascontiguousarray(a) for a in (value if isinstance(value, list) else [value])]
+        arrays[key] = chunks
+        shape = list(chunks[0].shape)
+        shape[0] = sum(len(a) for a in chunks)
+        table[key] = {"dtype": chunks[0].dtype.str, "shape": shape, "offset": offset}
+        offset = _aligned(offset + sum(a.nbytes for a in chunks))
+
+    header = json.dumps({**header, "arrays": table}).encode()
+    data_start = _aligned(len(magic) + 8 + len(header))
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    # Parallel workers may compile the same map; whoever renames last wins
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(magic + struct.pack("<Q", len(header)) + header)
+        for key, chunks in arrays.items():
+            f.seek(data_start + table[key]["offset"])
+            for chunk in chunks:
+                f.write(chunk.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp_path, out_path)
+
+
+def read_arrays(path, magic):
+    """Memory-maps a file written by write_arrays. Returns (header, {name: array})."""
+    with open(path, "rb") as f:
+        if f.read(len(magic)) != magic:
+            raise ValueError(f"{path} is not a {magic.decode()} file")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(header_len))
+    data_start = _aligned(len(magic) + 8 + header_len)
+
+    arrays = {}
+    for key, entry in header["arrays"].items():
+        shape = tuple(entry["shape"])
+        if 0 in shape:
+            # mmap cannot map zero bytes
+            arrays[key] = np.zeros(shape, dtype=entry["dtype"])
+            continue
+        mapped = np.memmap(
+            path, mode="r", dtype=entry["dtype"], shape=shape,
+            offset=data_start + entry["offset"],
+        )
+        # Plain ndarray view of the same mapping: np.memmap's indexing
+        # overhead is paid on every small lookup in the hot path
+        arrays[key] = mapped.view(np.ndarray)
+    return header, arrays
+
+
+def write_cache(game_map, out_path):
+    """Writes a GameMap in the binary cache format, atomically."""
+    grid = game_map.wall_grid
+    field = grid.distance_field
+    arrays = {
+        "walls": game_map.walls,
+        "grid.cell_start": grid.cell_start,
+        "grid.cell_walls": grid.cell_walls,
+        "field.values": field.values,
+        "spawn.car": game_map.car_spawns.cells,
+        "spawn.target": game_map.target_spawns.cells,
+    }
+    header = {
+        "name": game_map.name,
+        "size": list(game_map.size),
+        "car_start": list(game_map.car_start),
+        "grid": {
+            "origin": grid.origin.tolist(), "cell_size": grid.cell_size,
+            "nx": grid.nx, "ny": grid.ny,
+        },
+        "field": {
+            "origin": field.origin.tolist(), "resolution": field.resolution,
+            "max_distance": field.max_distance,
+        },
+        "spawn_cell_size": {
+            "car": game_map.car_spawns.cell_size, "target": game_map.target_spawns.cell_size,
+        },
+    }
+    write_arrays(out_path, MAGIC, header, arrays)
+
+
+def read_cache(path):
+    """Memory-maps a compiled map file into a GameMap."""
+    header, arrays = read_arrays(path, MAGIC)
+    g = header["grid"]
+    grid = WallGrid.from_arrays(
+        arrays["walls"], g["origin"], g["cell_size"], g["nx"], g["ny"],
+        arrays["grid.cell_start"], arrays["grid.cell_walls"],
+    )
+    f = header["field"]
+    grid.distance_field = DistanceField(
+        arrays["field.values"], f["origin"], f["resolution"], f["max_distance"]
+    )
+    cell_size = header["spawn_cell_size"]
+    return GameMap(
+        header["name"], header["size"], header["car_start"], arrays["walls"], grid,
+        SpawnTable(arrays["spawn.car"], cell_size["car"]),
+        SpawnTable(arrays["spawn.target"], cell_size["target"]),
+    )
+
+
+def compile_map(source, cache_dir=CACHE_DIR):
+    """Compiles a map file into the cache unless it is up to date. Returns the cache path."""
+    spec, out_path = _cache_path(map_path(source), cache_dir)
+    if not os.path.exists(out_path):
+        write_cache(build_map(spec), out_path)
+    return out_path
+
+
+def load_map(source=DEFAULT_MAP, cache_dir=CACHE_DIR):
+    """
+    A GameMap from a map name, a map file path or an existing GameMap,
+    compiling the map file into `cache_dir` on first use.
+    """
+    if isinstance(source, GameMap):
+        return source
+    return read_cache(compile_map(source, cache_dir))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile map files into the geometry cache")
+    parser.add_argument("maps", nargs="+", help="map names or paths, e.g. maps/default.json")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    args = parser.parse_args()
+
+    for source in args.maps:
+        path = compile_map(source, args.cache_dir)
+        game_map = read_cache(path)
+        print(
+            f"{source}: {len(game_map.walls)} walls, "
+            f"{len(game_map.car_spawns.cells)} car / {len(game_map.target_spawns.cells)} target spawn cells "
+            f"-> {path} ({os.path.getsize(path) / 1024:.0f} KiB)"
+        )
+
+
+if __name__ == "__main__":
+    main()
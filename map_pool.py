@@ -0,0 +1,303 @@
+# map_pool.py
+"""
+Procedurally generated maps packed into one memory-mapped pool file.
+
+    python map_pool.py cache/pools/train.pool --count 5000 --workers 8
+    python train.py --map cache/pools/train.pool
+
+generate_pool() builds maps in parallel worker processes and merges their
+shards into a single file in the game_map cache layout (magic CARPOOL1).
+Every per-map array -- walls, WallGrid CSR index, DistanceField values
+and both spawn tables -- is stored concatenated across maps, with an
+offsets array marking where each map starts, plus one row of scalars per
+map in `meta`.
+
+MapPool memory-maps that file, and pool[i] is a GameMap made of views into
+the mapping, so picking a map copies nothing and a worker only touches the
+pages of the maps it actually drives on, however large the pool is.
+"""
+import argparse
+import collections
+import math
+import os
+import time
+
+import numpy as np
+
+from variables import *
+from game_map import GameMap, build_map, spec_from_walls, write_arrays, read_arrays, SPAWN_CELL_SIZE
+from utility.wall_grid import WallGrid
+from utility.distance_field import DistanceField
+from utility.spawn_table import SpawnTable
+from utility.physical_cores import physical_cores
+
+MAGIC = b"CARPOOL1"
+POOL_SUFFIX = ".pool"
+META_FIELDS = (
+    "width", "height", "car_x", "car_y",
+    "grid_x", "grid_y", "grid_nx", "grid_ny",
+    "field_x", "field_y", "field_nx", "field_ny",
+)
+# Arrays stored back to back for all maps, each with a `<key>.offsets` array
+RAGGED = ("walls", "grid.cell_start", "grid.cell_walls", "field.values", "spawn.car", "spawn.target")
+
+CAR_RADIUS = CAR_SIZE[1] / 2
+MIN_SPAWN_CELLS = 500       # reachable car spawn cells a generated map must have
+
+
+# ------------------ generator ------------------
+def random_walls(rng, size=(GAME_WIDTH, GAME_HEIGHT)):
+    """The outer border plus 8-23 interior walls, mostly axis-aligned."""
+    width, height = size
+    walls = [(0, 0, width, 0), (width, 0, width, height), (width, height, 0, height), (0, height, 0, 0)]
+    for _ in range(rng.integers(8, 24)):
+        x, y = rng.uniform(40, width - 40), rng.uniform(40, height - 40)
+        length = rng.uniform(40, 300)
+        if rng.random() < 0.75:
+            angle = rng.integers(4) * math.pi / 2
+        else:
+            angle = rng.uniform(0, 2 * math.pi)
+        x2 = min(max(x + math.cos(angle) * length, 0), width)
+        y2 = min(max(y + math.sin(angle) * length, 0), height)
+        walls.append((x, y, x2, y2))
+    return walls
+
+
+def _largest_component(cells, cell_size):
+    """Mask of the cells in the largest 4-connected group of grid cells."""
+    ij = np.rint((cells - cells.min(axis=0)) / cell_size).astype(np.int64)
+    index = {(i, j): n for n, (i, j) in enumerate(ij.tolist())}
+    label = np.full(len(cells), -1)
+    sizes = []
+    for seed in range(len(cells)):
+        if label[seed] >= 0:
+            continue
+        label[seed] = len(sizes)
+        queue, size = collections.deque([seed]), 0
+        while queue:
+            n = queue.popleft()
+            size += 1
+            i, j = ij[n]
+            for neighbour in ((i + 1, j), (i - 1, j), (i, j + 1), (i, j - 1)):
+                m = index.get(neighbour)
+                if m is not None and label[m] < 0:
+                    label[m] = label[seed]
+                    queue.append(m)
+        sizes.append(size)
+    return label == int(np.argmax(sizes))
+
+
+def restrict_to_reachable(game_map, rng):
+    """
+    Keeps only spawn cells the car can drive between and picks a new
+    car_start among them.
+
+    Cells whose whole area clears the car radius are drivable: the segment
+    between two 4-adjacent cell centres stays inside those two cells, so
+    every pair of cells in one connected group is joined by a collision-free
+    path. Car and target spawns outside the largest group are dropped.
+    """
+    grid = game_map.wall_grid
+    spawn_bounds = (SPAWN_MARGIN, SPAWN_MARGIN, game_map.size[0] - SPAWN_MARGIN, game_map.size[1] - SPAWN_MARGIN)
+    drivable = SpawnTable.build(grid, CAR_RADIUS, spawn_bounds, SPAWN_CELL_SIZE).cells
+    reachable = drivable[_largest_component(drivable, SPAWN_CELL_SIZE)]
+    keys = {tuple(c) for c in np.rint(reachable).astype(np.int64).tolist()}
+
+    def keep(table):
+        inside = [tuple(c) in keys for c in np.rint(table.cells).astype(np.int64).tolist()]
+        return SpawnTable(np.ascontiguousarray(table.cells[inside]), table.cell_size)
+
+    car_spawns, target_spawns = keep(game_map.car_spawns), keep(game_map.target_spawns)
+    if len(car_spawns.cells) < MIN_SPAWN_CELLS or not len(target_spawns.cells):
+        return None
+    start = car_spawns.cells[rng.integers(len(car_spawns.cells))] + car_spawns.cell_size / 2
+    return GameMap(
+        game_map.name, game_map.size, start, game_map.walls, grid, car_spawns, target_spawns,
+    )
+
+
+def generate_map(seed, name=None):
+    """
+    A random map whose spawn area is one reachable region. Layouts that
+    leave too little of it are redrawn from the same seeded stream, so a
+    seed always gives the same map.
+    """
+    rng = np.random.default_rng(seed)
+    while True:
+        spec = spec_from_walls(random_walls(rng), name=name or f"procedural_{seed}")
+        try:
+            game_map = restrict_to_reachable(build_map(spec), rng)
+        except ValueError:
+            # SpawnTable.build found no free space at all
+            continue
+        if game_map is not None:
+            return game_map
+
+
+# ------------------ pool files ------------------
+def _map_arrays(game_map):
+    grid = game_map.wall_grid
+    field = grid.distance_field
+    meta = (
+        *game_map.size, *game_map.car_start,
+        *grid.origin, grid.nx, grid.ny,
+        *field.origin, field.nx, field.ny,
+    )
+    ragged = (
+        game_map.walls, grid.cell_start, grid.cell_walls, field.values.ravel(),
+        game_map.car_spawns.cells, game_map.target_spawns.cells,
+    )
+    return np.array(meta, dtype=np.float64), dict(zip(RAGGED, ragged))
+
+
+def _params(game_map):
+    grid = game_map.wall_grid
+    return {
+        "grid_cell_size": grid.cell_size,
+        "field_resolution": grid.distance_field.resolution,
+        "field_max_distance": grid.distance_field.max_distance,
+        "spawn_cell_size": game_map.car_spawns.cell_size,
+    }
+
+
+def _write(out_path, params, names, meta, chunks, lengths):
+    """chunks[key] / lengths[key]: per-part arrays and the per-map row counts."""
+    arrays = {"meta": meta}
+    for key in RAGGED:
+        offsets = np.zeros(len(lengths[key]) + 1, dtype=np.int64)
+        np.cumsum(lengths[key], out=offsets[1:])
+        arrays[key] = chunks[key]
+        arrays[f"{key}.offsets"] = offsets
+    header = {"count": len(names), "names": names, "params": params, "meta_fields": META_FIELDS}
+    write_arrays(out_path, MAGIC, header, arrays)
+
+
+def write_pool(maps, out_path):
+    """Packs GameMaps built with the same geometry parameters into a pool file."""
+    if not maps:
+        raise ValueError("A map pool needs at least one map")
+    params = _params(maps[0])
+    meta, chunks = [], {key: [] for key in RAGGED}
+    for game_map in maps:
+        if _params(game_map) != params:
+            raise ValueError(f"Map {game_map.name!r} was built with different geometry parameters")
+        row, ragged = _map_arrays(game_map)
+        meta.append(row)
+        for key in RAGGED:
+            chunks[key].append(ragged[key])
+    lengths = {key: [len(a) for a in chunks[key]] for key in RAGGED}
+    _write(out_path, params, [m.name for m in maps], np.stack(meta), chunks, lengths)
+
+
+def merge_pools(paths, out_path):
+    """Concatenates pool files, streaming their arrays straight from the mappings."""
+    pools = [MapPool(path) for path in paths]
+    params = pools[0].params
+    if any(pool.params != params for pool in pools):
+        raise ValueError("Pools were built with different geometry parameters")
+    chunks = {key: [pool.data[key] for pool in pools] for key in RAGGED}
+    lengths = {key: np.concatenate([np.diff(pool.offsets[key]) for pool in pools]) for key in RAGGED}
+    names = [name for pool in pools for name in pool.names]
+    _write(out_path, params, names, np.concatenate([pool.meta for pool in pools]), chunks, lengths)
+
+
+class MapPool:
+    """
+    Read-only view of a pool file. pool[i] builds a GameMap of array views
+    on demand, and pickling sends only the path, so worker processes each
+    map the file themselves and share it through the page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        header, arrays = read_arrays(path, MAGIC)
+        self.names = header["names"]
+        self.params = header["params"]
+        self.meta = arrays["meta"]
+        self.data = {key: arrays[key] for key in RAGGED}
+        self.offsets = {key: arrays[f"{key}.offsets"] for key in RAGGED}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __reduce__(self):
+        return MapPool, (self.path,)
+
+    def _slice(self, key, index):
+        offsets = self.offsets[key]
+        return self.data[key][offsets[index]:offsets[index + 1]]
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(f"Map index {index} out of range for a pool of {len(self)}")
+        index %= len(self)
+        width, height, car_x, car_y, gx, gy, gnx, gny, fx, fy, fnx, fny = self.meta[index].tolist()
+        p = self.params
+
+        walls = self._slice("walls", index)
+        grid = WallGrid.from_arrays(
+            walls, (gx, gy), p["grid_cell_size"], gnx, gny,
+            self._slice("grid.cell_start", index), self._slice("grid.cell_walls", index),
+        )
+        values = self._slice("field.values", index).reshape(int(fny), int(fnx))
+        grid.distance_field = DistanceField(values, (fx, fy), p["field_resolution"], p["field_max_distance"])
+        return GameMap(
+            self.names[index], (width, height), (car_x, car_y), walls, grid,
+            SpawnTable(self._slice("spawn.car", index), p["spawn_cell_size"]),
+            SpawnTable(self._slice("spawn.target", index), p["spawn_cell_size"]),
+        )
+
+
+def _generate_shard(out_path, seeds):
+    write_pool([generate_map(seed) for seed in seeds], out_path)
+    return out_path
+
+
+def generate_pool(out_path, count, seed=0, workers=1):
+    """
+    Generates maps seed .. seed + count - 1 into one pool file. Workers each
+    write a shard of consecutive seeds and the shards are merged in order,
+    so the result does not depend on the number of workers.
+    """
+    seeds = np.arange(seed, seed + count)
+    workers = max(1, min(workers, count))
+    if workers == 1:
+        _generate_shard(out_path, seeds.tolist())
+        return MapPool(out_path)
+
+    # Imported here so CarEnv, which reads pools, does not load multiprocessing
+    import multiprocessing as mp
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = [f"{out_path}.part{i}" for i in range(workers)]
+    parts = [part.tolist() for part in np.array_split(seeds, workers)]
+    ctx = mp.get_context("forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+    with ProcessPoolExecutor(workers, mp_context=ctx) as pool:
+        list(pool.map(_generate_shard, shards, parts))
+    merge_pools(shards, out_path)
+    for shard in shards:
+        os.remove(shard)
+    return MapPool(out_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a pool of procedural maps")
+    parser.add_argument("out", help=f"pool file to write, e.g. cache/pools/train{POOL_SUFFIX}")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first map")
+    parser.add_argument("--workers", type=int, default=physical_cores())
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    pool = generate_pool(args.out, args.count, args.seed, args.workers)
+    elapsed = time.perf_counter() - start
+    walls = np.diff(pool.offsets["walls"])
+    spawns = np.diff(pool.offsets["spawn.car"])
+    print(
+        f"{len(pool)} maps in {elapsed:.1f}s -> {args.out} ({os.path.getsize(args.out) / 2**20:.1f} MiB), "
+        f"{walls.mean():.1f} walls and {spawns.mean():.0f} car spawn cells per map"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# numpy_policy.py
+"""
+Torch-free inference for policies exported with export_policy.py.
+
+    policy = NumpyPolicy.load("models/final_car_model.npz")
+    action, _ = policy.predict(obs)
+
+Only NumPy is imported, so a driver process starts in milliseconds
+instead of loading torch and stable-baselines3.
+"""
+import numpy as np
+
+ACTIVATIONS = {
+    "Tanh": np.tanh,
+    "ReLU": lambda x: np.maximum(x, 0),
+    "Identity": lambda x: x,
+}
+
+
+class NumpyPolicy:
+    """
+    Deterministic actor of an SB3 MlpPolicy: the policy MLP, the action
+    head (the Gaussian mean) and clipping to the action bounds, which is
+    what model.predict(obs, deterministic=True) computes.
+    """
+
+    def __init__(self, weights, biases, activation, low, high):
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.ascontiguousarray(b, dtype=np.float32) for b in biases]
+        self.activation = ACTIVATIONS[activation]
+        self.low = np.asarray(low, dtype=np.float32)
+        self.high = np.asarray(high, dtype=np.float32)
+        self.obs_size = self.weights[0].shape[0]
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        num_layers = int(data["num_layers"])
+        weights = [data[f"w{i}"] for i in range(num_layers)]
+        biases = [data[f"b{i}"] for i in range(num_layers)]
+        return cls(weights, biases, str(data["activation"]), data["low"], data["high"])
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=True):
+        """
+        Same call and return shape as model.predict: one (obs_size,)
+        observation gives one action, an (n, obs_size) batch gives n.
+        Only deterministic actions are supported.
+        """
+        if not deterministic:
+            raise ValueError("NumpyPolicy only exports the deterministic action")
+        x = np.asarray(observation, dtype=np.float32)
+        single = x.ndim == 1
+        x = x.reshape(-1, self.obs_size)
+
+        # Hidden layers, then the linear action head
+        last = len(self.weights) - 1
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            x = x @ w + b
+            if i < last:
+                x = self.activation(x)
+
+        actions = np.clip(x, self.low, self.high)
+        return (actions[0] if single else actions), state
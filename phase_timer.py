@@ -0,0 +1,66 @@
+# phase_timer.py
+from time import perf_counter
+
+
+class PhaseTimer:
+    """
+    Accumulates wall-clock seconds and call counts per named phase.
+
+    Phases are timed back to back with lap():
+
+        t = timer.start()
+        ...physics...
+        t = timer.lap("physics", t)
+        ...sensing...
+        t = timer.lap("sensing", t)
+    """
+
+    def __init__(self):
+        # Running totals since creation; pop() reports the change since its last call
+        self.seconds = {}
+        self.calls = {}
+        self.popped_seconds = {}
+        self.popped_calls = {}
+
+    def start(self):
+        return perf_counter()
+
+    def lap(self, name, started):
+        now = perf_counter()
+        self.seconds[name] = self.seconds.get(name, 0.0) + (now - started)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        return now
+
+    def pop(self):
+        """Returns {phase: (seconds, calls)} for the phases timed since the last pop."""
+        timings = {}
+        for name, calls in self.calls.items():
+            calls -= self.popped_calls.get(name, 0)
+            if calls:
+                timings[name] = (self.seconds[name] - self.popped_seconds.get(name, 0.0), calls)
+        self.popped_seconds = dict(self.seconds)
+        self.popped_calls = dict(self.calls)
+        return timings
+
+    def totals(self):
+        """{phase: seconds} since the timer was created; pop() leaves these alone."""
+        return dict(self.seconds)
+
+
+class NullTimer:
+    """Drop-in PhaseTimer that records nothing, for uninstrumented envs."""
+
+    def start(self):
+        return 0.0
+
+    def lap(self, name, started):
+        return 0.0
+
+    def pop(self):
+        return {}
+
+    def totals(self):
+        return {}
+
+
+NULL_TIMER = NullTimer()
@@ -0,0 +1,120 @@
+# rasterizer.py
+import math
+
+import numpy as np
+
+from variables import *
+
+WALL_HALF_WIDTH = 5      # Wall.draw uses a 10px line
+TARGET_BORDER = 2
+RAY_WIDTH = 2
+
+
+class FrameRasterizer:
+    """
+    Draws CarEnv scenes into a preallocated RGB NumPy buffer without pygame
+    or a display.
+
+    The walls are rasterized once into a static background layer. Each
+    frame copies that layer and only draws the target, the car and,
+    optionally, the rays, inside their own bounding boxes. `scale` < 1
+    renders smaller frames directly, e.g. for pixel observations.
+    """
+
+    def __init__(self, walls, width=GAME_WIDTH, height=GAME_HEIGHT, scale=1.0, draw_rays=True):
+        self.scale = float(scale)
+        self.draw_rays = draw_rays
+        self.height = max(1, round(height * self.scale))
+        self.width = max(1, round(width * self.scale))
+        self.frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+
+        self.background = np.zeros_like(self.frame)
+        self.background[:] = BLACK
+        for wall in np.asarray(walls, dtype=np.float64).reshape(-1, 4):
+            lo = np.minimum(wall[:2], wall[2:]) - WALL_HALF_WIDTH
+            hi = np.maximum(wall[:2], wall[2:]) + WALL_HALF_WIDTH
+            ys, xs, centres = self._pixel_box(lo, hi)
+            if centres is None:
+                continue
+            # Flat ends like pygame.draw.line: within the span and the half width
+            a, ab = wall[:2], wall[2:] - wall[:2]
+            length = max(math.hypot(ab[0], ab[1]), 1e-9)
+            rel = centres - a
+            along = (rel[..., 0] * ab[0] + rel[..., 1] * ab[1]) / length
+            across = np.abs(rel[..., 0] * ab[1] - rel[..., 1] * ab[0]) / length
+            block = self.background[ys, xs]
+            block[(along >= 0) & (along <= length) & (across <= WALL_HALF_WIDTH)] = WHITE
+
+    def _pixel_box(self, lo, hi):
+        """
+        Pixel slices covering the world-space box [lo, hi] and the world
+        coordinates of those pixel centres, shaped (h, w, 2).
+        """
+        x0 = max(int(math.floor(lo[0] * self.scale)), 0)
+        y0 = max(int(math.floor(lo[1] * self.scale)), 0)
+        x1 = min(int(math.ceil(hi[0] * self.scale)) + 1, self.width)
+        y1 = min(int(math.ceil(hi[1] * self.scale)) + 1, self.height)
+        if x0 >= x1 or y0 >= y1:
+            return None, None, None
+        px = (np.arange(x0, x1) + 0.5) / self.scale
+        py = (np.arange(y0, y1) + 0.5) / self.scale
+        centres = np.stack(np.meshgrid(px, py), axis=-1)
+        return slice(y0, y1), slice(x0, x1), centres
+
+    def _draw_circle(self, centre, radius):
+        ys, xs, centres = self._pixel_box(np.subtract(centre, radius), np.add(centre, radius))
+        if centres is None:
+            return
+        dist = np.hypot(centres[..., 0] - centre[0], centres[..., 1] - centre[1])
+        block = self.frame[ys, xs]
+        block[dist <= radius] = GREEN
+        block[(dist <= radius) & (dist > radius - TARGET_BORDER)] = (0, 100, 0)
+
+    def _draw_car(self, pos, angle):
+        half_w, half_h = CAR_SIZE[0] / 2, CAR_SIZE[1] / 2
+        reach = math.hypot(half_w, half_h)
+        ys, xs, centres = self._pixel_box(np.subtract(pos, reach), np.add(pos, reach))
+        if centres is None:
+            return
+        # Rotate pixel offsets into the car's frame (heading is "up" at angle 0)
+        rad = math.radians(angle)
+        dx = centres[..., 0] - pos[0]
+        dy = centres[..., 1] - pos[1]
+        local_x = dx * math.cos(rad) + dy * math.sin(rad)
+        local_y = -dx * math.sin(rad) + dy * math.cos(rad)
+        block = self.frame[ys, xs]
+        block[(np.abs(local_x) <= half_w) & (np.abs(local_y) <= half_h)] = RED
+
+    def _draw_rays(self, origin, hit_points, distances):
+        # Sample every ray at sub-pixel spacing and colour the pixels it covers
+        hit_points = np.asarray(hit_points, dtype=np.float64)
+        steps = int(math.ceil(RAY_LENGTH * self.scale)) + 1
+        t = np.linspace(0.0, 1.0, steps)[None, :, None]
+        points = origin + (hit_points[:, None, :] - origin) * t
+        ix = np.floor(points[..., 0] * self.scale).astype(np.int64)
+        iy = np.floor(points[..., 1] * self.scale).astype(np.int64)
+
+        # Same red-to-dark gradient as the pygame renderer
+        shade = 1 - np.minimum(distances, RAY_LENGTH) / RAY_LENGTH
+        colors = np.zeros((len(hit_points), 3), dtype=np.uint8)
+        colors[:, 0] = (235 * shade).astype(np.uint8)
+        colors[:, 1] = 50
+        colors = np.broadcast_to(colors[:, None, :], points.shape[:-1] + (3,))
+
+        width = max(1, round(RAY_WIDTH * self.scale))
+        for offset in range(width):
+            ox = ix + offset
+            inside = (ox >= 0) & (ox < self.width) & (iy >= 0) & (iy < self.height)
+            self.frame[iy[inside], ox[inside]] = colors[inside]
+
+    def render(self, car_pos, car_angle, target_pos, target_size, hit_points=None, ray_distances=None):
+        """
+        Draws one scene and returns the internal frame buffer, which the
+        next call overwrites; copy it to keep it.
+        """
+        np.copyto(self.frame, self.background)
+        self._draw_circle((target_pos[0], target_pos[1]), target_size)
+        self._draw_car((car_pos[0], car_pos[1]), car_angle)
+        if self.draw_rays and hit_points is not None:
+            self._draw_rays(np.array([car_pos[0], car_pos[1]]), hit_points, ray_distances)
+        return self.frame
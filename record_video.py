@@ -0,0 +1,55 @@
+# record_video.py
+"""
+Records evaluation videos of trained checkpoints without a display.
+
+    python record_video.py models/final_car_model models/car_model_100000_steps --episodes 3
+
+Writes one mp4 per episode to videos/<checkpoint name>/ using the headless
+rgb_array renderer (gymnasium's RecordVideo needs moviepy installed).
+"""
+import argparse
+import os
+
+from gymnasium.wrappers import RecordVideo
+from stable_baselines3 import PPO
+
+from car_env import CarEnv
+
+
+def record(model_path, episodes, out_dir, scale, seed):
+    model = PPO.load(model_path)
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    env = CarEnv(render_mode="rgb_array", render_scale=scale)
+    env = RecordVideo(
+        env, os.path.join(out_dir, name), episode_trigger=lambda _: True,
+        name_prefix=name, disable_logger=True,
+    )
+
+    for ep in range(episodes):
+        obs, info = env.reset(seed=seed + ep)
+        done = False
+        total_reward = 0.0
+        while not done:
+            action, _ = model.predict(obs, deterministic=True)
+            obs, reward, terminated, truncated, info = env.step(action)
+            total_reward += reward
+            done = terminated or truncated
+        print(f"{name} episode {ep + 1}/{episodes} | Total Reward: {total_reward:.2f}")
+    env.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record headless evaluation videos")
+    parser.add_argument("models", nargs="+", help="checkpoint paths, e.g. models/final_car_model")
+    parser.add_argument("--episodes", type=int, default=1)
+    parser.add_argument("--out", default="videos")
+    parser.add_argument("--scale", type=float, default=1.0, help="frame size relative to the game window")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for model_path in args.models:
+        record(model_path, args.episodes, args.out, args.scale, args.seed)
+
+
+if __name__ == "__main__":
+    main()
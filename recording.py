@@ -0,0 +1,234 @@
+# recording.py
+"""
+Compact binary episode recordings for CarEnv.
+
+A recording file is a small JSON header followed by an append-only stream
+of chunks. Every chunk starts with a fixed 20-byte head
+(tag, episode, value, count) and one of three payloads:
+
+    EPIS  episode start: value = reset seed (-1 if none), payload = the
+          CarEnv.get_state record right after reset
+    STEP  `count` fixed-size float32 step records starting at step `value`:
+          action, reward, terminated, truncated, then optionally the car
+          pose after the step and the observation
+    SNAP  CarEnv.get_state record after `value` steps, written every
+          `snapshot_every` steps so replay can seek without re-simulating
+          the whole episode
+
+Episodes are restored from their EPIS state rather than re-seeded, so
+recordings also replay episodes that were reset without a seed. A file
+cut short by a crash reads back up to its last complete chunk.
+
+The header names the absolute path of the map or pool file the env was
+built from. An env on a GameMap built in memory has no such file, so its
+map is saved next to the recording (`<path>.map`, in the game_map cache
+format) and the header names that copy instead.
+"""
+import json
+import os
+import struct
+
+import gymnasium as gym
+import numpy as np
+
+from car_env import STATE_DTYPE
+from game_map import write_cache
+
+
+MAGIC = b"CARREC01"
+CHUNK = struct.Struct("<4sIqI")
+STEP_FIELDS = ("throttle", "steer", "reward", "terminated", "truncated")
+POSE_FIELDS = ("x", "y", "angle", "speed")
+
+
+# ------------------ writer ------------------
+class EpisodeRecorder(gym.Wrapper):
+    """
+    Streams every episode of the wrapped CarEnv into `path`.
+
+    Step records go into a preallocated float32 buffer that is written as
+    one STEP chunk when it fills up, at episode end and on close, so the
+    per-step cost is one row assignment. Actions are passed on to the env
+    as float32, the recorded precision, which keeps replays exact.
+    """
+
+    def __init__(self, env, path, record_obs=False, record_poses=True,
+                 snapshot_every=100, chunk_steps=256):
+        super().__init__(env)
+        self.record_obs = record_obs
+        self.record_poses = record_poses
+        self.snapshot_every = snapshot_every
+
+        base = env.unwrapped
+        obs_size = int(np.prod(env.observation_space.shape))
+        columns = list(STEP_FIELDS)
+        if record_poses:
+            columns += POSE_FIELDS
+        if record_obs:
+            columns += [f"obs{i}" for i in range(obs_size)]
+        self.buffer = np.zeros((chunk_steps, len(columns)), dtype=np.float32)
+        self.pose_start = len(STEP_FIELDS)
+        self.obs_start = self.pose_start + (len(POSE_FIELDS) if record_poses else 0)
+
+        self.path = path
+        # In-memory maps are copied next to the recording when it is opened
+        self.map_copy = f"{path}.map" if base.map_source is None else None
+        self.header = json.dumps({
+            "version": 1,
+            "map": base.map_source,
+            "map_copy": os.path.basename(self.map_copy) if self.map_copy else None,
+            "random_start": base.random_start,
+            "min_target_distance": base.min_target_distance,
+            "max_steps": base.max_steps,
+            "action_repeat": base.action_repeat,
+            "ray_counts": base.ray_counts,
+            "visibility_sensor": base.visibility_sensor,
+            "progress_reward": base.progress_reward,
+            "snapshot_every": snapshot_every,
+            "columns": columns,
+        }).encode()
+        # Opened on the first reset, so envs that never run leave no file
+        self.file = None
+
+        self.episode = -1
+        self.step_index = 0     # steps taken in the current episode
+        self.pending = 0        # rows in buffer not yet written
+
+    def _flush_steps(self):
+        if self.pending:
+            first = self.step_index - self.pending
+            self.file.write(CHUNK.pack(b"STEP", self.episode, first, self.pending))
+            self.file.write(self.buffer[:self.pending].tobytes())
+            self.pending = 0
+
+    def _write_state(self, tag, value):
+        state = self.env.unwrapped.get_state()
+        self.file.write(CHUNK.pack(tag, self.episode, value, 1))
+        self.file.write(state.tobytes())
+
+    def reset(self, *, seed=None, options=None):
+        if self.file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self.file = open(self.path, "wb", buffering=1 << 20)
+            self.file.write(MAGIC + struct.pack("<I", len(self.header)) + self.header)
+            if self.map_copy:
+                write_cache(self.env.unwrapped.map, self.map_copy)
+        self._flush_steps()
+        obs, info = self.env.reset(seed=seed, options=options)
+        self.episode += 1
+        self.step_index = 0
+        self._write_state(b"EPIS", -1 if seed is None else seed)
+        return obs, info
+
+    def step(self, action):
+        action = np.asarray(action, dtype=np.float32)
+        obs, reward, terminated, truncated, info = self.env.step(action)
+
+        row = self.buffer[self.pending]
+        values = (action[0], action[1], reward, terminated, truncated)
+        if self.record_poses:
+            car = self.env.unwrapped.car
+            values += (car.x, car.y, car.angle, car.speed)
+        row[:self.obs_start] = values
+        if self.record_obs:
+            row[self.obs_start:] = obs
+        self.pending += 1
+        self.step_index += 1
+
+        done = terminated or truncated
+        if done or self.pending == len(self.buffer):
+            self._flush_steps()
+        if not done and self.step_index % self.snapshot_every == 0:
+            self._write_state(b"SNAP", self.step_index)
+        if done:
+            # A crash loses at most the episode in progress
+            self.file.flush()
+        return obs, reward, terminated, truncated, info
+
+    def close(self):
+        if self.file is not None and not self.file.closed:
+            self._flush_steps()
+            self.file.close()
+        super().close()
+
+
+# ------------------ reader ------------------
+class RecordedEpisode:
+    """One episode of a recording: start state, snapshots and step records."""
+
+    def __init__(self, index, seed, start_state):
+        self.index = index
+        self.seed = seed
+        self.snapshots = {0: start_state}
+        self.chunks = []
+        self.records = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def actions(self):
+        return self.records[:, 0:2]
+
+    @property
+    def rewards(self):
+        return self.records[:, 2]
+
+    @property
+    def total_reward(self):
+        return float(self.rewards.astype(np.float64).sum())
+
+    @property
+    def outcome(self):
+        """'reached', 'collision', 'timeout' or 'unfinished'."""
+        if not len(self.records):
+            return "unfinished"
+        last = self.records[-1]
+        if last[3]:
+            return "reached" if last[2] > 0 else "collision"
+        return "timeout" if last[4] else "unfinished"
+
+    def nearest_snapshot(self, step):
+        """(step, state) of the latest snapshot at or before `step`."""
+        best = max(s for s in self.snapshots if s <= step)
+        return best, self.snapshots[best]
+
+
+def read_recording(path):
+    """Parses a recording file into (header, [RecordedEpisode, ...])."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an episode recording")
+    (header_len,) = struct.unpack_from("<I", data, len(MAGIC))
+    offset = len(MAGIC) + 4
+    header = json.loads(data[offset:offset + header_len])
+    offset += header_len
+    width = len(header["columns"])
+
+    episodes = []
+    while offset + CHUNK.size <= len(data):
+        tag, episode, value, count = CHUNK.unpack_from(data, offset)
+        # STEP holds count x width float32 values, EPIS and SNAP count state records
+        item, items = (np.dtype(np.float32), count * width) if tag == b"STEP" else (STATE_DTYPE, count)
+        size = items * item.itemsize
+        if offset + CHUNK.size + size > len(data):
+            break   # chunk cut off by a crash
+        payload = np.frombuffer(data, dtype=item, count=items, offset=offset + CHUNK.size)
+        offset += CHUNK.size + size
+
+        if tag == b"EPIS":
+            episodes.append(RecordedEpisode(episode, None if value < 0 else value, payload))
+        elif tag == b"SNAP":
+            episodes[episode].snapshots[value] = payload
+        elif tag == b"STEP":
+            episodes[episode].chunks.append(payload.reshape(count, width))
+        else:
+            raise ValueError(f"{path}: unknown chunk {tag!r} at byte {offset}")
+
+    for ep in episodes:
+        ep.records = np.concatenate(ep.chunks) if ep.chunks else np.zeros((0, width), dtype=np.float32)
+        ep.chunks = None
+        # Snapshots past the last complete STEP chunk cannot be replayed to
+        ep.snapshots = {s: v for s, v in ep.snapshots.items() if s <= len(ep.records)}
+    return header, episodes
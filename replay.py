@@ -0,0 +1,147 @@
+# replay.py
+"""
+Replays episodes recorded with recording.EpisodeRecorder.
+
+    python replay.py recordings/run.rec                      # list episodes
+    python replay.py recordings/run.rec --episode 3 --human  # watch one
+    python replay.py recordings/run.rec --episode 3 --start 640 --human
+    python replay.py recordings/run.rec --verify             # replay all headless
+
+Replays restore the recorded state and feed the recorded actions back
+through CarEnv, so they reproduce the episode exactly without the policy.
+A recording whose map file has moved replays with --map pointing at it.
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from car_env import CarEnv
+from game_map import read_cache
+from recording import read_recording
+
+
+def recorded_map(path, header):
+    """
+    The map of the recording at `path`: its map or pool file, or the copy
+    of an in-memory map saved next to it. Raises FileNotFoundError if
+    neither can be found.
+    """
+    if header["map_copy"]:
+        copy = os.path.join(os.path.dirname(path), header["map_copy"])
+        if not os.path.exists(copy):
+            raise FileNotFoundError(f"{path}: its map copy {copy} is missing; pass the map with --map")
+        return read_cache(copy)
+    source = header["map"]
+    if not os.path.exists(source):
+        raise FileNotFoundError(
+            f"{path} was recorded on map {source!r}, which cannot be found; pass its new location with --map"
+        )
+    return source
+
+
+class Replayer:
+    """Re-simulates recorded episodes on a CarEnv built like the recorded one."""
+
+    def __init__(self, path, render_mode=None, map=None):
+        self.header, self.episodes = read_recording(path)
+        self.env = CarEnv(
+            render_mode=render_mode, map=map or recorded_map(path, self.header),
+            random_start=self.header["random_start"],
+            min_target_distance=self.header["min_target_distance"],
+            action_repeat=self.header["action_repeat"],
+            ray_counts=self.header["ray_counts"],
+            visibility_sensor=self.header["visibility_sensor"],
+            progress_reward=self.header["progress_reward"],
+        )
+        self.env.max_steps = self.header["max_steps"]
+        self.pose_start = self.header["columns"].index("x") if "x" in self.header["columns"] else None
+
+    def seek(self, episode, step):
+        """
+        Puts the env into the state after `step` steps of `episode`,
+        starting from the nearest snapshot. Returns the observation.
+        """
+        ep = self.episodes[episode]
+        if not 0 <= step <= len(ep):
+            raise IndexError(f"Episode {episode} has {len(ep)} recorded steps")
+        start, state = ep.nearest_snapshot(step)
+        self.env.reset(seed=ep.seed)
+        obs = self.env.set_state(state)
+        for action in ep.actions[start:step]:
+            obs, *_ = self.env.step(action)
+        return obs
+
+    def play(self, episode, start=0):
+        """
+        Yields (step, obs, reward, terminated, truncated) for every step of
+        `episode` from `start` on. In human mode the env draws each step.
+        """
+        ep = self.episodes[episode]
+        self.seek(episode, start)
+        for step in range(start, len(ep)):
+            obs, reward, terminated, truncated, _ = self.env.step(ep.actions[step])
+            yield step, obs, reward, terminated, truncated
+
+    def verify(self, episode):
+        """
+        Replays a whole episode and returns the largest deviation from the
+        recorded rewards and car poses (0.0 for an exact replay).
+        """
+        ep = self.episodes[episode]
+        error = 0.0
+        for step, _, reward, terminated, truncated in self.play(episode):
+            row = ep.records[step]
+            error = max(error, abs(reward - row[2]), abs(terminated - row[3]), abs(truncated - row[4]))
+            if self.pose_start is not None:
+                car = self.env.car
+                pose = np.array([car.x, car.y, car.angle, car.speed], dtype=np.float32)
+                error = max(error, float(np.abs(pose - row[self.pose_start:self.pose_start + 4]).max()))
+        return error
+
+    def close(self):
+        self.env.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded episodes")
+    parser.add_argument("recording")
+    parser.add_argument("--episode", type=int, help="episode to replay (default: list episodes)")
+    parser.add_argument("--start", type=int, default=0, help="step to seek to before playing")
+    parser.add_argument("--human", action="store_true", help="show the replay in a window")
+    parser.add_argument("--verify", action="store_true", help="replay every episode headless and check it")
+    parser.add_argument("--map", help="map name, file or pool to replay on instead of the recorded one")
+    args = parser.parse_args()
+
+    try:
+        replayer = Replayer(args.recording, render_mode="human" if args.human else None, map=args.map)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+
+    if args.verify:
+        start = time.perf_counter()
+        steps, worst = 0, 0.0
+        for ep in replayer.episodes:
+            worst = max(worst, replayer.verify(ep.index))
+            steps += len(ep)
+        elapsed = time.perf_counter() - start
+        print(f"{len(replayer.episodes)} episodes, {steps} steps replayed in {elapsed:.2f}s, "
+              f"max deviation {worst:.2e}")
+    elif args.episode is None:
+        print(f"{'episode':>7} {'seed':>6} {'steps':>6} {'reward':>8} {'outcome':>10} {'snapshots':>9}")
+        for ep in replayer.episodes:
+            seed = "-" if ep.seed is None else ep.seed
+            print(f"{ep.index:>7} {seed:>6} {len(ep):>6} {ep.total_reward:>8.1f} {ep.outcome:>10} "
+                  f"{len(ep.snapshots):>9}")
+    else:
+        total, step = 0.0, args.start - 1
+        for step, _, reward, terminated, truncated in replayer.play(args.episode, args.start):
+            total += reward
+        print(f"episode {args.episode}: steps {args.start}..{step + 1}, reward {total:.2f}, "
+              f"{replayer.episodes[args.episode].outcome}")
+    replayer.close()
+
+
+if __name__ == "__main__":
+    main()
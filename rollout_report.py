@@ -0,0 +1,61 @@
+# rollout_report.py
+"""
+Throughput report for parallel rollout collection.
+
+Steps SharedMemoryVecEnv with 1, 2, 4, ... workers up to the physical core
+count and prints env-steps/sec, speedup and parallel efficiency relative to
+a single worker. Example:
+
+    python rollout_report.py --envs-per-worker 4 --steps 500
+"""
+import argparse
+import multiprocessing as mp
+import time
+
+import numpy as np
+
+from shm_vec_env import SharedMemoryVecEnv
+from train import make_env
+from utility.physical_cores import physical_cores
+
+
+def measure(num_workers, envs_per_worker, steps, start_method):
+    env = SharedMemoryVecEnv(make_env, num_workers, envs_per_worker, start_method=start_method)
+    rng = np.random.default_rng(0)
+    env.reset()
+    actions = rng.uniform(-1, 1, (steps, env.num_envs, 2)).astype(np.float32)
+
+    start = time.perf_counter()
+    for a in actions:
+        env.step(a)
+    elapsed = time.perf_counter() - start
+    env.close()
+    return steps * env.num_envs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--max-workers", type=int, default=physical_cores())
+    parser.add_argument("--envs-per-worker", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=500, help="vectorized steps per measurement")
+    parser.add_argument("--start-method", choices=mp.get_all_start_methods(), default=None)
+    args = parser.parse_args()
+
+    counts = [1]
+    while counts[-1] * 2 <= args.max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    print(f"physical cores: {physical_cores()}, envs per worker: {args.envs_per_worker}")
+    print(f"{'workers':>8} {'envs':>6} {'steps/s':>10} {'speedup':>8} {'efficiency':>10}")
+    base = None
+    for n in counts:
+        rate = measure(n, args.envs_per_worker, args.steps, args.start_method)
+        base = base or rate
+        speedup = rate / base
+        print(f"{n:>8} {n * args.envs_per_worker:>6} {rate:>10.0f} {speedup:>8.2f} {speedup / n:>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
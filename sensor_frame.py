@@ -0,0 +1,35 @@
+# sensor_frame.py
+import math
+
+
+class SensorFrame:
+    """
+    Everything CarEnv senses about the car in one step.
+
+    update() does all of the step's geometry work in one place; observation
+    building, info, reward and rendering only read the stored results.
+    wall_distance is the clearance to the nearest wall, capped at the car
+    radius, which is all the collision check needs.
+    """
+
+    __slots__ = (
+        "ray_distances", "hit_points", "wall_distance",
+        "target_dx", "target_dy", "target_distance", "collided",
+    )
+
+    def __init__(self):
+        self.ray_distances = None
+        self.hit_points = None
+        self.wall_distance = 0.0
+        self.target_dx = 0.0
+        self.target_dy = 0.0
+        self.target_distance = 0.0
+        self.collided = False
+
+    def update(self, car, target, walls, wall_distance):
+        self.ray_distances, self.hit_points = car.get_ray_data(walls)
+        self.wall_distance = wall_distance
+        self.collided = wall_distance < car.radius
+        self.target_dx = target.x - car.x
+        self.target_dy = target.y - car.y
+        self.target_distance = math.hypot(self.target_dx, self.target_dy)
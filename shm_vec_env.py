@@ -0,0 +1,270 @@
+# shm_vec_env.py
+import multiprocessing as mp
+import traceback
+
+import numpy as np
+from stable_baselines3.common.env_util import is_wrapped
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv
+
+# Info entries copied through shared memory; any other entries (e.g. a
+# Monitor's "episode") are pickled through the pipe on the steps they appear
+INFO_KEYS = ("distance_to_target", "speed", "ticks")
+
+
+class _WorkerError:
+    """Sent instead of a reply when a command raised in the worker."""
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _buffer_layout(num_envs, obs_dim, act_dim, num_info):
+    return [
+        ("obs", np.float32, (num_envs, obs_dim)),
+        ("terminal_obs", np.float32, (num_envs, obs_dim)),
+        ("actions", np.float32, (num_envs, act_dim)),
+        ("info", np.float64, (num_envs, num_info)),
+        ("rewards", np.float32, (num_envs,)),
+        ("dones", np.bool_, (num_envs,)),
+        ("truncated", np.bool_, (num_envs,)),
+    ]
+
+
+def _layout_size(layout):
+    size = 0
+    for _, dtype, shape in layout:
+        size += -size % 8 + int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return size
+
+
+def _attach(raw, layout):
+    """NumPy views over one shared RawArray, following `layout`."""
+    arrays, offset = {}, 0
+    for name, dtype, shape in layout:
+        offset += -offset % 8
+        arrays[name] = np.frombuffer(raw, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+        offset += arrays[name].nbytes
+    return arrays
+
+
+def _worker(remote, parent_remote, env_fn_wrapper, raw, layout, info_keys, start, count):
+    parent_remote.close()
+    buf = _attach(raw, layout)
+    envs = []
+    try:
+        envs = [env_fn_wrapper.var() for _ in range(count)]
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                extras = []
+                for j, env in enumerate(envs):
+                    i = start + j
+                    obs, reward, terminated, truncated, info = env.step(buf["actions"][i])
+                    buf["rewards"][i] = reward
+                    buf["dones"][i] = terminated or truncated
+                    buf["truncated"][i] = truncated and not terminated
+                    for k, key in enumerate(info_keys):
+                        buf["info"][i, k] = info.get(key, np.nan)
+                    extra = {key: value for key, value in info.items() if key not in info_keys}
+                    if extra:
+                        extras.append((i, extra))
+                    if buf["dones"][i]:
+                        buf["terminal_obs"][i] = obs
+                        obs, _ = env.reset()
+                    buf["obs"][i] = obs
+                remote.send(extras)
+            elif cmd == "reset":
+                seeds, options = data
+                reset_infos = []
+                for j, env in enumerate(envs):
+                    maybe_options = {"options": options[j]} if options[j] else {}
+                    obs, info = env.reset(seed=seeds[j], **maybe_options)
+                    buf["obs"][start + j] = obs
+                    reset_infos.append(info)
+                remote.send(reset_infos)
+            elif cmd == "get_attr":
+                name, local = data
+                remote.send([getattr(envs[j].unwrapped, name) for j in local])
+            elif cmd == "set_attr":
+                name, value, local = data
+                for j in local:
+                    setattr(envs[j].unwrapped, name, value)
+                remote.send(None)
+            elif cmd == "env_method":
+                name, args, kwargs, local = data
+                remote.send([getattr(envs[j].unwrapped, name)(*args, **kwargs) for j in local])
+            elif cmd == "is_wrapped":
+                wrapper_class, local = data
+                remote.send([is_wrapped(envs[j], wrapper_class) for j in local])
+            elif cmd == "close":
+                for env in envs:
+                    env.close()
+                remote.close()
+                break
+    except KeyboardInterrupt:
+        pass
+    except Exception:
+        # Re-raised by the parent; the envs are in an unknown state, so stop
+        remote.send(_WorkerError(traceback.format_exc()))
+        for env in envs:
+            env.close()
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """
+    Runs `num_workers` processes with `envs_per_worker` environments each.
+
+    Actions, observations, rewards, dones and the INFO_KEYS entries of
+    every env live in one preallocated shared-memory block that all
+    workers write into directly, so a step only sends a one-word command
+    down each pipe instead of pickling arrays back and forth.
+    """
+
+    def __init__(self, env_fn, num_workers, envs_per_worker=1, start_method=None, info_keys=INFO_KEYS):
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+
+        # Read the spaces from a throwaway env in this process
+        probe = env_fn()
+        observation_space, action_space = probe.observation_space, probe.action_space
+        probe.close()
+
+        num_envs = num_workers * envs_per_worker
+        self.info_keys = tuple(info_keys)
+        self.envs_per_worker = envs_per_worker
+        self.layout = _buffer_layout(
+            num_envs, observation_space.shape[0], action_space.shape[0], len(self.info_keys)
+        )
+        self.raw = ctx.RawArray("b", _layout_size(self.layout))
+        self.buf = _attach(self.raw, self.layout)
+
+        self.remotes, self.processes = [], []
+        for w in range(num_workers):
+            remote, work_remote = ctx.Pipe()
+            args = (
+                work_remote, remote, CloudpickleWrapper(env_fn), self.raw, self.layout,
+                self.info_keys, w * envs_per_worker, envs_per_worker,
+            )
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+        # Workers must exist first: VecEnv.__init__ queries their render_mode
+        super().__init__(num_envs, observation_space, action_space)
+        self.waiting = False
+        self.closed = False
+
+    def _split(self, indices):
+        """Groups env indices by worker as (worker, local indices) pairs."""
+        groups = {}
+        for i in self._get_indices(indices):
+            groups.setdefault(i // self.envs_per_worker, []).append(i % self.envs_per_worker)
+        return groups.items()
+
+    def _recv(self, w):
+        """The reply of worker `w`, re-raising an error it hit."""
+        try:
+            reply = self.remotes[w].recv()
+        except EOFError:
+            raise RuntimeError(
+                f"Worker {w} exited unexpectedly (exit code {self.processes[w].exitcode})"
+            ) from None
+        if isinstance(reply, _WorkerError):
+            raise RuntimeError(f"Worker {w} failed:\n{reply.text}")
+        return reply
+
+    def _recv_all(self):
+        """Replies of every worker, read in full before an error is raised."""
+        replies, error = [], None
+        for w in range(len(self.remotes)):
+            try:
+                replies.append(self._recv(w))
+            except RuntimeError as e:
+                error = error or e
+        if error is not None:
+            raise error
+        return replies
+
+    def reset(self):
+        per = self.envs_per_worker
+        for w, remote in enumerate(self.remotes):
+            chunk = slice(w * per, (w + 1) * per)
+            remote.send(("reset", (self._seeds[chunk], self._options[chunk])))
+        self.reset_infos = [info for reply in self._recv_all() for info in reply]
+        self._reset_seeds()
+        self._reset_options()
+        return self.buf["obs"].copy()
+
+    def step_async(self, actions):
+        self.buf["actions"][:] = np.asarray(actions).reshape(self.buf["actions"].shape)
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    def step_wait(self):
+        try:
+            extras = self._recv_all()
+        finally:
+            self.waiting = False
+
+        buf = self.buf
+        infos = []
+        for i in range(self.num_envs):
+            info = dict(zip(self.info_keys, buf["info"][i].tolist()))
+            info["TimeLimit.truncated"] = bool(buf["truncated"][i])
+            if buf["dones"][i]:
+                info["terminal_observation"] = buf["terminal_obs"][i].copy()
+            infos.append(info)
+        for reply in extras:
+            for i, extra in reply:
+                infos[i].update(extra)
+        return buf["obs"].copy(), buf["rewards"].copy(), buf["dones"].copy(), infos
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for w in range(len(self.remotes)):
+                try:
+                    self._recv(w)
+                except RuntimeError:
+                    pass
+        for remote in self.remotes:
+            try:
+                remote.send(("close", None))
+            except OSError:
+                # Worker already gone after an error
+                pass
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_attr(self, attr_name, indices=None):
+        results = []
+        for w, local in self._split(indices):
+            self.remotes[w].send(("get_attr", (attr_name, local)))
+            results.extend(self._recv(w))
+        return results
+
+    def set_attr(self, attr_name, value, indices=None):
+        for w, local in self._split(indices):
+            self.remotes[w].send(("set_attr", (attr_name, value, local)))
+            self._recv(w)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        results = []
+        for w, local in self._split(indices):
+            self.remotes[w].send(("env_method", (method_name, method_args, method_kwargs, local)))
+            results.extend(self._recv(w))
+        return results
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        results = []
+        for w, local in self._split(indices):
+            self.remotes[w].send(("is_wrapped", (wrapper_class, local)))
+            results.extend(self._recv(w))
+        return results
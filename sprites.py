@@ -1,12 +1,17 @@
-import pygame
+import math
+
 from variables import *
 
+# pygame is only imported by the draw methods, so headless code never loads SDL
+
 class Wall:
     def __init__(self, x1, y1, x2, y2):
-        self.start = pygame.Vector2(x1, y1)
-        self.end = pygame.Vector2(x2, y2)
+        self.start = (x1, y1)
+        self.end = (x2, y2)
 
     def draw(self, screen):
+        import pygame
+
         pygame.draw.line(screen, WHITE, self.start, self.end, 10)
 
 
@@ -29,13 +34,16 @@ class Wall:
 
 class Target:
     def __init__(self, x, y, size=20):
-        self.pos = pygame.Vector2(x, y)
+        self.x = float(x)
+        self.y = float(y)
+        self.pos = (self.x, self.y)
         self.size = size
-        self.rect = pygame.Rect(x - size//2, y - size//2, size, size)
 
     def draw(self, screen):
+        import pygame
+
         pygame.draw.circle(screen, GREEN, self.pos, self.size)
         pygame.draw.circle(screen, (0, 100, 0), self.pos, self.size, 2)
 
-    def is_reached(self, car_pos, threshold=25):
-        return car_pos.distance_to(self.pos) <= threshold
+    def is_reached(self, car_pos, threshold=TARGET_REACH_DISTANCE):
+        return math.hypot(car_pos[0] - self.x, car_pos[1] - self.y) <= threshold
@@ -0,0 +1,136 @@
+# traffic_env.py
+import numpy as np
+
+from batched_env import BatchedCarEnv, CAR_RADIUS
+from car import RAY_OFFSETS
+from game_map import DEFAULT_MAP
+from variables import *
+from utility.cast_rays import ray_directions
+from utility.spatial_hash import SpatialHash
+
+CAR_SPAWN_SEPARATION = 3 * CAR_RADIUS    # centre distance from a new car to every other car
+SPAWN_TRIES = 64
+
+
+class TrafficEnv(BatchedCarEnv):
+    """
+    `num_envs` cars sharing one map, each driving to its own target,
+    behind the stable-baselines3 VecEnv interface. Every car is one env of
+    the VecEnv, so one policy drives them all.
+
+    Dynamics, rewards and observations follow BatchedCarEnv, with the other
+    cars in the way:
+
+    - a move that would bring a car within two radii of another car is
+      blocked like one into a wall: the car stays put and stops. All cars
+      move at once; a blocked car keeps its old spot, which may block
+      another car in turn, until no move clashes.
+    - rays stop at other cars, seen as circles of the car radius.
+    - cars spawn at random spawn points CAR_SPAWN_SEPARATION apart from
+      the others, and respawn in place when their episode ends.
+
+    Car-car queries go through a SpatialHash of the car positions rebuilt
+    every step, so contacts cost O(cars) and sensing O(cars x cars within
+    RAY_LENGTH), not O(cars^2) on maps much larger than the ray length.
+    """
+
+    def __init__(self, num_envs, map=DEFAULT_MAP, max_steps=1000, seed=None,
+                 use_distance_field=True, min_target_distance=0.0):
+        super().__init__(num_envs, map=map, max_steps=max_steps, seed=seed,
+                         use_distance_field=use_distance_field, random_start=True,
+                         min_target_distance=min_target_distance)
+        self.bounds = (0.0, 0.0, *self.map.size)
+        # Cars whose last move was blocked by another car
+        self.car_blocked = np.zeros(num_envs, dtype=bool)
+
+    # ------------------ state ------------------
+    def _reset_cars(self, idx):
+        self._place_cars(np.asarray(idx))
+        self.angle[idx] = self.rng.uniform(0, 360, len(idx))
+        self.speed[idx] = 0.0
+        self.steps[idx] = 0
+        self._spawn_targets(idx)
+
+    def _place_cars(self, idx):
+        """Spawns the cars `idx` apart from each other and from the cars not in `idx`."""
+        placed = np.ones(self.num_envs, dtype=bool)
+        placed[idx] = False
+        todo = idx
+        for _ in range(SPAWN_TRIES):
+            self.pos[todo] = self.car_spawns.sample(self.rng, len(todo))
+            cars = np.concatenate([np.flatnonzero(placed), todo])
+            grid = SpatialHash(self.pos[cars], CAR_SPAWN_SEPARATION, self.bounds)
+            i, j, _ = grid.pairs(self.pos[todo], CAR_SPAWN_SEPARATION)
+            # Rank of j among the new cars, negative for placed ones; a new
+            # car redraws if it is too close to a placed car or an earlier new car
+            j -= len(cars) - len(todo)
+            clash = np.zeros(len(todo), dtype=bool)
+            clash[i[j < i]] = True
+            placed[todo[~clash]] = True
+            todo = todo[clash]
+            if not len(todo):
+                return
+        raise RuntimeError(f"No room to spawn {len(todo)} more cars on map {self.map.name!r}")
+
+    def _ray_distances(self):
+        distances = super()._ray_distances()
+        # Pairs of cars close enough for a ray of one to reach the other
+        reach = RAY_LENGTH + CAR_RADIUS
+        i, j, _ = SpatialHash(self.pos, reach, self.bounds).pairs(self.pos, reach)
+        other = i != j
+        i, j = i[other], j[other]
+        if not len(i):
+            return distances
+
+        # Ray/circle intersection for every ray of car i against car j
+        directions = ray_directions(self.angle[i, None] + RAY_OFFSETS)
+        offset = self.pos[j] - self.pos[i]
+        along = np.einsum("prk,pk->pr", directions, offset)
+        gap = along ** 2 - ((offset ** 2).sum(axis=1) - CAR_RADIUS ** 2)[:, None]
+        hit = (gap >= 0) & (along > 0)
+        t = np.where(hit, along - np.sqrt(np.maximum(gap, 0)), np.inf)
+        np.minimum.at(distances, i, t)
+        return distances
+
+    # ------------------ physics ------------------
+    def _update_positions(self):
+        direction = ray_directions(self.angle)
+        next_pos = self.pos + direction * self.speed[:, None]
+        clearance = self.wall_grid.min_distances(next_pos, CAR_RADIUS)
+        blocked = clearance < CAR_RADIUS
+
+        # Clashes of every car's next position with the current (j < n) and
+        # next (j >= n) positions of the other cars
+        n = self.num_envs
+        contact = 2 * CAR_RADIUS
+        grid = SpatialHash(np.concatenate([self.pos, next_pos]), contact, self.bounds)
+        i, j, distance = grid.pairs(next_pos, contact)
+        keep = (distance < contact) & (j % n != i)
+        i, j = i[keep], j[keep]
+        current, j = j < n, j % n
+
+        moving = self.speed != 0
+        by_car = np.zeros(n, dtype=bool)
+        while True:
+            # Where each car ends up this step: next position unless it stays put
+            stays = blocked | ~moving
+            clash = i[current == stays[j]]
+            newly = np.zeros(n, dtype=bool)
+            newly[clash] = True
+            newly &= ~blocked
+            if not newly.any():
+                break
+            by_car |= newly
+            blocked |= newly
+
+        self.car_blocked = by_car & moving
+        self.pos = np.where(blocked[:, None], self.pos, next_pos)
+        self.wall_distance = np.where(blocked, self.wall_distance, clearance)
+        self.speed[blocked] = 0
+
+    # ------------------ VecEnv API ------------------
+    def step_wait(self):
+        obs, rewards, dones, infos = super().step_wait()
+        for info, blocked in zip(infos, self.car_blocked.tolist()):
+            info["car_blocked"] = blocked
+        return obs, rewards, dones, infos
@@ -1,18 +1,67 @@
 # train.py
+import argparse
+import multiprocessing as mp
 import os
+import itertools
+import time
+from functools import partial
+
 from stable_baselines3 import PPO
 from stable_baselines3.common.vec_env import DummyVecEnv
 from stable_baselines3.common.callbacks import CheckpointCallback, BaseCallback
 from car_env import CarEnv
+from game_map import DEFAULT_MAP
+from map_pool import POOL_SUFFIX
+from recording import EpisodeRecorder
+from episode_stats import EpisodeStatsRecorder, StatsSink
 
-# ------------------ dirs ------------------
-os.makedirs("models", exist_ok=True)
+TOTAL_STEPS = 200_000
+CHECKPOINT_EVERY = 20_000
 
 # ------------------ env ------------------
-def make_env():
-    return CarEnv(render_mode=None)  # fastest
+_env_ids = itertools.count()
+
+
+def make_env(profile=False, record_dir=None, action_repeat=1, map=DEFAULT_MAP, stats_dir=None,
+             ray_counts=None, visibility_sensor=False, progress_reward=0.0):
+    options = {"ray_counts": ray_counts} if ray_counts else {}
+    env = CarEnv(render_mode=None, profile=profile, action_repeat=action_repeat, map=map,
+                 visibility_sensor=visibility_sensor, progress_reward=progress_reward,
+                 **options)  # fastest
+    if record_dir:
+        # One file per env; workers are told apart by pid
+        path = os.path.join(record_dir, f"env_{os.getpid()}_{next(_env_ids)}.rec")
+        env = EpisodeRecorder(env, path)
+    if stats_dir:
+        # All envs of a process share one background writer
+        env = EpisodeStatsRecorder(env, StatsSink.shared(stats_dir))
+    return env
 
-env = DummyVecEnv([make_env])
+
+def build_env(args):
+    env_fn = partial(make_env, profile=args.profile, record_dir=args.record,
+                     action_repeat=args.action_repeat, map=args.map, stats_dir=args.stats,
+                     ray_counts=args.rays, visibility_sensor=args.visibility_sensor,
+                     progress_reward=args.progress_reward)
+    if args.traffic:
+        from traffic_env import TrafficEnv
+        return TrafficEnv(args.traffic, map=args.map)
+    if args.batched:
+        from batched_env import BatchedCarEnv
+        return BatchedCarEnv(args.batched, map=args.map)
+    if args.servers:
+        from env_server import RemoteVecEnv
+        env_kwargs = {"profile": args.profile, "action_repeat": args.action_repeat, "map": args.map,
+                      "visibility_sensor": args.visibility_sensor, "progress_reward": args.progress_reward}
+        if args.rays:
+            env_kwargs["ray_counts"] = args.rays
+        return RemoteVecEnv(args.servers, args.envs_per_server, env_kwargs)
+    if args.workers:
+        from shm_vec_env import SharedMemoryVecEnv
+        return SharedMemoryVecEnv(
+            env_fn, args.workers, args.envs_per_worker, start_method=args.start_method
+        )
+    return DummyVecEnv([env_fn])
 
 # ------------------ callbacks ------------------
 class ProgressCallback(BaseCallback):
@@ -20,36 +69,166 @@ class ProgressCallback(BaseCallback):
         super().__init__()
         self.total_steps = total_steps
         self.print_every = print_every
+        self.last_print = 0
 
     def _on_step(self):
-        if self.num_timesteps % self.print_every == 0:
+        # Vectorized envs advance several timesteps per call
+        if self.num_timesteps // self.print_every > self.last_print:
+            self.last_print = self.num_timesteps // self.print_every
             percent = 100 * self.num_timesteps / self.total_steps
             print(f"{self.num_timesteps}/{self.total_steps} steps ({percent:.1f}%)")
         return True
 
-checkpoint_callback = CheckpointCallback(
-    save_freq=20_000,
-    save_path="models/",
-    name_prefix="car_model"
-)
 
-# ------------------ model ------------------
-TOTAL_STEPS = 200_000
+class TimingCallback(BaseCallback):
+    """
+    Logs throughput and where the time goes under timing/ in TensorBoard:
+    env-steps/sec and wall time of each rollout, wall time of each policy
+    update, and, for envs created with profile=True, the per-step cost of
+    every CarEnv phase (physics, collision, sensing, ...).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rollout_start = None
+        self.rollout_end = None
+        self.rollout_timesteps = 0
+        self.collect_phases = True
+
+    def _on_rollout_start(self):
+        now = time.perf_counter()
+        if self.rollout_end is not None:
+            # Everything between two rollouts is the policy update
+            self.logger.record("timing/update_seconds", now - self.rollout_end)
+        self.rollout_start = now
+        self.rollout_timesteps = self.num_timesteps
+
+    def _on_step(self):
+        return True
+
+    def _on_rollout_end(self):
+        now = time.perf_counter()
+        elapsed = now - self.rollout_start
+        steps = self.num_timesteps - self.rollout_timesteps
+        self.logger.record("timing/rollout_seconds", elapsed)
+        self.logger.record("timing/env_steps_per_sec", steps / max(elapsed, 1e-9))
+        if self.collect_phases:
+            self._record_phases()
+        self.rollout_end = now
+
+    def _record_phases(self):
+        try:
+            per_env = self.training_env.env_method("pop_phase_timings")
+        except AttributeError:
+            # e.g. BatchedCarEnv, which has no per-phase timers
+            self.collect_phases = False
+            return
+
+        seconds, calls = {}, {}
+        for timings in per_env:
+            for phase, (sec, count) in timings.items():
+                seconds[phase] = seconds.get(phase, 0.0) + sec
+                calls[phase] = calls.get(phase, 0) + count
+        step_total = sum(sec for phase, sec in seconds.items() if not phase.startswith("reset."))
+        for phase, sec in seconds.items():
+            self.logger.record(f"timing/{phase}_us", 1e6 * sec / calls[phase])
+            if not phase.startswith("reset."):
+                self.logger.record(f"timing/{phase}_share", sec / max(step_total, 1e-12))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train a PPO driver on CarEnv")
+    parser.add_argument("--total-steps", type=int, default=TOTAL_STEPS)
+    parser.add_argument("--workers", type=int, default=0,
+                        help="rollout worker processes sharing memory buffers (0 = single in-process env)")
+    parser.add_argument("--envs-per-worker", type=int, default=1,
+                        help="CarEnv instances stepped by each worker")
+    parser.add_argument("--start-method", choices=mp.get_all_start_methods(), default=None,
+                        help="multiprocessing start method for workers (default: forkserver if available)")
+    parser.add_argument("--servers", nargs="+", metavar="HOST:PORT",
+                        help="step CarEnvs on env_server.py processes instead of in this process")
+    parser.add_argument("--envs-per-server", type=int, default=1,
+                        help="CarEnv instances hosted by each server")
+    parser.add_argument("--batched", type=int, default=0, metavar="N",
+                        help="simulate N cars in one BatchedCarEnv instead")
+    parser.add_argument("--traffic", type=int, default=0, metavar="N",
+                        help="train N cars that share one map and see and block each other (TrafficEnv)")
+    parser.add_argument("--profile", action="store_true",
+                        help="time CarEnv step phases and log them to TensorBoard")
+    parser.add_argument("--record", metavar="DIR",
+                        help="record every training episode to DIR for replay.py")
+    parser.add_argument("--map", default=DEFAULT_MAP,
+                        help=f"map name, map file, or a {POOL_SUFFIX} file from map_pool.py to train on many maps")
+    parser.add_argument("--action-repeat", type=int, default=1, metavar="K",
+                        help="physics ticks per policy action (not supported with --batched or --traffic)")
+    parser.add_argument("--rays", type=int, nargs=2, metavar=("FRONT", "BACK"),
+                        help="front and back ray counts (default: variables.py)")
+    parser.add_argument("--visibility-sensor", action="store_true",
+                        help="sample rays from a visibility polygon; faster with hundreds of rays")
+    parser.add_argument("--progress-reward", type=float, default=0.0, metavar="COEF",
+                        help="add COEF per px of shortest driveable path gained toward the target")
+    parser.add_argument("--stats", metavar="DIR",
+                        help="write per-episode statistics to DIR (read with episode_stats.py); "
+                             "add --profile for per-phase timings")
+    args = parser.parse_args()
+
+    # Reject options the chosen env would silently ignore
+    if args.batched or args.traffic:
+        flag = "--batched" if args.batched else "--traffic"
+        if args.batched and args.traffic:
+            parser.error("--batched and --traffic are mutually exclusive")
+        if args.workers or args.servers:
+            parser.error(f"--workers and --servers are not supported with {flag}")
+        if args.rays or args.visibility_sensor:
+            parser.error(f"--rays and --visibility-sensor are not supported with {flag}")
+        if args.record or args.stats:
+            parser.error(f"--record and --stats are not supported with {flag}")
+        if args.progress_reward:
+            parser.error(f"--progress-reward is not supported with {flag}")
+        if args.action_repeat != 1:
+            parser.error(f"--action-repeat is not supported with {flag}")
+        if args.map.endswith(POOL_SUFFIX):
+            parser.error(f"Map pools are not supported with {flag}")
+    if args.servers and (args.workers or args.record or args.stats):
+        parser.error("--workers, --record and --stats are not supported with --servers")
+    return args
+
+
+def main():
+    args = parse_args()
+
+    # ------------------ dirs ------------------
+    os.makedirs("models", exist_ok=True)
+
+    env = build_env(args)
+
+    # Checkpoint frequency is counted in env.step calls, not timesteps
+    checkpoint_callback = CheckpointCallback(
+        save_freq=max(1, CHECKPOINT_EVERY // env.num_envs),
+        save_path="models/",
+        name_prefix="car_model"
+    )
+
+    # ------------------ model ------------------
+    model = PPO(
+        "MlpPolicy",
+        env,
+        verbose=1,
+        learning_rate=3e-4,
+        tensorboard_log="tb_logs/"
+    )
+
+    # ------------------ train ------------------
+    model.learn(
+        total_timesteps=args.total_steps,
+        callback=[checkpoint_callback, ProgressCallback(args.total_steps), TimingCallback()],
+        tb_log_name="ppo_car"
+    )
+
+    # ------------------ save ------------------
+    model.save("models/final_car_model")
+    env.close()
+
 
-model = PPO(
-    "MlpPolicy",
-    env,
-    verbose=1,
-    learning_rate=3e-4,
-    tensorboard_log="tb_logs/"
-)
-
-# ------------------ train ------------------
-model.learn(
-    total_timesteps=TOTAL_STEPS,
-    callback=[checkpoint_callback, ProgressCallback(TOTAL_STEPS)],
-    tb_log_name="ppo_car"
-)
-
-# ------------------ save ------------------
-model.save("models/final_car_model")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+def walls_to_array(walls):
+    """
+    Packs walls into a contiguous (N, 4) float array of (x1, y1, x2, y2) rows.
+    Accepts Wall objects or plain (x1, y1, x2, y2) tuples.
+    """
+    rows = []
+    for wall in walls:
+        if hasattr(wall, "start"):
+            rows.append((wall.start[0], wall.start[1], wall.end[0], wall.end[1]))
+        else:
+            rows.append(tuple(wall))
+    return np.ascontiguousarray(np.array(rows, dtype=np.float64).reshape(-1, 4))
+
+
+def ray_directions(angles):
+    """
+    Unit direction vectors for headings in degrees, matching
+    pygame.Vector2(0, -1).rotate(angle).
+    """
+    rad = np.radians(angles)
+    return np.stack([np.sin(rad), -np.cos(rad)], axis=-1)
+
+
+def cast_rays(origins, angles, walls, ray_length):
+    """
+    Casts every ray against every wall in one NumPy pass.
+
+    origins: (..., 2) ray start points
+    angles:  (..., R) ray headings in degrees
+    walls:   (N, 4) wall array from walls_to_array, or (..., N, 4) to give
+             every origin its own wall set
+
+    Returns (distances, points) with shapes (..., R) and (..., R, 2).
+    Rays that hit nothing report ray_length and their end point, the same
+    as looping line_intersection over every wall.
+    """
+    origins = np.asarray(origins, dtype=np.float64)
+    directions = ray_directions(angles)
+    ray_ends = origins[..., None, :] + directions * ray_length
+
+    if walls.shape[-2] == 0:
+        distances = np.full(directions.shape[:-1], float(ray_length))
+        return distances, ray_ends
+
+    # Same formulation as line_intersection, broadcast to (..., R, N)
+    x1 = origins[..., None, None, 0]
+    y1 = origins[..., None, None, 1]
+    x2 = ray_ends[..., None, 0]
+    y2 = ray_ends[..., None, 1]
+    x3 = walls[..., None, :, 0]
+    y3 = walls[..., None, :, 1]
+    x4 = walls[..., None, :, 2]
+    y4 = walls[..., None, :, 3]
+
+    denom = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
+    parallel = np.abs(denom) < 1e-10
+    safe_denom = np.where(parallel, 1.0, denom)
+
+    t = ((x1 - x3) * (y3 - y4) - (y1 - y3) * (x3 - x4)) / safe_denom
+    u = -((x1 - x2) * (y1 - y3) - (y1 - y2) * (x1 - x3)) / safe_denom
+
+    hit = ~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    t = np.where(hit, t, np.inf)
+
+    nearest = np.argmin(t, axis=-1)
+    t_min = np.take_along_axis(t, nearest[..., None], axis=-1)[..., 0]
+    any_hit = np.isfinite(t_min) & (t_min < 1)
+
+    distances = np.where(any_hit, t_min * ray_length, float(ray_length))
+    points = np.where(
+        any_hit[..., None],
+        origins[..., None, :] + directions * distances[..., None],
+        ray_ends,
+    )
+    return distances, points
@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+
+from utility.distance_points_to_walls import distance_points_to_walls
+
+
+class DistanceField:
+    """
+    Unsigned distance to the nearest wall, sampled on a regular grid of
+    nodes `resolution` px apart and clamped at `max_distance`.
+
+    Bilinear lookups of a 1-Lipschitz field are within one cell of the true
+    distance, so callers can answer "is this point at least r from every
+    wall?" from the field alone unless the sample lies within `resolution`
+    of r; only then is exact geometry needed.
+    """
+
+    def __init__(self, values, origin, resolution, max_distance):
+        self.values = values
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.resolution = float(resolution)
+        self.max_distance = float(max_distance)
+        self.ny, self.nx = values.shape
+
+    @classmethod
+    def build(cls, walls, resolution=5.0, max_distance=128.0):
+        """Samples the field over the walls' bounding box."""
+        walls = np.asarray(walls, dtype=np.float64).reshape(-1, 4)
+        lo = np.minimum(walls[:, :2], walls[:, 2:]).min(axis=0)
+        hi = np.maximum(walls[:, :2], walls[:, 2:]).max(axis=0)
+        nx, ny = (np.ceil((hi - lo) / resolution).astype(int) + 1)
+        values = np.full((ny, nx), max_distance, dtype=np.float32)
+
+        # Each wall only touches nodes within max_distance of its bounding box
+        for wall in walls:
+            w_lo = np.minimum(wall[:2], wall[2:]) - max_distance
+            w_hi = np.maximum(wall[:2], wall[2:]) + max_distance
+            x0, y0 = np.maximum(np.floor((w_lo - lo) / resolution).astype(int), 0)
+            x1, y1 = np.minimum(np.ceil((w_hi - lo) / resolution).astype(int), [nx - 1, ny - 1])
+            xs = lo[0] + np.arange(x0, x1 + 1) * resolution
+            ys = lo[1] + np.arange(y0, y1 + 1) * resolution
+            nodes = np.stack(np.meshgrid(xs, ys), axis=-1)
+            dist = distance_points_to_walls(nodes, wall[None])[..., 0]
+            block = values[y0:y1 + 1, x0:x1 + 1]
+            np.minimum(block, dist, out=block, casting="unsafe")
+        return cls(values, lo, resolution, max_distance)
+
+    def sample(self, x, y):
+        """Bilinear lookup at one point, or NaN outside the field."""
+        fx = (x - self.origin[0]) / self.resolution
+        fy = (y - self.origin[1]) / self.resolution
+        if not (0 <= fx < self.nx - 1 and 0 <= fy < self.ny - 1):
+            return math.nan
+        ix, iy = int(fx), int(fy)
+        tx, ty = fx - ix, fy - iy
+        v = self.values
+        top = v[iy, ix] * (1 - tx) + v[iy, ix + 1] * tx
+        bottom = v[iy + 1, ix] * (1 - tx) + v[iy + 1, ix + 1] * tx
+        return float(top * (1 - ty) + bottom * ty)
+
+    def sample_many(self, points):
+        """Vectorized sample for (..., 2) points; NaN outside the field."""
+        points = np.asarray(points, dtype=np.float64)
+        f = (points - self.origin) / self.resolution
+        inside = (f[..., 0] >= 0) & (f[..., 0] < self.nx - 1) & (f[..., 1] >= 0) & (f[..., 1] < self.ny - 1)
+        ix = np.clip(f[..., 0].astype(np.int64), 0, self.nx - 2)
+        iy = np.clip(f[..., 1].astype(np.int64), 0, self.ny - 2)
+        tx = f[..., 0] - ix
+        ty = f[..., 1] - iy
+        v = self.values
+        top = v[iy, ix] * (1 - tx) + v[iy, ix + 1] * tx
+        bottom = v[iy + 1, ix] * (1 - tx) + v[iy + 1, ix + 1] * tx
+        return np.where(inside, top * (1 - ty) + bottom * ty, np.nan)
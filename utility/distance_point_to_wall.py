@@ -1,26 +1,26 @@
-import pygame
+import math
 
 def distance_point_to_wall(point, wall_start, wall_end):
     """
     Returns the shortest distance from `point` to the line segment (wall_start, wall_end).
-    Also returns the closest point on the segment.
+    Also returns the closest point on the segment as an (x, y) tuple.
     """
-    p = pygame.Vector2(point)
-    a = pygame.Vector2(wall_start)
-    b = pygame.Vector2(wall_end)
+    px, py = point
+    ax, ay = wall_start
+    bx, by = wall_end
 
-    ab = b - a
-    ap = p - a
+    abx, aby = bx - ax, by - ay
+    apx, apy = px - ax, py - ay
 
-    proj = ap.dot(ab)
-    ab_len_sq = ab.length_squared()
+    proj = apx * abx + apy * aby
+    ab_len_sq = abx * abx + aby * aby
 
     if ab_len_sq == 0:
         # Segment is a point
-        return p.distance_to(a), a
+        return math.hypot(apx, apy), (ax, ay)
 
     t = max(0, min(1, proj / ab_len_sq))
-    closest = a + t * ab
-    distance = p.distance_to(closest)
+    closest = (ax + t * abx, ay + t * aby)
+    distance = math.hypot(px - closest[0], py - closest[1])
 
     return distance, closest
@@ -0,0 +1,25 @@
+import numpy as np
+
+
+def distance_points_to_walls(points, walls):
+    """
+    Vectorized distance_point_to_wall.
+    Returns the shortest distance from every point in `points` (..., 2)
+    to every segment in `walls` (N, 4), as an array of shape (..., N).
+    `walls` may also hold one wall set per point, shaped (..., N, 4).
+    """
+    points = np.asarray(points, dtype=np.float64)
+    px = points[..., None, 0]
+    py = points[..., None, 1]
+    ax, ay = walls[..., 0], walls[..., 1]
+    abx = walls[..., 2] - ax
+    aby = walls[..., 3] - ay
+
+    ab_len_sq = abx * abx + aby * aby
+    # Point-like segments project onto their start point
+    safe_len_sq = np.where(ab_len_sq == 0, 1.0, ab_len_sq)
+    t = np.clip(((px - ax) * abx + (py - ay) * aby) / safe_len_sq, 0.0, 1.0)
+
+    dx = px - (ax + t * abx)
+    dy = py - (ay + t * aby)
+    return np.sqrt(dx * dx + dy * dy)
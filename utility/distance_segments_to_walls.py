@@ -0,0 +1,34 @@
+import numpy as np
+
+from utility.distance_points_to_walls import distance_points_to_walls
+
+
+def distance_segments_to_walls(starts, ends, walls):
+    """
+    Shortest distance between every segment (starts[i], ends[i]) and every
+    wall in `walls` (N, 4), as an array of shape (K, N). Crossing segments
+    are 0 apart; otherwise the closest pair involves an endpoint of one of
+    the two segments. Zero-length segments behave like points.
+    """
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+    k, n = len(starts), len(walls)
+
+    # Segment endpoints to walls, then wall endpoints to segments
+    dist = distance_points_to_walls(np.concatenate([starts, ends]), walls)
+    dist = np.minimum(dist[:k], dist[k:])
+    segments = np.concatenate([starts, ends], axis=1)
+    back = distance_points_to_walls(walls.reshape(2 * n, 2), segments).reshape(n, 2, k)
+    dist = np.minimum(dist, back.min(axis=1).T)
+
+    # Same formulation as line_intersection, broadcast to (K, N)
+    x1, y1 = starts[:, None, 0], starts[:, None, 1]
+    x2, y2 = ends[:, None, 0], ends[:, None, 1]
+    x3, y3, x4, y4 = walls[:, 0], walls[:, 1], walls[:, 2], walls[:, 3]
+    denom = (x1 - x2) * (y3 - y4) - (y1 - y2) * (x3 - x4)
+    parallel = np.abs(denom) < 1e-10
+    safe_denom = np.where(parallel, 1.0, denom)
+    t = ((x1 - x3) * (y3 - y4) - (y1 - y3) * (x3 - x4)) / safe_denom
+    u = -((x1 - x2) * (y1 - y3) - (y1 - y2) * (x1 - x3)) / safe_denom
+    crossing = ~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    return np.where(crossing, 0.0, dist)
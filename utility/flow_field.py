@@ -0,0 +1,159 @@
+import collections
+import heapq
+import math
+
+import numpy as np
+
+SQRT2 = math.sqrt(2)
+
+
+class FlowFields:
+    """
+    Geodesic (shortest driveable path) distances to target cells of one map.
+
+    The map is rasterized into square cells of `cell_size` px; a cell is
+    free when its centre keeps `clearance` from every wall. field(target)
+    runs Dijkstra over the 8-connected free cells from the target's cell
+    and returns the path length from every cell, inf for cells that cannot
+    reach it. Fields live in an LRU cache of `capacity` entries;
+    precompute() pins fields for a set of targets, e.g. every target spawn
+    cell, so episodes never wait for one.
+
+    distance() turns a field into an O(1) distance from any point: the
+    shortest field value plus straight-line distance over the 3x3 cells
+    around it. Those straight pieces are at most 1.5 cell diagonals long,
+    so they cannot cross a wall while both ends keep 0.75 cell diagonals
+    of clearance, as the car and free cells do for clearance = car radius.
+    """
+
+    def __init__(self, wall_grid, size, clearance, cell_size=10.0, capacity=256):
+        self.cell_size = float(cell_size)
+        self.nx = int(math.ceil(size[0] / self.cell_size))
+        self.ny = int(math.ceil(size[1] / self.cell_size))
+        xs = (np.arange(self.nx) + 0.5) * self.cell_size
+        ys = (np.arange(self.ny) + 0.5) * self.cell_size
+        centers = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+        self.free = (wall_grid.min_distances(centers, clearance) >= clearance).reshape(self.ny, self.nx)
+
+        # Cells are numbered on a grid padded by one blocked cell all round,
+        # so neighbour lookups need no bounds checks
+        self.width = self.nx + 2
+        padded = np.zeros((self.ny + 2, self.width), dtype=bool)
+        padded[1:-1, 1:-1] = self.free
+        self.padded_free = padded.ravel()
+        self._free_list = self.padded_free.tolist()
+        w, c, d = self.width, self.cell_size, self.cell_size * SQRT2
+        self.neighbours = ((1, c), (-1, c), (w, c), (-w, c), (w + 1, d), (w - 1, d), (1 - w, d), (-1 - w, d))
+
+        self.capacity = capacity
+        self.cache = collections.OrderedDict()
+        self.pinned = {}
+        self.hits = 0
+        self.misses = 0
+
+    # ------------------ cells ------------------
+    def cell_of(self, x, y):
+        """Padded index of the cell containing (x, y), clamped to the grid."""
+        ix = min(max(int(x // self.cell_size), 0), self.nx - 1)
+        iy = min(max(int(y // self.cell_size), 0), self.ny - 1)
+        return (iy + 1) * self.width + ix + 1
+
+    def center_of(self, cell):
+        iy, ix = divmod(cell, self.width)
+        return (ix - 0.5) * self.cell_size, (iy - 0.5) * self.cell_size
+
+    def target_cell(self, x, y):
+        """The cell fields toward (x, y) lead to: its own, or the nearest free one."""
+        cell = self.cell_of(x, y)
+        if self.padded_free[cell]:
+            return cell
+        free = np.flatnonzero(self.padded_free)
+        iy, ix = np.divmod(free, self.width)
+        d = np.hypot((ix - 0.5) * self.cell_size - x, (iy - 0.5) * self.cell_size - y)
+        return int(free[np.argmin(d)])
+
+    # ------------------ fields ------------------
+    def _dijkstra(self, source):
+        free = self._free_list
+        dist = [math.inf] * len(free)
+        dist[source] = 0.0
+        heap = [(0.0, source)]
+        pop, push = heapq.heappop, heapq.heappush
+        neighbours = self.neighbours
+        while heap:
+            d, cell = pop(heap)
+            if d > dist[cell]:
+                continue
+            for offset, cost in neighbours:
+                n = cell + offset
+                if free[n] and d + cost < dist[n]:
+                    dist[n] = d + cost
+                    push(heap, (d + cost, n))
+        return np.array(dist, dtype=np.float32)
+
+    def field(self, cell):
+        """Flat (padded) float32 distances to `cell`, computed on a cache miss."""
+        values = self.pinned.get(cell)
+        if values is not None:
+            self.hits += 1
+            return values
+        values = self.cache.get(cell)
+        if values is not None:
+            self.hits += 1
+            self.cache.move_to_end(cell)
+            return values
+        self.misses += 1
+        values = self._dijkstra(cell)
+        self.cache[cell] = values
+        if len(self.cache) > self.capacity:
+            self.cache.popitem(last=False)
+        return values
+
+    def precompute(self, points):
+        """Pins the fields toward every (x, y) in `points`, e.g. spawn cell centres."""
+        for x, y in np.asarray(points, dtype=np.float64).reshape(-1, 2).tolist():
+            cell = self.target_cell(x, y)
+            if cell not in self.pinned:
+                self.pinned[cell] = self.cache.pop(cell, None)
+                if self.pinned[cell] is None:
+                    self.pinned[cell] = self._dijkstra(cell)
+
+    # ------------------ queries ------------------
+    def _around(self, field, x, y):
+        """(distance, cell) of the best of the 3x3 cells around (x, y)."""
+        centre = self.cell_of(x, y)
+        best, best_cell = math.inf, -1
+        size = self.cell_size
+        for row in (centre - self.width, centre, centre + self.width):
+            for cell in (row - 1, row, row + 1):
+                value = field[cell]
+                if value < best:
+                    iy, ix = divmod(cell, self.width)
+                    value += math.hypot((ix - 0.5) * size - x, (iy - 0.5) * size - y)
+                    if value < best:
+                        best, best_cell = value, cell
+        return float(best), best_cell
+
+    def distance(self, field, x, y):
+        """Geodesic distance from (x, y) along `field`; inf if no free cell is near."""
+        return self._around(field, x, y)[0]
+
+    def route(self, field, x, y, steps=4):
+        """
+        Centres of the next `steps` cells down the field from (x, y), the
+        nearest first; fewer at the target and none if (x, y) cannot reach it.
+        """
+        _, cell = self._around(field, x, y)
+        if cell < 0:
+            return []
+        centres = [self.center_of(cell)]
+        for _ in range(steps - 1):
+            best = cell
+            for offset, _ in self.neighbours:
+                if field[cell + offset] < field[best]:
+                    best = cell + offset
+            if best == cell:
+                break
+            cell = best
+            centres.append(self.center_of(cell))
+        return centres
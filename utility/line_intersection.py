@@ -1,10 +1,8 @@
 
-import pygame
-
 def line_intersection(p1, p2, p3, p4):
     """
-    Returns the intersection point of line segments (p1-p2) and (p3-p4),
-    or None if they don't intersect.
+    Returns the intersection point of line segments (p1-p2) and (p3-p4)
+    as an (x, y) tuple, or None if they don't intersect.
     """
 
     x1, y1 = p1
@@ -22,5 +20,5 @@ def line_intersection(p1, p2, p3, p4):
     if 0 <= t <= 1 and 0 <= u <= 1:
         x = x1 + t * (x2 - x1)
         y = y1 + t * (y2 - y1)
-        return pygame.Vector2(x, y)
+        return (x, y)
     return None
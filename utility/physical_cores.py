@@ -0,0 +1,10 @@
+import os
+
+
+def physical_cores():
+    """Physical CPU cores (psutil), or the logical count without psutil."""
+    try:
+        import psutil
+        return psutil.cpu_count(logical=False) or os.cpu_count()
+    except ImportError:
+        return os.cpu_count()
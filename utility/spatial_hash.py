@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+
+
+class SpatialHash:
+    """
+    Uniform grid over a set of moving points, cheap enough to rebuild
+    every step.
+
+    A point's key is the index of its grid cell within `bounds` = (min_x,
+    min_y, max_x, max_y); points outside are clamped to the border cells.
+    Points are bucketed by key with one argsort, in the same CSR form as
+    WallGrid: the points of cell c are order[cell_start[c]:cell_start[c + 1]],
+    with c = iy * nx + ix. Keys index a dense table, so buckets never hold
+    two different cells and queries need no de-duplication.
+
+    pairs() scans the cells within `radius` of every query point, so with
+    cell_size near the query radius a query costs O(points nearby) rather
+    than O(all points).
+    """
+
+    def __init__(self, points, cell_size, bounds):
+        self.points = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 2)
+        self.cell_size = float(cell_size)
+        self.origin = np.array(bounds[:2], dtype=np.float64)
+        self.nx = max(1, int(math.ceil((bounds[2] - bounds[0]) / self.cell_size)))
+        self.ny = max(1, int(math.ceil((bounds[3] - bounds[1]) / self.cell_size)))
+
+        cells = self._cells_of(self.points)
+        keys = cells[:, 1] * self.nx + cells[:, 0]
+        self.order = np.argsort(keys, kind="stable")
+        self.cell_start = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=self.nx * self.ny), out=self.cell_start[1:])
+
+    def _cells_of(self, points):
+        cells = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, [self.nx - 1, self.ny - 1])
+
+    def pairs(self, queries, radius):
+        """
+        All (i, j, distance) with distance = |queries[i] - points[j]| <= radius,
+        as three flat arrays in no particular order.
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float64).reshape(-1, 2)
+        cells = self._cells_of(queries)
+        reach = int(math.ceil(radius / self.cell_size))
+        x0 = np.maximum(cells[:, 0] - reach, 0)
+        x1 = np.minimum(cells[:, 0] + reach, self.nx - 1)
+
+        # Cells of one grid row are contiguous, so each row is one range
+        query_idx, starts, ends = [], [], []
+        for dy in range(-reach, reach + 1):
+            iy = cells[:, 1] + dy
+            rows = np.flatnonzero((iy >= 0) & (iy < self.ny))
+            row = iy[rows] * self.nx
+            query_idx.append(rows)
+            starts.append(self.cell_start[row + x0[rows]])
+            ends.append(self.cell_start[row + x1[rows] + 1])
+        query_idx = np.concatenate(query_idx)
+        starts = np.concatenate(starts)
+        counts = np.concatenate(ends) - starts
+
+        # Expand the ranges: position k of range r is starts[r] + k
+        total = int(counts.sum())
+        first = np.cumsum(counts) - counts
+        slots = np.arange(total) - np.repeat(first - starts, counts)
+        i = np.repeat(query_idx, counts)
+        j = self.order[slots]
+
+        distance = np.hypot(*(queries[i] - self.points[j]).T)
+        near = distance <= radius
+        return i[near], j[near], distance[near]
@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+
+
+class SpawnTable:
+    """
+    Precomputed free-space cells of one map for O(1) spawning.
+
+    A cell is kept only if its centre is at least `clearance` plus half a
+    cell diagonal from every wall, so any point inside it is a valid spawn.
+    Sampling picks a cell uniformly and a point uniformly inside it, which
+    is uniform over the free space the table covers.
+    """
+
+    def __init__(self, cells, cell_size):
+        self.cells = cells          # (M, 2) lower-left cell corners
+        self.cell_size = float(cell_size)
+
+    @classmethod
+    def build(cls, wall_grid, clearance, bounds, cell_size=10.0):
+        """
+        Tabulates the cells inside bounds = (min_x, min_y, max_x, max_y)
+        that keep `clearance` from the walls of `wall_grid`.
+        """
+        min_x, min_y, max_x, max_y = bounds
+        xs = np.arange(min_x, max_x - cell_size + 1e-9, cell_size)
+        ys = np.arange(min_y, max_y - cell_size + 1e-9, cell_size)
+        corners = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+
+        need = clearance + cell_size * math.sqrt(2) / 2
+        free = wall_grid.min_distances(corners + cell_size / 2, need) >= need
+        if not free.any():
+            raise ValueError(f"No free space with {clearance}px clearance inside {bounds}")
+        return cls(np.ascontiguousarray(corners[free]), cell_size)
+
+    def sample(self, rng, n=None):
+        """One (2,) point, or (n, 2) points when n is given."""
+        size = 1 if n is None else n
+        corners = self.cells[rng.integers(len(self.cells), size=size)]
+        points = corners + rng.random((size, 2)) * self.cell_size
+        return points[0] if n is None else points
+
+    def sample_away_from(self, rng, points, min_distance, tries=16):
+        """
+        Like sample, but every result is at least `min_distance` from the
+        matching row of `points` ((2,) or (n, 2)).
+        """
+        points = np.asarray(points, dtype=np.float64)
+        single = points.ndim == 1
+        points = points.reshape(-1, 2)
+
+        result = self.sample(rng, len(points))
+        if min_distance <= 0:
+            return result[0] if single else result
+
+        todo = np.arange(len(points))
+        for _ in range(tries):
+            too_close = np.hypot(*(result[todo] - points[todo]).T) < min_distance
+            todo = todo[too_close]
+            if not len(todo):
+                break
+            result[todo] = self.sample(rng, len(todo))
+
+        # Rare: fall back to the cells that lie wholly far enough away
+        reach = min_distance + self.cell_size * math.sqrt(2) / 2
+        centers = self.cells + self.cell_size / 2
+        for i in todo:
+            far = np.flatnonzero(np.hypot(*(centers - points[i]).T) >= reach)
+            if not len(far):
+                raise ValueError(f"No spawn cell is {min_distance}px away from {points[i]}")
+            result[i] = self.cells[rng.choice(far)] + rng.random(2) * self.cell_size
+        return result[0] if single else result
@@ -0,0 +1,228 @@
+import bisect
+import math
+
+import numpy as np
+
+from utility.cast_rays import ray_directions
+from utility.distance_points_to_walls import distance_points_to_walls
+from utility.wall_grid import WallGrid
+
+
+def split_crossing_walls(walls):
+    """
+    Splits walls at every point where another wall crosses or touches
+    their interior, so that no two of the returned walls cross. Walls are
+    (N, 4) rows; the result may have more rows.
+    """
+    walls = np.ascontiguousarray(walls, dtype=np.float64).reshape(-1, 4)
+    if len(walls) < 2:
+        return walls
+    # Pairs whose bounding boxes overlap, found through the grid's cells
+    grid = WallGrid(walls)
+    pairs = set()
+    for c in range(grid.nx * grid.ny):
+        cell = grid.cell_walls[grid.cell_start[c]:grid.cell_start[c + 1]].tolist()
+        for n, i in enumerate(cell):
+            for j in cell[n + 1:]:
+                pairs.add((min(i, j), max(i, j)))
+    if not pairs:
+        return walls
+    i, j = np.array(sorted(pairs)).T
+    a, b = walls[i], walls[j]
+    d1 = a[:, 2:] - a[:, :2]
+    d2 = b[:, 2:] - b[:, :2]
+    offset = b[:, :2] - a[:, :2]
+    denom = d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0]
+    parallel = np.abs(denom) < 1e-12
+    denom = np.where(parallel, 1.0, denom)
+    t = (offset[:, 0] * d2[:, 1] - offset[:, 1] * d2[:, 0]) / denom
+    u = (offset[:, 0] * d1[:, 1] - offset[:, 1] * d1[:, 0]) / denom
+    hit = ~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+
+    # Split parameters along each wall, strictly inside it
+    cuts = [[] for _ in range(len(walls))]
+    for wall, param in zip(np.concatenate([i[hit], j[hit]]).tolist(), np.concatenate([t[hit], u[hit]]).tolist()):
+        if 1e-9 < param < 1 - 1e-9:
+            cuts[wall].append(param)
+
+    pieces = []
+    for wall, params in zip(walls.tolist(), cuts):
+        if not params:
+            pieces.append(wall)
+            continue
+        x1, y1, x2, y2 = wall
+        params = [0.0] + sorted(set(params)) + [1.0]
+        points = [(x1 + (x2 - x1) * p, y1 + (y2 - y1) * p) for p in params]
+        pieces.extend((*p, *q) for p, q in zip(points[:-1], points[1:]))
+    return np.array(pieces, dtype=np.float64)
+
+
+def _sweep(walls, x, y):
+    """VisibilitySensor.sweep over the (N, 4) `walls`, which must not cross."""
+    # Endpoints relative to the origin; walls seen edge-on cover no angle
+    rel = walls - (x, y, x, y)
+    cross = rel[:, 0] * rel[:, 3] - rel[:, 1] * rel[:, 2]
+    keep = np.abs(cross) > 1e-9
+    rel, cross = rel[keep], cross[keep]
+    count = len(rel)
+    if not count:
+        return np.zeros(1), np.full((1, 3), np.nan)
+    # Orient every wall counter-clockwise around the origin
+    flip = cross < 0
+    rel[flip] = rel[flip][:, [2, 3, 0, 1]]
+    c = np.abs(cross)
+    ex, ey = rel[:, 2] - rel[:, 0], rel[:, 3] - rel[:, 1]
+
+    # Start angles, then end angles
+    angles = np.arctan2(rel[:, 1::2], rel[:, 0::2]).T.ravel()
+    order = np.argsort(angles, kind="stable")
+    ordered = angles[order]
+    new = np.empty(len(ordered), dtype=bool)
+    new[0] = True
+    np.not_equal(ordered[1:], ordered[:-1], out=new[1:])
+    first = np.flatnonzero(new)
+    breaks = ordered[first]
+    # Event group boundaries in `order`
+    bounds = first.tolist() + [len(order)]
+    wraps = np.flatnonzero(angles[count:] < angles[:count]).tolist()
+    order = order.tolist()
+    mids = np.empty(len(breaks))
+    mids[:-1] = breaks[1:]
+    mids[-1] = breaks[0] + 2 * math.pi
+    mids += breaks
+    mids /= 2
+    dxs, dys = np.cos(mids).tolist(), np.sin(mids).tolist()
+    cs, exs, eys = c.tolist(), ex.tolist(), ey.tolist()
+
+    def depth(s):
+        return cs[s] / (dx * eys[s] - dy * exs[s])
+
+    # Walls crossing the angle -pi are open when the sweep starts
+    dx, dy = dxs[-1], dys[-1]
+    active = sorted(wraps, key=depth)
+    nearest = []
+    for k in range(len(breaks)):
+        dx, dy = dxs[k], dys[k]
+        group = order[bounds[k]:bounds[k + 1]]
+        # Close walls ending here before opening the ones starting here
+        for event in group:
+            if event >= count:
+                active.remove(event - count)
+        for event in group:
+            if event < count:
+                bisect.insort(active, event, key=depth)
+        nearest.append(active[0] if active else count)
+
+    table = np.full((count + 1, 3), np.nan)
+    table[:count, 0] = c
+    table[:count, 1] = ex
+    table[:count, 2] = ey
+    return breaks, table[nearest]
+
+
+def _farthest(breaks, walls):
+    """Distance to the farthest vertex of a swept polygon; inf if it has an open interval."""
+    c, ex, ey = walls.T
+    if np.isnan(c).any():
+        return math.inf
+    bounds = np.append(breaks, breaks[0] + 2 * math.pi)
+    theta = np.stack([bounds[:-1], bounds[1:]])
+    return float((c / (np.cos(theta) * ey - np.sin(theta) * ex)).max())
+
+
+class VisibilitySensor:
+    """
+    Ray sensing from the visibility polygon around the car.
+
+    sweep() orders the walls within reach by angle around the origin and
+    sweeps once over their endpoints, keeping the walls crossing the sweep
+    ray sorted by depth. Between two consecutive endpoint angles the
+    nearest wall does not change, which gives the visibility polygon as
+    one wall per angular interval in O(W log W). cast_rays then samples any
+    number of rays from it with a binary search and one ray/line
+    intersection each, so sensing cost barely depends on the ray count.
+
+    Walls that cross are split where they cross when the sensor is built,
+    since the depth order of two walls along the sweep must not change.
+    Walls are gathered like in CoherentRayCaster: those within
+    ray_length + margin of an anchor, refreshed once the car has moved
+    `margin` away from it. Large sets are first swept only within last
+    step's polygon radius plus the distance moved; a polygon closed within
+    that radius is exact, otherwise the whole set is swept.
+
+    Drop-in for WallGrid.cast_rays; results match it to floating point
+    precision. Rays that graze a wall endpoint count as hitting it, where
+    cast_rays may hit or miss depending on rounding.
+    """
+
+    def __init__(self, wall_grid, margin=50.0, two_stage_min_walls=64):
+        walls = split_crossing_walls(wall_grid.walls)
+        self.wall_grid = wall_grid if len(walls) == len(wall_grid.walls) else WallGrid(walls, wall_grid.cell_size)
+        self.margin = float(margin)
+        self.two_stage_min_walls = two_stage_min_walls
+        self.invalidate()
+
+    def invalidate(self):
+        """Forgets the cached wall set, e.g. after teleporting the car."""
+        self.anchor_x = math.inf
+        self.anchor_y = math.inf
+        self.ray_length = None
+        self.walls = None
+        self.last_x = math.inf
+        self.last_y = math.inf
+        self.reach = math.inf      # farthest polygon vertex of the last sweep
+
+    def _refresh(self, x, y, ray_length):
+        idx = self.wall_grid.walls_near((x, y), ray_length + self.margin)
+        self.walls = self.wall_grid.walls[idx]
+        self.anchor_x, self.anchor_y = x, y
+        self.ray_length = ray_length
+
+    def sweep(self, x, y, ray_length):
+        """
+        The visibility polygon around (x, y) as (breaks, walls): breaks are
+        sorted angles (atan2 convention, radians) and walls[k] the nearest
+        wall, a row of (c, ex, ey) with c = p x e for its start p relative
+        to the origin and direction e, between breaks[k] and breaks[k + 1]
+        (the last interval wraps around to breaks[0]). Empty intervals
+        have a NaN row.
+        """
+        if (ray_length != self.ray_length
+                or math.hypot(x - self.anchor_x, y - self.anchor_y) > self.margin):
+            self._refresh(x, y, ray_length)
+
+        walls = self.walls
+        # Widen last step's radius by how far the car moved
+        reach = self.reach + math.hypot(x - self.last_x, y - self.last_y)
+        polygon = None
+        if len(walls) >= self.two_stage_min_walls and reach < ray_length:
+            near = walls[distance_points_to_walls((x, y), walls) <= reach]
+            polygon = _sweep(near, x, y)
+            if not _farthest(*polygon) <= reach:
+                # A wall beyond the radius may show through a gap
+                polygon = None
+        if polygon is None:
+            polygon = _sweep(walls, x, y)
+
+        self.reach = _farthest(*polygon)
+        self.last_x, self.last_y = x, y
+        return polygon
+
+    def cast_rays(self, origin, angles, ray_length):
+        x, y = float(origin[0]), float(origin[1])
+        breaks, walls = self.sweep(x, y, ray_length)
+        directions = ray_directions(angles)
+        dx, dy = directions[:, 0], directions[:, 1]
+        # Interval of each ray; rays before the first break wrap to the last.
+        # A ray exactly on a break touches the walls of both intervals.
+        phi = np.arctan2(dy, dx)
+        after = np.searchsorted(breaks, phi, side="right") - 1
+        before = np.searchsorted(breaks, phi, side="left") - 1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            c, ex, ey = walls[after].T
+            distances = c / (dx * ey - dy * ex)
+            c, ex, ey = walls[before].T
+            distances = np.fmin(distances, c / (dx * ey - dy * ex))
+        distances = np.fmin(distances, ray_length)
+        points = np.array((x, y)) + directions * distances[:, None]
+        return distances, points
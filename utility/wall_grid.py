@@ -0,0 +1,281 @@
+import math
+
+import numpy as np
+
+from utility.cast_rays import cast_rays, ray_directions
+from utility.distance_points_to_walls import distance_points_to_walls
+from utility.distance_segments_to_walls import distance_segments_to_walls
+
+
+class WallGrid:
+    """
+    Uniform grid over wall bounding boxes, built once per map.
+
+    Every cell stores the indices of the walls whose bounding box overlaps
+    it, in CSR form: the walls of cell c are
+    cell_walls[cell_start[c]:cell_start[c + 1]], with c = iy * nx + ix.
+    Queries only look at cells near the point or along the ray, so their
+    cost follows local wall density rather than total map size.
+
+    An optional DistanceField can be attached as `distance_field`; clearance
+    queries then read from it and fall back to exact geometry only for
+    points within one field cell of the queried distance.
+    """
+
+    def __init__(self, walls, cell_size=50.0):
+        self.walls = np.ascontiguousarray(walls, dtype=np.float64).reshape(-1, 4)
+        self.cell_size = float(cell_size)
+
+        if len(self.walls):
+            xs = self.walls[:, [0, 2]]
+            ys = self.walls[:, [1, 3]]
+            self.origin = np.array([xs.min(), ys.min()])
+            extent = np.array([xs.max(), ys.max()]) - self.origin
+        else:
+            self.origin = np.zeros(2)
+            extent = np.zeros(2)
+        self.nx = int(extent[0] // self.cell_size) + 1
+        self.ny = int(extent[1] // self.cell_size) + 1
+
+        # Cell ranges covered by each wall's bounding box
+        lo = np.minimum(self.walls[:, :2], self.walls[:, 2:])
+        hi = np.maximum(self.walls[:, :2], self.walls[:, 2:])
+        lo_cell = self._cells_of(lo)
+        hi_cell = self._cells_of(hi)
+
+        buckets = [[] for _ in range(self.nx * self.ny)]
+        for i in range(len(self.walls)):
+            for iy in range(lo_cell[i, 1], hi_cell[i, 1] + 1):
+                row = iy * self.nx
+                for ix in range(lo_cell[i, 0], hi_cell[i, 0] + 1):
+                    buckets[row + ix].append(i)
+
+        counts = np.array([len(b) for b in buckets], dtype=np.int64)
+        self.cell_start = np.zeros(len(buckets) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.cell_start[1:])
+        self.cell_walls = np.array(
+            [i for b in buckets for i in b], dtype=np.int64
+        )
+        self.distance_field = None
+
+    @classmethod
+    def from_arrays(cls, walls, origin, cell_size, nx, ny, cell_start, cell_walls):
+        """
+        Rebuilds a grid from the arrays of an earlier build, e.g. a
+        memory-mapped map cache, without re-bucketing the walls.
+        """
+        grid = cls.__new__(cls)
+        grid.walls = walls
+        grid.cell_size = float(cell_size)
+        grid.origin = np.asarray(origin, dtype=np.float64)
+        grid.nx = int(nx)
+        grid.ny = int(ny)
+        grid.cell_start = cell_start
+        grid.cell_walls = cell_walls
+        grid.distance_field = None
+        return grid
+
+    def _cells_of(self, points):
+        cells = np.floor((np.asarray(points) - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cells, 0, [self.nx - 1, self.ny - 1])
+
+    def candidates(self, point, radius):
+        """
+        Indices of walls registered in the cells overlapping the square of
+        half-size `radius` around `point`. A superset of the walls within
+        `radius`, with no duplicates.
+        """
+        if not math.isfinite(radius):
+            return np.arange(len(self.walls))
+        x, y = point[0], point[1]
+        x0 = math.floor((x - radius - self.origin[0]) / self.cell_size)
+        x1 = math.floor((x + radius - self.origin[0]) / self.cell_size)
+        y0 = math.floor((y - radius - self.origin[1]) / self.cell_size)
+        y1 = math.floor((y + radius - self.origin[1]) / self.cell_size)
+        if x1 < 0 or y1 < 0 or x0 >= self.nx or y0 >= self.ny:
+            return self.cell_walls[:0]
+        x0, x1 = max(x0, 0), min(x1, self.nx - 1)
+        y0, y1 = max(y0, 0), min(y1, self.ny - 1)
+
+        # Cells of one grid row are contiguous in the CSR layout
+        chunks = [
+            self.cell_walls[self.cell_start[iy * self.nx + x0]:self.cell_start[iy * self.nx + x1 + 1]]
+            for iy in range(y0, y1 + 1)
+        ]
+        found = np.concatenate(chunks)
+        if y1 > y0 or x1 > x0:
+            found = np.unique(found)
+        return found
+
+    def walls_near(self, point, radius):
+        """Indices of walls whose closest point lies within `radius` of `point`."""
+        idx = self.candidates(point, radius)
+        dist = distance_points_to_walls(point, self.walls[idx])
+        return idx[dist <= radius]
+
+    def min_distance(self, point, max_distance):
+        """
+        Distance from `point` to the nearest wall, capped at `max_distance`
+        (returned when no wall is that close).
+        """
+        return self.clearance_at(point[0], point[1], max_distance)
+
+    def clearance_at(self, x, y, max_distance):
+        """min_distance for a point given as two floats."""
+        field = self.distance_field
+        if field is not None:
+            # NaN outside the field fails this test and falls through
+            if field.sample(x, y) - field.resolution >= max_distance:
+                return max_distance
+        return self._exact_min_distance((x, y), max_distance)
+
+    def _exact_min_distance(self, point, max_distance):
+        idx = self.candidates(point, max_distance)
+        if len(idx) == 0:
+            return max_distance
+        dist = distance_points_to_walls(point, self.walls[idx]).min()
+        return min(float(dist), max_distance)
+
+    def min_distances(self, points, max_distance):
+        """Vectorized min_distance for (N, 2) points."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        result = np.full(len(points), float(max_distance))
+
+        unsure = np.arange(len(points))
+        field = self.distance_field
+        if field is not None:
+            clear = field.sample_many(points) - field.resolution >= max_distance
+            unsure = unsure[~clear]
+        if len(unsure) * len(self.walls) <= 1_000_000:
+            # Small enough to solve against every wall in one pass
+            if len(unsure) and len(self.walls):
+                dist = distance_points_to_walls(points[unsure], self.walls).min(axis=-1)
+                result[unsure] = np.minimum(dist, max_distance)
+        else:
+            for i in unsure:
+                result[i] = self._exact_min_distance(points[i], max_distance)
+        return result
+
+    def first_contact(self, path, radius):
+        """
+        Swept-circle test along the polyline `path` (M + 1, 2): the index of
+        the first segment along which a circle of `radius` would come closer
+        than `radius` to a wall, or -1 when the whole path is clear.
+        """
+        path = np.asarray(path, dtype=np.float64)
+        lo, hi = path.min(axis=0), path.max(axis=0)
+        cx, cy = (lo + hi) / 2
+        half_x, half_y = (hi - lo) / 2
+        # Every path point lies within the bounding box half-diagonal of its center
+        reach = math.hypot(half_x, half_y) + radius
+        field = self.distance_field
+        if field is not None:
+            if field.sample(cx, cy) - field.resolution >= reach:
+                return -1
+        idx = self.candidates((cx, cy), reach)
+        walls = self.walls[idx]
+        walls = walls[distance_points_to_walls((cx, cy), walls) < reach]
+        if len(walls) == 0:
+            return -1
+        dist = distance_segments_to_walls(path[:-1], path[1:], walls)
+        blocked = (dist < radius).any(axis=1)
+        return int(blocked.argmax()) if blocked.any() else -1
+
+    def cast_rays(self, origin, angles, ray_length):
+        """
+        cast_rays against only the walls that can be reached within
+        ray_length of `origin`; same (distances, points) result.
+        """
+        idx = self.candidates(origin, ray_length)
+        return cast_rays(origin, angles, self.walls[idx], ray_length)
+
+    def march_rays(self, origins, angles, ray_length):
+        """
+        cast_rays for many origins at once: every ray walks the cells it
+        crosses, nearest first, all rays in lockstep, and stops as soon as
+        a hit is closer than the next cell boundary. Each ray is only
+        tested against the walls of the cells it visits, so the cost
+        follows the wall density along the rays rather than the wall count.
+
+        origins: (..., 2); angles: (..., R) in degrees. Returns the same
+        (distances, points) as cast_rays, shapes (..., R) and (..., R, 2).
+        """
+        origins = np.asarray(origins, dtype=np.float64)
+        directions = ray_directions(angles)
+        shape = directions.shape[:-1]
+        starts = np.broadcast_to(origins[..., None, :], directions.shape).reshape(-1, 2)
+        ox, oy = starts[:, 0], starts[:, 1]
+        dx, dy = directions.reshape(-1, 2).T
+        length = float(ray_length)
+        x2, y2 = ox + dx * length, oy + dy * length
+        # Nearest hit so far as a fraction of the ray, as in cast_rays; 1 = none
+        best = np.ones(len(ox))
+
+        # Clip the rays to the grid bounds (slab test), in px along the ray
+        axes = ((ox, dx, self.origin[0], self.nx), (oy, dy, self.origin[1], self.ny))
+        t_enter = np.zeros(len(ox))
+        t_exit = np.full(len(ox), length)
+        for o, d, lo, n in axes:
+            hi = lo + n * self.cell_size
+            flat = np.abs(d) < 1e-12
+            safe = np.where(flat, 1.0, d)
+            ta, tb = (lo - o) / safe, (hi - o) / safe
+            t_enter = np.where(flat, t_enter, np.maximum(t_enter, np.minimum(ta, tb)))
+            outside = flat & ((o < lo) | (o > hi))
+            t_exit = np.where(flat, np.where(outside, -1.0, t_exit), np.minimum(t_exit, np.maximum(ta, tb)))
+
+        # Per axis: current cell, step direction, distance to the next cell
+        # boundary and between boundaries
+        walk = []
+        for o, d, lo, n in axes:
+            flat = np.abs(d) < 1e-12
+            safe = np.where(flat, 1.0, d)
+            cell = np.clip(np.floor((o + d * t_enter - lo) / self.cell_size), 0, n - 1).astype(np.int64)
+            step = np.where(d > 0, 1, -1)
+            boundary = lo + (cell + (step > 0)) * self.cell_size
+            t_max = np.where(flat, np.inf, (boundary - o) / safe)
+            t_delta = np.where(flat, np.inf, self.cell_size / np.abs(safe))
+            walk.append((cell, step, t_max, t_delta))
+        (ix, step_x, t_max_x, t_delta_x), (iy, step_y, t_max_y, t_delta_y) = walk
+
+        rays = np.flatnonzero(t_enter <= t_exit)
+        while len(rays):
+            cell = iy[rays] * self.nx + ix[rays]
+            first = self.cell_start[cell]
+            counts = self.cell_start[cell + 1] - first
+            offsets = np.cumsum(counts) - counts
+            r = np.repeat(rays, counts)
+            walls = self.walls[self.cell_walls[np.arange(int(counts.sum())) - np.repeat(offsets - first, counts)]]
+
+            # Same formulation as cast_rays, so hits are bit-identical
+            x1, y1 = ox[r], oy[r]
+            x3, y3, x4, y4 = walls.T
+            denom = (x1 - x2[r]) * (y3 - y4) - (y1 - y2[r]) * (x3 - x4)
+            parallel = np.abs(denom) < 1e-10
+            safe_denom = np.where(parallel, 1.0, denom)
+            t = ((x1 - x3) * (y3 - y4) - (y1 - y3) * (x3 - x4)) / safe_denom
+            u = -((x1 - x2[r]) * (y1 - y3) - (y1 - y2[r]) * (x1 - x3)) / safe_denom
+            hit = ~parallel & (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+            np.minimum.at(best, r[hit], t[hit])
+
+            # Any closer hit would lie in a cell already visited
+            cell_exit = np.minimum(np.minimum(t_max_x[rays], t_max_y[rays]), t_exit[rays])
+            done = (best[rays] * length <= cell_exit) | (cell_exit >= t_exit[rays])
+            rays = rays[~done]
+            along_x = t_max_x[rays] < t_max_y[rays]
+            rx, ry = rays[along_x], rays[~along_x]
+            ix[rx] += step_x[rx]
+            t_max_x[rx] += t_delta_x[rx]
+            iy[ry] += step_y[ry]
+            t_max_y[ry] += t_delta_y[ry]
+            rays = rays[(ix[rays] >= 0) & (ix[rays] < self.nx) & (iy[rays] >= 0) & (iy[rays] < self.ny)]
+
+        any_hit = best < 1
+        distances = np.where(any_hit, best * length, length).reshape(shape)
+        ends = np.stack([x2, y2], axis=-1).reshape(directions.shape)
+        points = np.where(
+            any_hit.reshape(shape)[..., None],
+            origins[..., None, :] + directions * distances[..., None],
+            ends,
+        )
+        return distances, points
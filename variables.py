@@ -23,3 +23,10 @@ RAY_COLOR = RED
 
 
 TARGET_RADIUS = 20
+TARGET_REACH_DISTANCE = 25
+
+
+CAR_START = (100, 300)
+CAR_SPAWN_CLEARANCE = 25
+TARGET_CLEARANCE = 20
+SPAWN_MARGIN = 60